@@ -22,6 +22,28 @@ class Settings(BaseSettings):
     SUPABASE_SECRET_KEY: Optional[str] = os.getenv("SUPABASE_SECRET_KEY")
     MONGO_URI: Optional[str] = os.getenv("MONGO_URI", "your-mongodb-atlas-uri")
     
+    # 객체 탐지 서비스 설정
+    DETECTOR_PACKAGE_PATH: str = os.getenv(
+        "DETECTOR_PACKAGE_PATH",
+        os.path.join(os.path.dirname(__file__), "..", "..", "streamlit-app", "utils")
+    )
+    DETECTION_METADATA_PATH: str = os.getenv(
+        "DETECTION_METADATA_PATH",
+        os.path.join(os.path.dirname(__file__), "..", "..", "streamlit-app", "models", "model_metadata.json")
+    )
+    DETECTION_MAX_BATCH_SIZE: int = int(os.getenv("DETECTION_MAX_BATCH_SIZE", "8"))
+    DETECTION_MAX_WAIT_MS: float = float(os.getenv("DETECTION_MAX_WAIT_MS", "5"))
+    DETECTION_WORKERS: int = int(os.getenv("DETECTION_WORKERS", "0"))  # 0 = 추론을 API 프로세스에서 실행
+    DETECTION_AUTO_CROP: bool = os.getenv("DETECTION_AUTO_CROP", "false").lower() == "true"
+    DETECTION_DIAGRAM_CACHE_SIZE: int = int(os.getenv("DETECTION_DIAGRAM_CACHE_SIZE", "32"))
+    DETECTION_MAX_IMAGE_SIZE: int = int(os.getenv("DETECTION_MAX_IMAGE_SIZE", "2048"))  # 업로드 긴 변 상한 (0 = 제한 없음)
+    DETECTION_JOBS_DIR: str = os.getenv(
+        "DETECTION_JOBS_DIR", os.path.join(os.path.dirname(__file__), "..", "jobs")
+    )
+    PROJECT_ROOT: str = os.getenv(
+        "PROJECT_ROOT", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    )
+    
     # CORS 설정
     ALLOWED_ORIGINS: list = ["*"]
     
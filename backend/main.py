@@ -1,8 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import make_asgi_app
 from core.config import settings
 from routes.auth import router as auth_router
 from routes.data import router as data_router
+from routes.detect import router as detect_router
+from routes.jobs import router as jobs_router
+from services.detection import start_detection_service, stop_detection_service
+from services.detection_jobs import job_manager
 
 app = FastAPI(title="ArchLens")
 
@@ -16,6 +21,17 @@ app.add_middleware(
 
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(data_router, prefix="/data", tags=["data"])
+app.include_router(detect_router, prefix="/detect", tags=["detect"])
+app.include_router(jobs_router, prefix="/jobs", tags=["jobs"])
+
+# Prometheus 수집용 엔드포인트 (단계별 탐지 지연시간, 이미지 크기, 탐지 개수)
+app.mount("/metrics", make_asgi_app())
+
+# 탐지 모델은 프로세스 시작 시 한 번만 로드
+app.add_event_handler("startup", start_detection_service)
+app.add_event_handler("shutdown", stop_detection_service)
+# 비정상 종료로 중단된 일괄 탐지 작업은 체크포인트부터 재개
+app.add_event_handler("startup", job_manager.resume_interrupted)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,4 +1,6 @@
 from .auth import router as auth_router
 from .data import router as data_router
+from .detect import router as detect_router
+from .jobs import router as jobs_router
 
-routers = [auth_router, data_router]
\ No newline at end of file
+routers = [auth_router, data_router, detect_router, jobs_router]
\ No newline at end of file
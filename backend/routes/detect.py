@@ -0,0 +1,55 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, File, Form, UploadFile
+from schemas import Detection, DetectionResponse
+from services.detection import MicroBatcher, decode_image, get_detection_service, timed
+from core.exceptions import InternalServerError, ValidationError
+
+router = APIRouter()
+
+
+@router.post("", response_model=DetectionResponse)
+async def detect(
+    file: UploadFile = File(...),
+    conf_threshold: float = Form(0.5, ge=0.0, le=1.0),
+    nms_threshold: float = Form(0.45, ge=0.0, le=1.0),
+    diagram_id: Optional[str] = Form(None),
+    service: MicroBatcher = Depends(get_detection_service),
+):
+    if service is None:
+        raise InternalServerError("Detection model is not loaded")
+
+    data = await file.read()
+    with timed("decode"):
+        decoded = decode_image(data)
+    if decoded is None:
+        raise ValidationError("Uploaded file is not a valid image")
+    image, scale = decoded
+    if diagram_id:
+        result = await service.submit_diagram(diagram_id, image, conf_threshold, nms_threshold)
+    else:
+        result = await service.submit(image, conf_threshold, nms_threshold)
+
+    class_names = service.model.class_names
+    with timed("serialize"):
+        detections = [
+            Detection(
+                class_id=int(class_id),
+                class_name=class_names[class_id] if class_id < len(class_names) else f"Class_{class_id}",
+                confidence=float(score),
+                box=[float(v) for v in box],
+            )
+            # boxes are found on the decoded image, reported on the upload
+            for box, score, class_id in zip(result["boxes"] / scale, result["scores"], result["class_ids"])
+        ]
+        response = DetectionResponse(
+            model_name=service.model.model_name,
+            image_width=round(image.shape[1] / scale),
+            image_height=round(image.shape[0] / scale),
+            inference_ms=result["inference_ms"],
+            batch_size=result["batch_size"],
+            detections=detections,
+            tiles_total=result.get("tiles_total"),
+            tiles_inferred=result.get("tiles_inferred"),
+        )
+    return response
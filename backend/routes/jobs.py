@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends
+from schemas import DetectionJobCreate, DetectionJob
+from services.detection_jobs import RESUMABLE_STATUSES, DetectionJobManager, get_job_manager
+from core.exceptions import ConflictError, NotFoundError
+from typing import List
+
+router = APIRouter()
+
+
+@router.post("", response_model=DetectionJob)
+async def create_job(request: DetectionJobCreate, manager: DetectionJobManager = Depends(get_job_manager)):
+    return manager.create(**request.dict())
+
+@router.get("/{job_id}", response_model=DetectionJob)
+async def get_job(job_id: str, manager: DetectionJobManager = Depends(get_job_manager)):
+    job = manager.get(job_id)
+    if not job:
+        raise NotFoundError("Job", job_id)
+    return job
+
+@router.get("", response_model=List[DetectionJob])
+async def list_jobs(manager: DetectionJobManager = Depends(get_job_manager)):
+    return manager.list()
+
+@router.post("/{job_id}/resume", response_model=DetectionJob)
+async def resume_job(job_id: str, manager: DetectionJobManager = Depends(get_job_manager)):
+    job = manager.get(job_id)
+    if not job:
+        raise NotFoundError("Job", job_id)
+    if job["status"] not in RESUMABLE_STATUSES:
+        raise ConflictError(f"Job '{job_id}' is {job['status']} and can't be resumed")
+    return manager.start(job_id)
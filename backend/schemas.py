@@ -113,3 +113,37 @@ class Artifact(ArtifactBase):
     class Config:
         orm_mode = True
 
+class Detection(BaseModel):
+    class_id: int
+    class_name: str
+    confidence: float
+    box: List[float]  # [x1, y1, x2, y2] in original image pixels
+
+class DetectionResponse(BaseModel):
+    model_name: str
+    image_width: int
+    image_height: int
+    inference_ms: float
+    batch_size: int
+    detections: List[Detection]
+    tiles_total: Optional[int] = None     # only for requests with a diagram_id
+    tiles_inferred: Optional[int] = None  # tiles that changed since the previous version
+
+class DetectionJobCreate(BaseModel):
+    bucket: str
+    prefix: str                                  # e.g. "processed/unlabeled/"
+    output_prefix: str = "results/detections/"   # results object: <output_prefix>/<job_id>.json.gz
+    conf_threshold: float = Field(0.5, ge=0.0, le=1.0)
+    nms_threshold: float = Field(0.45, ge=0.0, le=1.0)
+    workers: int = Field(4, ge=1, le=64)
+
+class DetectionJob(DetectionJobCreate):
+    id: str
+    status: str  # pending | running | completed | failed
+    total: Optional[int] = None
+    processed: int = 0
+    failed: int = 0
+    result_key: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,285 @@
+import asyncio
+import importlib
+import importlib.util
+import json
+import sys
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+
+
+def load_detector_package(package_path: str, name: str = "detector_utils"):
+    """Import streamlit-app/utils under another name
+
+    The backend already has its own top-level `utils` module, so the shared
+    detection code (preprocess / postprocess / session) is loaded by path.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    package_path = Path(package_path)
+    spec = importlib.util.spec_from_file_location(
+        name, package_path / "__init__.py", submodule_search_locations=[str(package_path)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def detector_module(name: str):
+    """detector_utils.<name>, loading the shared package from DETECTOR_PACKAGE_PATH on first use"""
+    load_detector_package(settings.DETECTOR_PACKAGE_PATH)
+    return importlib.import_module(f"detector_utils.{name}")
+
+
+# 공유 탐지 코드의 단계별 메트릭을 API 프로세스에서도 사용 (/metrics 로 노출)
+def timed(stage: str):
+    """Shared per-stage latency histogram (detector_utils.metrics.timed)"""
+    return detector_module("metrics").timed(stage)
+
+
+def decode_image(data: bytes) -> Optional[Tuple[np.ndarray, float]]:
+    """Decode upload bytes with the shared decoder, None if not an image
+
+    Decoding matches the Streamlit app: RGB, EXIF orientation applied, and
+    uploads larger than DETECTION_MAX_IMAGE_SIZE decoded at reduced size.
+    Returns (image, scale) with scale = decoded size / upload size; divide
+    boxes by it to map them back onto the upload.
+    """
+    try:
+        return detector_module("decode").decode_image(data, settings.DETECTION_MAX_IMAGE_SIZE)
+    except (OSError, ValueError):  # PIL's UnidentifiedImageError is an OSError
+        return None
+
+
+class DetectionModel:
+    """ONNX detector loaded once per process from a model_metadata.json
+
+    With workers > 0 inference runs in a PreforkDetector: the model is loaded
+    and warmed here once, then that many forked processes (each pinned to its
+    own CPUs) share it copy-on-write. Create the model before the server
+    starts other threads, since the workers are forked from this process.
+    """
+
+    def __init__(self, metadata_path: str, package_path: str, runtime: Optional[Dict[str, Any]] = None,
+                 workers: int = 0, auto_crop: bool = False):
+        load_detector_package(package_path)
+        from detector_utils.crop import crop_to_content, offset_ratio_pad
+        from detector_utils.metrics import observe_image
+        from detector_utils.postprocess import decode_predictions, scale_boxes
+        from detector_utils.prefork import PreforkDetector
+        from detector_utils.preprocess import get_input_buffer, letterbox
+        from detector_utils.session import BoundRunner, SessionPool, load_runtime_config
+
+        self._decode, self._scale = decode_predictions, scale_boxes
+        self._buffer, self._letterbox = get_input_buffer, letterbox
+        self._crop, self._offset = crop_to_content, offset_ratio_pad
+        self._observe = observe_image
+        self.auto_crop = auto_crop
+
+        metadata_path = Path(metadata_path)
+        self.metadata = json.loads(metadata_path.read_text())
+        model_path = Path(self.metadata["model_path"])
+        if not model_path.is_absolute():
+            # model_path in the metadata is relative to the streamlit-app directory
+            model_path = metadata_path.parent.parent / model_path
+
+        config = load_runtime_config(self.metadata, str(Path(package_path).parent / "config.yaml"))
+        config.update(runtime or {})
+        self.imgsz = self.metadata["imgsz"]
+        self.class_names = self.metadata["classes"]
+        self.model_name = self.metadata.get("model_name", model_path.stem)
+
+        self.workers = None
+        if workers > 0:
+            # Images are dispatched one per worker, so the batch axis doesn't limit micro-batches
+            self.workers = PreforkDetector(str(model_path), workers, self.imgsz, config).start()
+            self.max_batch = None
+            return
+
+        self.session = SessionPool(str(model_path), **config)
+        self.input_name = self.session.get_inputs()[0].name
+        # With io_binding the outputs land in bound buffers reused across batches
+        self.runner = BoundRunner(self.session) if config.get("io_binding") else None
+        batch = self.session.get_inputs()[0].shape[0]
+        self.max_batch = batch if isinstance(batch, int) else None  # None = dynamic batch axis
+
+    def warmup(self):
+        """Run one dummy batch so the first request doesn't pay graph initialization"""
+        if self.workers is not None:
+            return  # warmed by PreforkDetector before forking
+        dummy = np.zeros((1, 3, self.imgsz, self.imgsz), dtype=np.float32)
+        self.session.run(None, {self.input_name: dummy})
+
+    def infer(self, images: List[np.ndarray], thresholds: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+        """Run one stacked session.run over the images and decode every image with its own thresholds"""
+        if self.workers is not None:
+            return self._infer_workers(images, thresholds)
+        with timed("preprocess"):
+            input_tensor = self._buffer(self.imgsz, len(images))
+            ratio_pads = [self._preprocess(image, slot) for image, slot in zip(images, input_tensor)]
+        with timed("inference"):
+            if self.runner is not None:
+                outputs = self.runner.run(input_tensor)[0]  # reused buffer, decoded before the next batch
+            else:
+                outputs = self.session.run(None, {self.input_name: input_tensor})[0]
+
+        # Requests sharing thresholds are decoded together as one vectorized batch
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        with timed("postprocess"):
+            for conf_threshold, nms_threshold in set(thresholds):
+                indices = [i for i, t in enumerate(thresholds) if t == (conf_threshold, nms_threshold)]
+                decoded = self._decode(outputs[indices], conf_threshold, nms_threshold)
+                for i, (boxes, scores, class_ids) in zip(indices, decoded):
+                    boxes = self._scale(boxes, images[i].shape[:2], (self.imgsz, self.imgsz), ratio_pads[i])
+                    results[i] = {"boxes": boxes, "scores": scores, "class_ids": class_ids}
+
+        for image, result in zip(images, results):
+            self._observe(image.shape, len(result["boxes"]))
+        return results
+
+    def _preprocess(self, image: np.ndarray, out: np.ndarray) -> tuple:
+        """Letterbox into one batch slot; with auto_crop only the content bounding box is used"""
+        if not self.auto_crop:
+            return self._letterbox(image, self.imgsz, out=out)[1]
+        content, offset = self._crop(image, min_size=self.imgsz)
+        return self._offset(self._letterbox(content, self.imgsz, out=out)[1], offset)
+
+    def _infer_workers(self, images: List[np.ndarray], thresholds: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+        """Fan the images out over the worker processes (pre/postprocessing included)"""
+        crops = [self._crop(image, min_size=self.imgsz) if self.auto_crop else (image, (0, 0)) for image in images]
+        with timed("inference"):
+            futures = [self.workers.submit(crop, *threshold) for (crop, _), threshold in zip(crops, thresholds)]
+            results = [future.result() for future in futures]
+        for (_, (x, y)), result in zip(crops, results):
+            result["boxes"] += np.array([x, y, x, y], dtype=result["boxes"].dtype)
+        for image, result in zip(images, results):
+            self._observe(image.shape, len(result["boxes"]))
+        return results
+
+    def close(self):
+        if self.workers is not None:
+            self.workers.close()
+
+
+class MicroBatcher:
+    """Gathers concurrent detection requests into micro-batches
+
+    Requests wait in an asyncio queue; a batch is closed when it reaches
+    max_batch_size or max_wait_ms after its first request arrived, then runs
+    on a dedicated worker thread so the event loop keeps accepting requests.
+    """
+
+    def __init__(self, model: DetectionModel, max_batch_size: int = 8, max_wait_ms: float = 5.0,
+                 max_diagrams: int = 32):
+        self.model = model
+        # Tile records of recently seen diagrams, for re-detecting only what a revision changed
+        self.diagrams = detector_module("incremental").IncrementalDetector(
+            tile_size=model.imgsz, max_diagrams=max_diagrams)
+        self.max_batch_size = min(max_batch_size, model.max_batch or max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detector")
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._batch_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, image: np.ndarray, conf_threshold: float, nms_threshold: float) -> Dict[str, Any]:
+        """Queue one image and wait for its detections"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, (conf_threshold, nms_threshold), future))
+        return await future
+
+    async def submit_diagram(self, diagram_id: str, image: np.ndarray, conf_threshold: float,
+                             nms_threshold: float) -> Dict[str, Any]:
+        """Detect on a new version of a diagram, queueing only the tiles that changed since the last one
+
+        The whole-image pass (recorded per diagram) is queued with them when any tile changed.
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        plan = await loop.run_in_executor(
+            None, self.diagrams.plan, diagram_id, image, conf_threshold, nms_threshold
+        )
+        results = await asyncio.gather(*(
+            self.submit(tile, conf_threshold, nms_threshold) for tile in self.diagrams.crops(plan)
+        ))
+        merged = await loop.run_in_executor(None, self.diagrams.merge, plan, results)
+        return {
+            **merged,
+            "batch_size": max((result["batch_size"] for result in results), default=0),
+            "inference_ms": (time.perf_counter() - start) * 1000,
+        }
+
+    async def _next_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            images = [item[0] for item in batch]
+            thresholds = [item[1] for item in batch]
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self.model.infer, images, thresholds)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():  # the client may have disconnected
+                    future.set_result({**result, "batch_size": len(batch), "inference_ms": elapsed_ms})
+
+
+detection_service: Optional[MicroBatcher] = None
+
+
+async def start_detection_service():
+    """Load and warm the model once, then start the batching loop"""
+    global detection_service
+    model = DetectionModel(settings.DETECTION_METADATA_PATH, settings.DETECTOR_PACKAGE_PATH,
+                           workers=settings.DETECTION_WORKERS, auto_crop=settings.DETECTION_AUTO_CROP)
+    model.warmup()
+    detection_service = MicroBatcher(model, settings.DETECTION_MAX_BATCH_SIZE, settings.DETECTION_MAX_WAIT_MS,
+                                     settings.DETECTION_DIAGRAM_CACHE_SIZE)
+    await detection_service.start()
+
+
+async def stop_detection_service():
+    if detection_service:
+        await detection_service.stop()
+        detection_service.model.close()
+
+
+def get_detection_service() -> MicroBatcher:
+    return detection_service
@@ -0,0 +1,284 @@
+import fcntl
+import gzip
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from core.config import settings
+from services.detection import DetectionModel, decode_image
+
+# modules/minio.py lives at the project root (appended, so backend's own `utils` keeps priority)
+if settings.PROJECT_ROOT not in sys.path:
+    sys.path.append(settings.PROJECT_ROOT)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+RESULT_COLUMNS = ["x1", "y1", "x2", "y2", "score", "class_id"]
+# A completed job's checkpoint is already compacted and deleted, so it can't be resumed
+RESUMABLE_STATUSES = ("pending", "running", "failed")
+
+# ---- worker process side -------------------------------------------------------
+
+_worker_model: Optional[DetectionModel] = None
+
+
+def _init_worker(metadata_path: str, package_path: str, threads: int):
+    """Load the model once per worker process, with its share of the CPU threads"""
+    global _worker_model
+    _worker_model = DetectionModel(
+        metadata_path, package_path, runtime={"pool_size": 1, "intra_op_num_threads": threads}
+    )
+
+
+def _detect_object(bucket: str, key: str, conf_threshold: float, nms_threshold: float) -> Dict[str, Any]:
+    """Fetch one object and detect on it inside a worker (image bytes never cross processes)"""
+    import modules.minio as minio
+
+    try:
+        decoded = decode_image(minio.get_file_bytes(bucket, key))
+        if decoded is None:
+            return {"key": key, "error": "not a valid image"}
+        image, scale = decoded
+        result = _worker_model.infer([image], [(conf_threshold, nms_threshold)])[0]
+    except Exception as e:
+        return {"key": key, "error": str(e)}
+
+    height, width = image.shape[:2]
+    rows = np.concatenate([
+        (result["boxes"] / scale).round(1),
+        result["scores"][:, None].round(4),
+        result["class_ids"][:, None],
+    ], axis=1)
+    return {"key": key, "size": [round(height / scale), round(width / scale)], "detections": rows.tolist()}
+
+
+# ---- job management (API process side) ------------------------------------------
+
+class DetectionJobManager:
+    """Bulk detection jobs over a MinIO bucket/prefix
+
+    Job state lives in <jobs_dir>/<id>.json and every finished image is
+    appended to <jobs_dir>/<id>.partial.jsonl, so a job interrupted by a crash
+    resumes where it stopped. When all objects are processed the checkpoint is
+    compacted into one gzipped JSON results object uploaded next to the data.
+
+    Every API worker process resumes interrupted jobs on startup; a job only
+    runs in the process holding the flock on <jobs_dir>/<id>.lock, which the
+    kernel releases if that process dies.
+    """
+
+    def __init__(self, jobs_dir: str):
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._threads: Dict[str, threading.Thread] = {}
+
+    def _state_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _checkpoint_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.partial.jsonl"
+
+    def _lock_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.lock"
+
+    def _claim(self, job_id: str) -> Optional[int]:
+        """Take the job's lock for this process; None when another process holds it"""
+        fd = os.open(self._lock_path(job_id), os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _save(self, job: Dict[str, Any]):
+        job["updated_at"] = datetime.utcnow().isoformat()
+        tmp_path = self._state_path(job["id"]).with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(job, indent=2))
+        os.replace(tmp_path, self._state_path(job["id"]))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = self._state_path(job_id)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def list(self) -> List[Dict[str, Any]]:
+        jobs = [json.loads(p.read_text()) for p in self.jobs_dir.glob("*.json")]
+        return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+    def create(self, bucket: str, prefix: str, output_prefix: str, conf_threshold: float,
+               nms_threshold: float, workers: int) -> Dict[str, Any]:
+        now = datetime.utcnow().isoformat()
+        job = {
+            "id": uuid.uuid4().hex,
+            "bucket": bucket,
+            "prefix": prefix,
+            "output_prefix": output_prefix,
+            "conf_threshold": conf_threshold,
+            "nms_threshold": nms_threshold,
+            "workers": workers,
+            "status": "pending",
+            "total": None,
+            "processed": 0,
+            "failed": 0,
+            "result_key": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._save(job)
+        self.start(job["id"])
+        return job
+
+    def start(self, job_id: str) -> Dict[str, Any]:
+        """Run (or resume) a job in a background thread"""
+        with self._lock:
+            thread = self._threads.get(job_id)
+            if thread and thread.is_alive():
+                return self.get(job_id)
+            thread = threading.Thread(target=self._run, args=(job_id,), daemon=True)
+            self._threads[job_id] = thread
+            thread.start()
+        return self.get(job_id)
+
+    def resume_interrupted(self):
+        """Restart jobs that were pending or running when the process died"""
+        for job in self.list():
+            if job["status"] in ("pending", "running"):
+                self.start(job["id"])  # a job another worker already claimed is skipped in _run
+
+    def _load_checkpoint(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        done = {}
+        path = self._checkpoint_path(job_id)
+        if path.exists():
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a crash; that image is redone
+                    done[record["key"]] = record
+        return done
+
+    def _rewrite_checkpoint(self, job_id: str, done: Dict[str, Dict[str, Any]]):
+        """Drop torn lines before appending again"""
+        path = self._checkpoint_path(job_id)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            for record in done.values():
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, path)
+
+    def _run(self, job_id: str):
+        lock = self._claim(job_id)
+        if lock is None:
+            return  # running in another API worker process
+        try:
+            job = self.get(job_id)
+            # Another process may have finished the job between our read and the claim
+            if job["status"] in RESUMABLE_STATUSES:
+                self._run_claimed(job)
+        finally:
+            os.close(lock)
+
+    def _run_claimed(self, job: Dict[str, Any]):
+        import modules.minio as minio
+
+        job_id = job["id"]
+        try:
+            job.update(status="running", error=None)
+            keys = [obj["Key"] for obj in minio.iter_files_by_prefix(job["bucket"], job["prefix"], IMAGE_EXTENSIONS)]
+            done = self._load_checkpoint(job_id)
+            self._rewrite_checkpoint(job_id, done)
+            pending = [key for key in keys if key not in done]
+            job.update(total=len(keys), processed=len(done),
+                       failed=sum(1 for record in done.values() if "error" in record))
+            self._save(job)
+
+            self._process(job, pending)
+            self._finalize(job, keys)
+        except Exception as e:
+            job.update(status="failed", error=str(e))
+            self._save(job)
+
+    def _process(self, job: Dict[str, Any], keys: List[str]):
+        workers = max(1, job["workers"])
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        max_in_flight = workers * 4
+
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(settings.DETECTION_METADATA_PATH, settings.DETECTOR_PACKAGE_PATH, threads),
+        )
+        with executor, open(self._checkpoint_path(job["id"]), "a") as checkpoint:
+            key_iter = iter(keys)
+            in_flight = set()
+            while True:
+                # Keep a bounded number of objects in flight instead of queueing the whole prefix
+                for key in key_iter:
+                    in_flight.add(executor.submit(
+                        _detect_object, job["bucket"], key, job["conf_threshold"], job["nms_threshold"]
+                    ))
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    checkpoint.write(json.dumps(record) + "\n")
+                    job["processed"] += 1
+                    job["failed"] += "error" in record
+                checkpoint.flush()
+                self._save(job)
+
+    def _finalize(self, job: Dict[str, Any], keys: List[str]):
+        import modules.minio as minio
+
+        records = self._load_checkpoint(job["id"])
+        metadata = json.loads(Path(settings.DETECTION_METADATA_PATH).read_text())
+        results = {
+            "job_id": job["id"],
+            "bucket": job["bucket"],
+            "prefix": job["prefix"],
+            "model_name": metadata.get("model_name"),
+            "classes": metadata["classes"],
+            "conf_threshold": job["conf_threshold"],
+            "nms_threshold": job["nms_threshold"],
+            "columns": RESULT_COLUMNS,
+            "images": {
+                key: {"size": records[key]["size"], "detections": records[key]["detections"]}
+                for key in keys if key in records and "error" not in records[key]
+            },
+            "failed": {key: records[key]["error"] for key in keys if key in records and "error" in records[key]},
+        }
+        data = gzip.compress(json.dumps(results, separators=(",", ":")).encode("utf-8"))
+
+        result_key = f"{job['output_prefix'].rstrip('/')}/{job['id']}.json.gz"
+        if not minio.put_file_bytes(job["bucket"], result_key, data, "application/gzip"):
+            raise RuntimeError(f"Failed to upload results to {result_key}")
+
+        job.update(status="completed", result_key=result_key)
+        self._save(job)
+        self._checkpoint_path(job["id"]).unlink(missing_ok=True)
+        self._lock_path(job["id"]).unlink(missing_ok=True)
+
+
+job_manager = DetectionJobManager(settings.DETECTION_JOBS_DIR)
+
+
+def get_job_manager() -> DetectionJobManager:
+    return job_manager
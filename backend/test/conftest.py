@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# database.py 는 import 시점에 테이블을 생성하므로 테스트는 메모리 SQLite 를 사용
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("DETECTION_JOBS_DIR", tempfile.mkdtemp(prefix="detection-jobs-"))
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import onnx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from onnx import TensorProto, helper, numpy_helper
+
+from core.config import settings
+from routes.detect import router
+from services.detection import DetectionModel, MicroBatcher, get_detection_service
+
+SCORES = (0.9, 0.6, 0.3)  # one box per class
+
+
+def constant_model(tmp_path, imgsz=32):
+    """model_metadata.json of an ONNX graph returning the same raw YOLOv8 output for any batch"""
+    outputs = np.zeros((7, 4), dtype=np.float32)
+    outputs[:4] = [[8, 20, 8, 24], [8, 20, 24, 8], [6, 10, 4, 4], [6, 10, 4, 4]]  # cx, cy, w, h rows
+    outputs[4, 0], outputs[5, 1], outputs[6, 2] = SCORES
+    graph = helper.make_graph(
+        [
+            helper.make_node('ReduceMean', ['images'], ['mean'], axes=[1, 2, 3], keepdims=0),
+            helper.make_node('Reshape', ['mean', 'shape'], ['mean3']),
+            helper.make_node('Mul', ['mean3', 'zero'], ['zeros']),
+            helper.make_node('Add', ['zeros', 'detections'], ['output0']),
+        ], 'constant',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, ['batch', 3, imgsz, imgsz])],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, ['batch', 7, 4])],
+        [
+            numpy_helper.from_array(np.array([-1, 1, 1], dtype=np.int64), 'shape'),
+            numpy_helper.from_array(np.array(0.0, dtype=np.float32), 'zero'),
+            numpy_helper.from_array(outputs, 'detections'),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 7
+    onnx.save(model, str(tmp_path / "model.onnx"))
+
+    metadata_path = tmp_path / "model_metadata.json"
+    metadata_path.write_text(json.dumps({
+        "model_path": str(tmp_path / "model.onnx"),
+        "classes": ["ec2", "s3", "lambda"],
+        "imgsz": imgsz,
+        "conf_threshold": 0.5,
+        "model_name": "constant",
+    }))
+    return str(metadata_path)
+
+
+class StubModel:
+    """DetectionModel stand-in: one full-image box per image, scored with the request's conf threshold"""
+
+    imgsz = 32
+    max_batch = None
+    class_names = ["ec2"]
+    model_name = "stub"
+
+    def __init__(self, error=None):
+        self.error = error
+        self.batches = []
+
+    def infer(self, images, thresholds):
+        self.batches.append(len(images))
+        if self.error:
+            raise self.error
+        return [{
+            "boxes": np.array([[0, 0, image.shape[1], image.shape[0]]], dtype=np.float32),
+            "scores": np.array([conf_threshold], dtype=np.float32),
+            "class_ids": np.array([0]),
+        } for image, (conf_threshold, _) in zip(images, thresholds)]
+
+
+def run(coroutine_function, batcher):
+    """Run a test coroutine with the batcher's loop started (and stopped afterwards)"""
+    async def main():
+        await batcher.start()
+        try:
+            return await coroutine_function()
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+
+def image(height=48, width=64):
+    return np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+
+class TestDetectionModel:
+    """Test stacked inference with per-request thresholds"""
+
+    def test_per_request_thresholds(self, tmp_path):
+        model = DetectionModel(constant_model(tmp_path), settings.DETECTOR_PACKAGE_PATH)
+        model.warmup()
+        results = model.infer([image(), image(), image(96, 32)], [(0.5, 0.45), (0.2, 0.45), (0.7, 0.45)])
+
+        assert [len(result["boxes"]) for result in results] == [2, 3, 1]
+        np.testing.assert_allclose(results[1]["scores"], SCORES, atol=1e-6)
+        # the same letterboxed box maps back into each image's own coordinates
+        assert results[2]["boxes"][:, 2:].max() <= 96
+
+
+class TestMicroBatcher:
+    """Test request batching, error propagation and incremental diagrams"""
+
+    def test_concurrent_requests_share_batches(self):
+        model = StubModel()
+        batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=50)
+
+        async def requests():
+            return await asyncio.gather(*(batcher.submit(image(), conf, 0.45) for conf in (0.1, 0.2, 0.3, 0.4, 0.5, 0.6)))
+
+        results = run(requests, batcher)
+        assert model.batches == [4, 2]
+        assert [result["batch_size"] for result in results] == [4, 4, 4, 4, 2, 2]
+        # every request gets its own result back, computed with its own threshold
+        np.testing.assert_allclose([result["scores"][0] for result in results], [0.1, 0.2, 0.3, 0.4, 0.5, 0.6])
+
+    def test_batch_size_capped_by_model(self):
+        model = StubModel()
+        model.max_batch = 1
+        batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=50)
+
+        async def requests():
+            return await asyncio.gather(*(batcher.submit(image(), 0.5, 0.45) for _ in range(3)))
+
+        run(requests, batcher)
+        assert model.batches == [1, 1, 1]
+
+    def test_errors_reach_every_request_in_the_batch(self):
+        model = StubModel(error=RuntimeError("session failed"))
+        batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=50)
+
+        async def requests():
+            failed = await asyncio.gather(*(batcher.submit(image(), 0.5, 0.45) for _ in range(3)),
+                                          return_exceptions=True)
+            model.error = None
+            return failed, await batcher.submit(image(), 0.5, 0.45)  # the loop keeps running
+
+        failed, result = run(requests, batcher)
+        assert all(isinstance(error, RuntimeError) and str(error) == "session failed" for error in failed)
+        assert len(result["boxes"]) == 1
+
+    def test_submit_diagram_reuses_unchanged_tiles(self):
+        model = StubModel()
+        batcher = MicroBatcher(model, max_batch_size=64, max_wait_ms=20)
+        diagram = image(80, 100)
+
+        async def requests():
+            first = await batcher.submit_diagram("d", diagram, 0.5, 0.45)
+            second = await batcher.submit_diagram("d", diagram, 0.5, 0.45)
+            return first, second
+
+        first, second = run(requests, batcher)
+        assert first["tiles_inferred"] == first["tiles_total"] > 1
+        assert sum(model.batches) == first["tiles_total"] + 1  # tiles + whole-image pass
+        assert second["tiles_inferred"] == 0 and second["batch_size"] == 0
+        np.testing.assert_array_equal(first["boxes"], second["boxes"])
+
+
+class TestDetectRoute:
+    """Test POST /detect end to end on the constant model"""
+
+    @pytest.fixture
+    def client(self, tmp_path):
+        model = DetectionModel(constant_model(tmp_path), settings.DETECTOR_PACKAGE_PATH)
+        batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=1)
+        app = FastAPI()
+        app.include_router(router, prefix="/detect")
+        app.dependency_overrides[get_detection_service] = lambda: batcher
+        # the batching loop must run on the app's event loop
+        app.add_event_handler("startup", batcher.start)
+        app.add_event_handler("shutdown", batcher.stop)
+        with TestClient(app) as client:
+            yield client
+
+    def upload(self, client, **form):
+        png = cv2.imencode(".png", image())[1].tobytes()
+        return client.post("/detect", files={"file": ("diagram.png", png, "image/png")}, data=form)
+
+    def test_detect(self, client):
+        response = self.upload(client, conf_threshold="0.5")
+        assert response.status_code == 200
+        body = response.json()
+        assert (body["image_width"], body["image_height"], body["batch_size"]) == (64, 48, 1)
+        assert [d["class_name"] for d in body["detections"]] == ["ec2", "s3"]
+        assert body["tiles_total"] is None
+
+        assert len(self.upload(client, conf_threshold="0.2").json()["detections"]) == 3
+
+    def test_detect_diagram(self, client):
+        body = self.upload(client, diagram_id="d").json()
+        assert body["tiles_total"] == body["tiles_inferred"] > 1
+        assert self.upload(client, diagram_id="d").json()["tiles_inferred"] == 0
+
+    def test_upload_above_max_image_size(self, client, monkeypatch):
+        full = self.upload(client, conf_threshold="0.2").json()
+        monkeypatch.setattr(settings, "DETECTION_MAX_IMAGE_SIZE", 32)
+        reduced = self.upload(client, conf_threshold="0.2").json()
+
+        # detected on a 32 x 24 decode, reported on the 64 x 48 upload
+        assert (reduced["image_width"], reduced["image_height"]) == (64, 48)
+        np.testing.assert_allclose([d["box"] for d in reduced["detections"]],
+                                   [d["box"] for d in full["detections"]], atol=1e-3)
+
+    def test_invalid_image(self, client):
+        response = client.post("/detect", files={"file": ("x.png", b"not an image", "image/png")})
+        assert response.status_code == 422
+
+    def test_model_not_loaded(self):
+        app = FastAPI()
+        app.include_router(router, prefix="/detect")
+        app.dependency_overrides[get_detection_service] = lambda: None
+        response = TestClient(app).post("/detect", files={"file": ("x.png", b"", "image/png")})
+        assert response.status_code == 500
+
+
+class TestImport:
+    """Test that importing the service has no side effects"""
+
+    def test_package_loaded_on_first_use(self, tmp_path):
+        code = "import sys, services.detection; assert 'detector_utils' not in sys.modules"
+        env = {**os.environ, "DETECTOR_PACKAGE_PATH": str(tmp_path / "missing")}
+        result = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).resolve().parent.parent,
+                                env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
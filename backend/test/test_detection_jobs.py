@@ -0,0 +1,146 @@
+import gzip
+import json
+import os
+import sys
+import types
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.config import settings
+from routes.jobs import router
+from services.detection_jobs import DetectionJobManager, get_job_manager
+
+
+class StubJobManager(DetectionJobManager):
+    """Job manager that records one fake detection per key instead of running the process pool"""
+
+    def __init__(self, jobs_dir, fail_after=None):
+        super().__init__(jobs_dir)
+        self.fail_after = fail_after
+        self.processed_keys = []
+
+    def _process(self, job, keys):
+        with open(self._checkpoint_path(job["id"]), "a") as checkpoint:
+            for i, key in enumerate(keys):
+                if i == self.fail_after:
+                    raise RuntimeError("worker crashed")
+                self.processed_keys.append(key)
+                checkpoint.write(json.dumps({"key": key, "size": [10, 10], "detections": [[1, 1, 5, 5, 0.9, 0]]}) + "\n")
+                job["processed"] += 1
+
+
+@pytest.fixture
+def uploads(monkeypatch, tmp_path):
+    """Fake modules.minio listing a.png, b.png, c.png; returns the uploaded objects"""
+    uploaded = {}
+    minio = types.ModuleType("modules.minio")
+    minio.iter_files_by_prefix = lambda bucket, prefix, extensions: [
+        {"Key": f"{prefix}{name}"} for name in ("a.png", "b.png", "c.png")
+    ]
+    minio.put_file_bytes = lambda bucket, key, data, content_type: uploaded.__setitem__(key, data) or True
+    package = types.ModuleType("modules")
+    package.minio = minio
+    monkeypatch.setitem(sys.modules, "modules", package)
+    monkeypatch.setitem(sys.modules, "modules.minio", minio)
+
+    metadata_path = tmp_path / "model_metadata.json"
+    metadata_path.write_text(json.dumps({"model_name": "test", "classes": ["icon"]}))
+    monkeypatch.setattr(settings, "DETECTION_METADATA_PATH", str(metadata_path))
+    return uploaded
+
+
+def run(manager, job_id):
+    """Start a job and wait for its thread"""
+    manager.start(job_id)
+    manager._threads[job_id].join(10)
+    return manager.get(job_id)
+
+
+def create(manager):
+    job = manager.create("bucket", "data/", "results/", 0.5, 0.45, workers=1)
+    manager._threads[job["id"]].join(10)
+    return manager.get(job["id"])
+
+
+class TestDetectionJobManager:
+    """Test running, resuming and finalizing bulk detection jobs"""
+
+    def test_finalize_uploads_results(self, tmp_path, uploads):
+        manager = StubJobManager(tmp_path / "jobs")
+        job = create(manager)
+
+        assert job["status"] == "completed" and job["processed"] == job["total"] == 3
+        assert job["result_key"] == f"results/{job['id']}.json.gz"
+        results = json.loads(gzip.decompress(uploads[job["result_key"]]))
+        assert sorted(results["images"]) == ["data/a.png", "data/b.png", "data/c.png"]
+        assert results["classes"] == ["icon"]
+        assert not manager._checkpoint_path(job["id"]).exists()
+        assert not manager._lock_path(job["id"]).exists()
+
+    def test_resume_skips_checkpointed_images(self, tmp_path, uploads):
+        manager = StubJobManager(tmp_path / "jobs", fail_after=1)
+        job = create(manager)
+        assert job["status"] == "failed" and job["processed"] == 1
+        with open(manager._checkpoint_path(job["id"]), "a") as checkpoint:
+            checkpoint.write('{"key": "data/b.png", "si')  # torn line from a crash
+
+        manager.fail_after = None
+        job = run(manager, job["id"])
+
+        assert job["status"] == "completed"
+        assert manager.processed_keys == ["data/a.png", "data/b.png", "data/c.png"]
+        assert len(json.loads(gzip.decompress(uploads[job["result_key"]]))["images"]) == 3
+
+    def test_job_claimed_by_another_process_is_skipped(self, tmp_path, uploads):
+        manager = StubJobManager(tmp_path / "jobs", fail_after=0)
+        job_id = create(manager)["id"]
+        manager.fail_after = None
+
+        # flock conflicts between open file descriptions, as between two API workers
+        lock = DetectionJobManager(tmp_path / "jobs")._claim(job_id)
+        assert lock is not None
+        assert run(manager, job_id)["status"] == "failed"
+        assert manager.processed_keys == []
+
+        os.close(lock)
+        assert run(manager, job_id)["status"] == "completed"
+
+    def test_completed_job_is_not_rerun(self, tmp_path, uploads):
+        manager = StubJobManager(tmp_path / "jobs")
+        job = create(manager)
+        manager.resume_interrupted()
+        run(manager, job["id"])
+
+        assert manager.processed_keys == ["data/a.png", "data/b.png", "data/c.png"]
+        assert manager.get(job["id"])["updated_at"] == job["updated_at"]
+
+
+class TestJobRoutes:
+    """Test the job resume endpoint"""
+
+    def client(self, manager):
+        app = FastAPI()
+        app.include_router(router, prefix="/jobs")
+        app.dependency_overrides[get_job_manager] = lambda: manager
+        return TestClient(app)
+
+    def test_resume_rejects_completed_job(self, tmp_path, uploads):
+        manager = StubJobManager(tmp_path / "jobs")
+        job = create(manager)
+
+        response = self.client(manager).post(f"/jobs/{job['id']}/resume")
+        assert response.status_code == 409
+
+    def test_resume_failed_job(self, tmp_path, uploads):
+        manager = StubJobManager(tmp_path / "jobs", fail_after=0)
+        job = create(manager)
+        manager.fail_after = None
+
+        assert self.client(manager).post(f"/jobs/{job['id']}/resume").status_code == 200
+        manager._threads[job["id"]].join(10)
+        assert manager.get(job["id"])["status"] == "completed"
+
+    def test_resume_unknown_job(self, tmp_path):
+        assert self.client(StubJobManager(tmp_path / "jobs")).post("/jobs/missing/resume").status_code == 404
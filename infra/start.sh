@@ -34,6 +34,9 @@ if [ ! -d "$POSTGRES_DATA_DIR" ]; then
 fi
 
 # Docker Compose로 서비스 시작
+# Prometheus 와 streamlit-app(docker/docker-compose.yml)이 공유하는 모니터링 네트워크
+docker network inspect detector-monitoring >/dev/null 2>&1 || docker network create detector-monitoring
+
 echo "🐳 Docker Compose로 서비스를 시작합니다..."
 docker-compose -f compose.full.yml up -d
 
@@ -1,7 +1,7 @@
 import boto3
 import botocore
 from botocore.exceptions import ClientError
-from typing import Any, List, Optional
+from typing import Any, Iterator, List, Optional
 
 s3 = boto3.client(
     's3',
@@ -212,6 +212,61 @@ def list_files_by_prefix(bucket_name: str, prefix: str = "") -> List[dict[str, A
         print(f"접두사 파일 조회 실패: {e}")
         return []
 
+def iter_files_by_prefix(bucket_name: str, prefix: str = "", extensions: Optional[tuple] = None) -> Iterator[dict[str, Any]]:
+    """
+    특정 접두사로 시작하는 파일들을 페이지 단위로 순회합니다. (1000개 이상도 모두 조회)
+    
+    Args:
+        bucket_name: 버킷 이름
+        prefix: 파일 키 접두사 (예: 'processed/unlabeled/')
+        extensions: 허용할 확장자 튜플 (예: ('.png', '.jpg')) — 없으면 전체
+    
+    Yields:
+        파일 정보 딕셔너리
+    """
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith('/'):
+                continue
+            if extensions and not obj['Key'].lower().endswith(extensions):
+                continue
+            yield obj
+
+def get_file_bytes(bucket_name: str, key: str) -> bytes:
+    """
+    파일 내용을 로컬에 저장하지 않고 메모리로 읽어옵니다.
+    
+    Args:
+        bucket_name: 버킷 이름
+        key: 파일 키
+    
+    Returns:
+        파일 바이트 데이터
+    """
+    response = s3.get_object(Bucket=bucket_name, Key=key)
+    return response['Body'].read()
+
+def put_file_bytes(bucket_name: str, key: str, data: bytes, content_type: str = 'application/octet-stream') -> bool:
+    """
+    메모리의 바이트 데이터를 파일로 업로드합니다. (기존 파일은 덮어씀)
+    
+    Args:
+        bucket_name: 버킷 이름
+        key: 파일 키
+        data: 업로드할 바이트 데이터
+        content_type: Content-Type 헤더
+    
+    Returns:
+        업로드 성공 여부
+    """
+    try:
+        s3.put_object(Bucket=bucket_name, Key=key, Body=data, ContentType=content_type)
+        return True
+    except Exception as e:
+        print(f"파일 {key} 업로드 실패: {e}")
+        return False
+
 def delete_file(bucket_name: str, key: str) -> bool:
     """
     파일을 삭제합니다.
@@ -1,14 +1,21 @@
 import streamlit as st
-import cv2
 import numpy as np
-import onnxruntime as ort
 import json
+import os
 from pathlib import Path
-from PIL import Image
 import time
-import torch
 import tempfile
-from ultralytics import YOLO
+import yaml
+
+from utils.cache import LRUCache, content_hash, model_identity
+from utils.crop import crop_to_content, offset_ratio_pad
+from utils.decode import decode_image
+from utils.hierarchy import build_hierarchy, format_tree
+from utils.metrics import CACHE_HITS_TOTAL, STAGES, observe_image, start_metrics_server, timed
+from utils.postprocess import decode_predictions, scale_boxes
+from utils.preprocess import letterbox, raw_image_input
+from utils.session import SessionPool, load_runtime_config, takes_raw_images
+from utils.visualizer import get_renderer
 
 # Page configuration
 st.set_page_config(
@@ -38,41 +45,71 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def convert_pt_to_onnx_and_metadata():
-    """Convert PyTorch model to ONNX and create metadata"""
+def convert_pt_to_onnx_and_metadata(dynamic_batch: bool = False, imgsz: int = 320, fold_preprocessing: bool = False):
+    """Convert PyTorch model to ONNX and create metadata
+
+    Exports every variant in utils.export.EXPORT_VARIANTS, benchmarks them on
+    the sample images (or, without samples, on AWS-Icon-Detector--4/test
+    images) and keeps the fastest one whose detections match the plain export. The exact export settings are recorded under "export".
+
+    Conversions are cached in models/export_cache/ by the SHA-256 of the
+    weights and the export arguments, so restarts and concurrent workers
+    reuse one export instead of converting again.
+
+    With dynamic_batch=True the exported graph has a dynamic batch axis, so
+    ObjectDetector.detect_batch can run several images per session.run.
+    With fold_preprocessing=True the letterbox runs inside the graph, which
+    then takes the decoded uint8 image as is.
+    """
+    from utils.export import cached_export
+    from utils.quantization import sample_images
+
     # 현재 스크립트 위치 기준으로 models 디렉토리 찾기
     current_dir = Path(__file__).parent
     models_dir = current_dir / "models"
     
-    pt_files = list(models_dir.glob("*.pt"))
+    pt_files = sorted(models_dir.glob("*.pt"))
     if not pt_files: 
         st.error(f"No PT files found in {models_dir}")
         return None, None
+    if len(pt_files) > 1:
+        st.warning(f"Multiple PT files found, converting {pt_files[0].name}")
     
     try:
-        # Load YOLO model using ultralytics
-        model = YOLO(pt_files[0])
-        onnx_path = pt_files[0].with_suffix('.onnx')
-        
-        # Export to ONNX using YOLO's export method
-        model.export(format='onnx', imgsz=320, opset=11)
-        
-        # Get class names from the model
-        class_names = list(model.names.values()) if hasattr(model, 'names') else ["aws_service"]
+        # Benchmark images: the bundled samples, else a subset of the dataset's test split
+        sample_dir = current_dir / "samples"
+        image_paths = sorted(
+            p for ext in ("*.png", "*.jpg", "*.jpeg") for p in sample_dir.glob(ext)
+        ) if sample_dir.exists() else []
+        dataset_dir = current_dir.parent / "AWS-Icon-Detector--4" / "test" / "images"
+        if not image_paths and dataset_dir.exists():
+            image_paths = sample_images(str(dataset_dir), num_samples=16)
+
+        # Export all variants (or reuse a cached conversion of the same weights)
+        entry = cached_export(pt_files[0], models_dir / "export_cache", imgsz=imgsz,
+                              dynamic=dynamic_batch, image_paths=image_paths, fold=fold_preprocessing)
+        export = entry["export"]
+        onnx_path = Path(export["model_path"])
+        class_names = entry["classes"] or ["aws_service"]
         
         metadata = {
             "model_path": str(onnx_path), 
             "classes": class_names, 
-            "imgsz": 320, 
+            "imgsz": imgsz, 
             "conf_threshold": 0.5, 
             "model_name": pt_files[0].stem, 
             "num_classes": len(class_names), 
+            "dynamic_batch": dynamic_batch,
+            "export": export,
             "timestamp": time.strftime("%Y%m%d_%H%M%S")
         }
+        # Written to a temporary file and renamed, so no worker reads a half-written file
         metadata_path = models_dir / "model_metadata.json"
-        metadata_path.write_text(json.dumps(metadata, indent=2))
+        tmp_path = metadata_path.with_name(f".{metadata_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(metadata, indent=2))
+        os.replace(tmp_path, metadata_path)
         
-        st.success(f"✅ Successfully converted {pt_files[0].name} to ONNX")
+        st.success(f"✅ Successfully converted {pt_files[0].name} to ONNX ({export['variant']} export)")
         return str(onnx_path), metadata
     except Exception as e:
         st.error(f"Failed to convert model: {e}")
@@ -97,69 +134,136 @@ def load_model_and_metadata(metadata_path: str):
             st.error(f"Model file not found: {model_path}")
             st.stop()
 
-        # Load ONNX model
-        session = ort.InferenceSession(model_path)
+        # Load ONNX model into a session pool configured by config.yaml / metadata "runtime"
+        runtime = load_runtime_config(metadata, Path(__file__).parent / "config.yaml")
+        session = SessionPool(model_path, **runtime)
         return session, metadata
     except Exception as e:
         st.error(f"Failed to load model or metadata: {e}")
         st.stop()
 
-def preprocess_image(image: np.ndarray, imgsz: int):
-    """Preprocess image for YOLOv8 ONNX inference"""
-    # Handle different image formats
-    if len(image.shape) == 2:  # Grayscale
-        img = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-    elif len(image.shape) == 3:
-        if image.shape[2] == 4:  # RGBA
-            img = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
-        elif image.shape[2] == 3:  # RGB
-            img = image.copy()
-        else:
-            # Handle other channel formats by converting to RGB
-            img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    else:
-        raise ValueError(f"Unsupported image format with shape: {image.shape}")
-    
-    img = cv2.resize(img, (imgsz, imgsz))
-    img = img.transpose(2, 0, 1).astype(np.float32) / 255.0  # HWC to CHW, normalize
-    img = np.expand_dims(img, axis=0)  # Add batch dimension
-    return img
+def load_app_config() -> dict:
+    """Load streamlit-app/config.yaml"""
+    config_path = Path(__file__).parent / "config.yaml"
+    if not config_path.exists():
+        return {}
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f) or {}
 
-def postprocess_detections(outputs: np.ndarray, conf_threshold: float, nms_threshold: float, img_shape: tuple, imgsz: int):
-    """Postprocess YOLOv8 ONNX outputs with NMS"""
-    boxes = outputs[0][:, :4]  # x, y, w, h
-    scores = outputs[0][:, 4]  # Confidence scores
-    class_ids = outputs[0][:, 5].astype(int)  # Class IDs
+@st.cache_resource
+def get_output_cache(maxsize: int):
+    """Raw model output cache shared by all sessions of this process"""
+    return LRUCache(maxsize)
+
+@st.cache_resource
+def start_metrics(port: int):
+    """Start the Prometheus /metrics endpoint once per process"""
+    return start_metrics_server(port)
+
+def run_inference_cached(session, cache: LRUCache, image_bytes: bytes, img_array: np.ndarray, imgsz: int,
+                         durations: dict = None, auto_crop: bool = False):
+    """Run the model, reusing the raw output cached for the same image and model
+
+    Slider changes rerun the script with the same upload, so only the cheap
+    decode/NMS step runs again. With auto_crop only the content bounding box
+    (never smaller than imgsz) is fed to the model; the crop offset is folded
+    into ratio_pad, so postprocess_detections still maps to full image
+    coordinates. Returns (outputs, ratio_pad, cache_hit).
+    """
+    key = (content_hash(image_bytes), model_identity(session.model_path), imgsz, auto_crop)
+    cached = cache.get(key)
+    if cached is not None:
+        CACHE_HITS_TOTAL.inc()
+        return cached[0], cached[1], True
+
+    with timed("preprocess", durations):
+        content, offset = crop_to_content(img_array, min_size=imgsz) if auto_crop else (img_array, (0, 0))
+        img_input, ratio_pad = preprocess_image(content, imgsz, takes_raw_images(session))
+        ratio_pad = offset_ratio_pad(ratio_pad, offset)
+    with timed("inference", durations):
+        outputs = session.run(None, {"images": img_input})[0]  # Assuming YOLOv8 ONNX output
+    outputs.setflags(write=False)  # shared between reruns, postprocessing must not modify it
+    cache.put(key, (outputs, ratio_pad))
+    return outputs, ratio_pad, False
+
+def preprocess_image(image: np.ndarray, imgsz: int, raw_input: bool = False):
+    """Letterbox image into the cached YOLOv8 ONNX input buffer
+
+    Returns the (1, 3, imgsz, imgsz) float32 tensor and the ratio/pad used,
+    which postprocess_detections needs to map boxes back exactly. Graphs
+    exported with folded preprocessing (raw_input=True) take the uint8
+    (H, W, 3) image itself.
+    """
+    if raw_input:
+        return raw_image_input(image, imgsz)
+    return letterbox(image, imgsz)
+
+def postprocess_detections(outputs: np.ndarray, conf_threshold: float, nms_threshold: float, img_shape: tuple, imgsz: int,
+                           ratio_pad: tuple = None):
+    """Postprocess raw YOLOv8 ONNX outputs [1, 4 + nc, anchors] with class-aware NMS"""
+    boxes, scores, class_ids = decode_predictions(outputs, conf_threshold, nms_threshold)[0]
 
     # Scale boxes back to original image size
-    scale_x, scale_y = img_shape[1] / imgsz, img_shape[0] / imgsz
-    boxes[:, [0, 2]] *= scale_x  # x coordinates
-    boxes[:, [1, 3]] *= scale_y  # y coordinates
-
-    # Convert center-based (x, y, w, h) to corner-based (x1, y1, x2, y2)
-    boxes[:, 0] = boxes[:, 0] - boxes[:, 2] / 2  # x1 = x - w/2
-    boxes[:, 1] = boxes[:, 1] - boxes[:, 3] / 2  # y1 = y - h/2
-    boxes[:, 2] = boxes[:, 0] + boxes[:, 2]      # x2 = x + w/2
-    boxes[:, 3] = boxes[:, 1] + boxes[:, 3]      # y2 = y + h/2
-
-    # Apply NMS (Non-Maximum Suppression)
-    indices = cv2.dnn.NMSBoxes(
-        boxes.tolist(), scores.tolist(), conf_threshold, nms_threshold
-    )
-    if isinstance(indices, tuple):
-        indices = indices[0]  # Handle tuple output in some OpenCV versions
+    boxes = scale_boxes(boxes, img_shape, (imgsz, imgsz), ratio_pad)
+    return boxes, scores, class_ids
+
+def draw_detections(image: np.ndarray, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, class_names: list,
+                    preview_size: int = None):
+    """Draw bounding boxes and labels on the image
+
+    Uses the shared renderer (color LUT + cached label sprites) and returns a
+    new image.
+    """
+    return get_renderer(tuple(class_names)).render(image, boxes, scores, class_ids, preview_size)
 
-    return boxes[indices], scores[indices], class_ids[indices]
+def show_document_results(session, pdf_bytes: bytes, imgsz: int, conf_threshold: float, nms_threshold: float,
+                          class_names: list, max_image_size: int = 2048, preview_size: int = None,
+                          auto_crop: bool = False):
+    """Detect on a multi-page PDF, showing every page as soon as its detections are ready
 
-def draw_detections(image: np.ndarray, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, class_names: list):
-    """Draw bounding boxes and labels on the image"""
-    img = image.copy()
-    for box, score, class_id in zip(boxes, scores, class_ids):
-        x1, y1, x2, y2 = map(int, box)
-        label = f"{class_names[class_id]}: {score:.2f}"
-        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-        cv2.putText(img, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-    return img
+    Pages are rasterized lazily (longer side at max_image_size) on a background
+    thread, at most two pages ahead of detection.
+    """
+    from utils.document import iter_pdf_pages, stream_detections
+
+    def detect(page: np.ndarray):
+        with timed("preprocess"):
+            content, offset = crop_to_content(page, min_size=imgsz) if auto_crop else (page, (0, 0))
+            img_input, ratio_pad = preprocess_image(content, imgsz, takes_raw_images(session))
+            ratio_pad = offset_ratio_pad(ratio_pad, offset)
+        with timed("inference"):
+            outputs = session.run(None, {"images": img_input})[0]
+        with timed("postprocess"):
+            detections = postprocess_detections(outputs, conf_threshold, nms_threshold, page.shape[:2], imgsz, ratio_pad)
+        observe_image(page.shape, len(detections[0]))
+        return detections
+
+    total_detections = 0
+    start_time = time.time()
+    try:
+        pages = stream_detections(iter_pdf_pages(pdf_bytes, max_side=max_image_size), detect)
+        for page_number, page, (boxes, scores, class_ids) in pages:
+            total_detections += len(boxes)
+            with st.expander(f"📄 Page {page_number}: {len(boxes)} services", expanded=page_number == 1):
+                with timed("render"):
+                    rendered = draw_detections(page, boxes, scores, class_ids, class_names, preview_size)
+                st.image(rendered, use_container_width=True)
+                st.dataframe([
+                    {
+                        'Service': class_names[int(class_id)] if int(class_id) < len(class_names) else f'Class_{int(class_id)}',
+                        'Confidence': f"{score:.3f}",
+                        'Location': f"({box[0]:.0f}, {box[1]:.0f}, {box[2]:.0f}, {box[3]:.0f})"
+                    }
+                    for box, score, class_id in zip(boxes, scores, class_ids)
+                ], use_container_width=True)
+    except ImportError:
+        st.error("PDF support requires PyMuPDF: pip install pymupdf")
+        return
+    except Exception as e:
+        st.error(f"Failed to process PDF: {e}")
+        return
+
+    st.caption(f"{total_detections} services detected in {time.time() - start_time:.2f}s")
 
 def main():
     st.markdown('<h1 class="main-header">🔍 AWS Diagram Object Detection</h1>', unsafe_allow_html=True)
@@ -183,7 +287,10 @@ def main():
         
         if not metadata_path.exists() or metadata_path.stat().st_size == 0:
             # Try to convert PT model to ONNX and create metadata
-            onnx_path, metadata = convert_pt_to_onnx_and_metadata()
+            model_config = load_app_config().get("model", {})
+            onnx_path, metadata = convert_pt_to_onnx_and_metadata(
+                fold_preprocessing=model_config.get("fold_preprocessing", False)
+            )
             if onnx_path and metadata:
                 metadata_path = models_dir / "model_metadata.json"
                 st.sidebar.success("✅ Converted PT model to ONNX and created metadata")
@@ -198,6 +305,15 @@ def main():
     class_names = metadata["classes"]
     imgsz = metadata["imgsz"]
     default_conf = metadata["conf_threshold"]
+    app_config = load_app_config()
+    output_cache = get_output_cache(app_config.get("model", {}).get("output_cache_size", 16))
+    max_image_size = app_config.get("model", {}).get("max_image_size", 2048)
+    auto_crop = app_config.get("model", {}).get("auto_crop", False)
+    preview_size = (app_config.get("visualization") or {}).get("preview_size")
+    upload_formats = app_config.get("model", {}).get("supported_formats", ["png", "jpg", "jpeg", "pdf"])
+    metrics_config = app_config.get("metrics") or {}
+    if metrics_config.get("enabled", True):
+        start_metrics(metrics_config.get("port", 9108))
 
     # Detection settings
     confidence_threshold = st.sidebar.slider(
@@ -214,13 +330,19 @@ def main():
             "num_classes": metadata.get("num_classes", 0),
             "timestamp": metadata.get("timestamp", "Unknown")
         })
+    export = metadata.get("export") or {}
+    if export and not export.get("benchmark"):
+        st.sidebar.warning(
+            f"⚠️ Export variant '{export.get('variant')}' is the default, not benchmarked "
+            "(no images were found; clear models/export_cache/ to re-run the selection)"
+        )
 
     # Main content
     col1, col2 = st.columns([1, 1])
 
     with col1:
         st.header("📤 Upload Image")
-        uploaded_file = st.file_uploader("Choose an AWS architecture diagram", type=['png', 'jpg', 'jpeg'])
+        uploaded_file = st.file_uploader("Choose an AWS architecture diagram", type=upload_formats)
 
         # Sample images
         st.subheader("Or try a sample:")
@@ -256,41 +378,53 @@ def main():
 
     with col2:
         st.header("🎯 Detection Results")
-        if uploaded_file or selected_sample:
+        if uploaded_file and uploaded_file.name.lower().endswith(".pdf"):
+            show_document_results(
+                session, uploaded_file.getvalue(), imgsz, confidence_threshold, nms_threshold,
+                class_names, max_image_size, preview_size, auto_crop
+            )
+        elif uploaded_file or selected_sample:
             # Load image
             try:
                 if uploaded_file:
-                    image = Image.open(uploaded_file)
+                    image_bytes = uploaded_file.getvalue()
                 else:
-                    image = Image.open(selected_sample)
-                
-                # Convert RGBA to RGB if necessary
-                if image.mode == 'RGBA':
-                    image = image.convert('RGB')
+                    image_bytes = selected_sample.read_bytes()
                 
-                img_array = np.array(image)
-                img_shape = img_array.shape[:2]  # Original shape (height, width)
+                # Decode once to RGB, downscaled so the longer side is at most max_image_size
+                durations = {}
+                with timed("decode", durations):
+                    img_array, image_scale = decode_image(image_bytes, max_image_size)
+                img_shape = img_array.shape[:2]  # Decoded shape (height, width)
             except Exception as e:
                 st.error(f"Failed to load image: {e}")
                 return
 
             # Display original image
             st.subheader("Original Image")
-            st.image(image, use_container_width=True)
+            st.image(img_array, use_container_width=True)
+            if image_scale < 1:
+                st.caption(f"Downscaled to {img_shape[1]}x{img_shape[0]} for detection (max_image_size: {max_image_size})")
 
             # Preprocess and run inference
             with st.spinner("🔍 Detecting AWS services..."):
                 start_time = time.time()
-                img_input = preprocess_image(img_array, imgsz)
-                outputs = session.run(None, {"images": img_input})[0]  # Assuming YOLOv8 ONNX output
-                boxes, scores, class_ids = postprocess_detections(
-                    outputs, confidence_threshold, nms_threshold, img_shape, imgsz
+                outputs, ratio_pad, cache_hit = run_inference_cached(
+                    session, output_cache, image_bytes, img_array, imgsz, durations, auto_crop
                 )
+                with timed("postprocess", durations):
+                    boxes, scores, class_ids = postprocess_detections(
+                        outputs, confidence_threshold, nms_threshold, img_shape, imgsz, ratio_pad
+                    )
                 inference_time = time.time() - start_time
+                observe_image(img_shape, len(boxes))
+            if cache_hit:
+                st.caption("⚡ Reused cached model output (only thresholds changed)")
 
             # Display results
             if len(boxes) > 0:
-                img_with_detections = draw_detections(img_array, boxes, scores, class_ids, class_names)
+                with timed("render", durations):
+                    img_with_detections = draw_detections(img_array, boxes, scores, class_ids, class_names, preview_size)
                 st.subheader("🎯 Detected Services")
                 st.image(img_with_detections, use_container_width=True)
 
@@ -308,18 +442,31 @@ def main():
                 </div>
                 """, unsafe_allow_html=True)
 
-                # Detailed results table
+                # Detailed results table, in the coordinates of the uploaded file
+                # (boxes are drawn on the downscaled image, reported at original resolution)
                 st.subheader("📋 Detailed Results")
-                results_data = [
-                    {
-                        'Service': class_names[int(class_id)] if int(class_id) < len(class_names) else f'Class_{int(class_id)}',
-                        'Confidence': f"{score:.3f}",
-                        'Location': f"({box[0]:.0f}, {box[1]:.0f}, {box[2]:.0f}, {box[3]:.0f})"
-                    }
-                    for box, score, class_id in zip(boxes, scores, class_ids)
-                ]
+                with timed("serialize", durations):
+                    original_boxes = boxes / image_scale
+                    results_data = [
+                        {
+                            'Service': class_names[int(class_id)] if int(class_id) < len(class_names) else f'Class_{int(class_id)}',
+                            'Confidence': f"{score:.3f}",
+                            'Location': f"({box[0]:.0f}, {box[1]:.0f}, {box[2]:.0f}, {box[3]:.0f})"
+                        }
+                        for box, score, class_id in zip(original_boxes, scores, class_ids)
+                    ]
+                    # Containment hierarchy (Region > AZ > Subnet > services)
+                    hierarchy = build_hierarchy(original_boxes, scores, class_ids, class_names)
                 st.dataframe(results_data, use_container_width=True)
 
+                with st.expander("🗂️ Containment Hierarchy"):
+                    st.code(format_tree(hierarchy["tree"]), language=None)
+
+                # Per-stage breakdown (the same timings are exported on /metrics)
+                st.caption(" · ".join(
+                    f"{stage} {durations[stage] * 1000:.1f} ms" for stage in STAGES if stage in durations
+                ))
+
                 # Download results
                 if st.button("💾 Download Results as JSON"):
                     results_json = {
@@ -327,13 +474,17 @@ def main():
                             'inference_time': inference_time,
                             'model_name': metadata.get('model_name', 'Unknown'),
                             'confidence_threshold': confidence_threshold,
-                            'nms_threshold': nms_threshold
+                            'nms_threshold': nms_threshold,
+                            'image_scale': image_scale
                         },
-                        'detections': results_data
+                        'detections': results_data,
+                        'hierarchy': hierarchy["tree"]
                     }
+                    with timed("serialize"):
+                        results_text = json.dumps(results_json, indent=2)
                     st.download_button(
                         label="Download JSON",
-                        data=json.dumps(results_json, indent=2),
+                        data=results_text,
                         file_name=f"aws_detection_results_{int(time.time())}.json",
                         mime="application/json"
                     )
@@ -0,0 +1,87 @@
+"""Import-time report for the serving path
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+each entry point and summarizes the output: total import time, the slowest
+modules (cumulative and self time) and whether any heavy framework was
+imported. The report is written to import_time.json next to this script.
+
+Usage (from streamlit-app/):
+    python benchmarks/import_time.py
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+REPORT_PATH = Path(__file__).resolve().parent / "import_time.json"
+
+# Entry points of the ONNX serving path
+ENTRY_POINTS = ["utils.inference", "app"]
+
+# Frameworks the serving path must not import
+HEAVY_MODULES = ["torch", "ultralytics", "tensorflow", "keras"]
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self_us, cumulative_us) rows of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module: str, top: int = 10) -> dict:
+    """Import one module in a fresh interpreter and summarize where the time went"""
+    code = (
+        f"import json, sys; import {module}; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=APP_DIR, capture_output=True, text=True, check=True,
+    )
+    rows = parse_importtime(result.stderr)
+    heavy = json.loads(result.stdout.strip().splitlines()[-1])
+    total_us = sum(self_us for _, self_us, _ in rows)
+
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules": len(rows),
+        "heavy_modules": heavy,
+        "top_cumulative_ms": {
+            name: round(cum / 1000, 1) for name, _, cum in sorted(rows, key=lambda r: -r[2])[:top]
+        },
+        "top_self_ms": {
+            name: round(self_us / 1000, 1) for name, self_us, _ in sorted(rows, key=lambda r: -r[1])[:top]
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=10, help="modules listed per ranking")
+    parser.add_argument("--no-write", action="store_true", help="print the report without updating import_time.json")
+    args = parser.parse_args()
+
+    report = {
+        "python": sys.version.split()[0],
+        "entry_points": {module: measure(module, args.top) for module in ENTRY_POINTS},
+    }
+    print(json.dumps(report, indent=2))
+    if not args.no_write:
+        REPORT_PATH.write_text(json.dumps(report, indent=2) + "\n")
+
+    # Non-zero exit when a heavy framework leaks back into the serving path
+    leaked = {m: r["heavy_modules"] for m, r in report["entry_points"].items() if r["heavy_modules"]}
+    if leaked:
+        print(f"Heavy modules imported on the serving path: {leaked}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
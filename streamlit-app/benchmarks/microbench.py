@@ -0,0 +1,277 @@
+"""Microbenchmarks for the detection hot path
+
+Times preprocessing, output decoding, NMS, re-scoring of cached evaluation
+candidates, image decoding and rendering on synthetic YOLOv8 outputs
+(8400 anchors x 182 classes) and on real images from
+AWS-Icon-Detector--4/test, and compares the best (minimum) time of every
+case with the JSON baseline next to this script. The minimum is the least
+sensitive to noise from other processes; medians are recorded for reference
+only. A case slower than its baseline by more than its tolerance fails the
+run. Cases that are noisy even on an idle machine (large image codecs,
+rendering, dense NMS) are recorded with a wider tolerance.
+
+Absolute timings only compare on the machine and library versions they were
+recorded with: when machine / numpy / opencv differ from the baseline header
+the run fails (record a new baseline with --update). With --relative every
+case is instead scaled by the calibration case, a fixed numpy / OpenCV
+workload timed in the same run, so the gate also works on other machines
+(CI runs it this way).
+
+Usage (from streamlit-app/):
+    python benchmarks/microbench.py              # compare with baseline.json
+    python benchmarks/microbench.py --relative   # compare against another machine's baseline
+    python benchmarks/microbench.py --update     # record a new baseline
+    python benchmarks/microbench.py -k nms       # only cases containing "nms"
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+from app import draw_detections, postprocess_detections, preprocess_image  # noqa: E402
+from utils.decode import decode_image  # noqa: E402
+from utils.evaluation import score_predictions  # noqa: E402
+from utils.postprocess import batched_nms, decode_predictions  # noqa: E402
+from utils.quantization import load_image  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+TEST_IMAGES = APP_DIR.parent / "AWS-Icon-Detector--4" / "test" / "images"
+
+IMGSZ = 640
+NUM_CLASSES = 182
+NUM_ANCHORS = 8400
+DEFAULT_TOLERANCE = 0.5  # fail when the best time is more than 50% above the baseline
+CALIBRATION_CASE = "calibration/sort_blur"  # machine speed reference for --relative
+# Wider tolerances for cases whose best time still varies run to run, by name prefix
+NOISY_CASES = {
+    "decode_image/": 1.0,
+    "draw_detections/": 1.0,
+    "postprocess_detections/8400x182_low_conf": 1.0,
+}
+
+
+def synthetic_outputs(num_objects: int = 40, seed: int = 0) -> np.ndarray:
+    """Raw YOLOv8 output [1, 4 + 182, 8400] with clusters of confident anchors around objects"""
+    rng = np.random.default_rng(seed)
+    outputs = np.empty((1, 4 + NUM_CLASSES, NUM_ANCHORS), dtype=np.float32)
+    outputs[0, 0:2] = rng.uniform(0, IMGSZ, (2, NUM_ANCHORS))
+    outputs[0, 2:4] = rng.uniform(8, 120, (2, NUM_ANCHORS))
+    outputs[0, 4:] = rng.uniform(0, 0.02, (NUM_CLASSES, NUM_ANCHORS))
+
+    # Every object is seen by ~8 neighbouring anchors with jittered boxes
+    anchors = rng.choice(NUM_ANCHORS, size=(num_objects, 8), replace=False)
+    centers = rng.uniform(40, IMGSZ - 40, (num_objects, 2))
+    sizes = rng.uniform(20, 80, (num_objects, 2))
+    classes = rng.integers(0, NUM_CLASSES, num_objects)
+    for obj in range(num_objects):
+        idx = anchors[obj]
+        # integer + array indices around a slice put the anchor axis first: [8, 2]
+        outputs[0, 0:2, idx] = centers[obj] + rng.normal(0, 2, (8, 2))
+        outputs[0, 2:4, idx] = sizes[obj] * rng.uniform(0.9, 1.1, (8, 2))
+        outputs[0, 4 + classes[obj], idx] = rng.uniform(0.3, 0.95, 8)
+    return outputs
+
+
+def real_images(limit: int = 8) -> List[np.ndarray]:
+    if not TEST_IMAGES.exists():
+        return []
+    paths = sorted(p for p in TEST_IMAGES.iterdir() if p.suffix in (".npy", ".png", ".jpg", ".jpeg"))
+    return [load_image(path) for path in paths[:limit]]
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    """Benchmark cases: name -> zero-argument callable"""
+    rng = np.random.default_rng(0)
+    outputs = synthetic_outputs()
+    boxes, scores, class_ids = decode_predictions(outputs, 0.25, 0.45)[0]
+
+    # NMS input: a dense candidate set at the MAX_NMS cap
+    xy = rng.uniform(0, IMGSZ, (3000, 2)).astype(np.float32)
+    nms_boxes = np.concatenate([xy, xy + rng.uniform(10, 80, (3000, 2)).astype(np.float32)], axis=1)
+    nms_scores = rng.uniform(0, 1, 3000).astype(np.float32)
+    nms_groups = rng.integers(0, NUM_CLASSES, 3000)
+
+    # Cached evaluation candidates: 8 images x 3000 boxes at the 0.001 cache confidence
+    offsets = np.arange(9) * 3000
+    predictions = {
+        'boxes': np.tile(nms_boxes, (8, 1)),
+        'scores': np.tile(nms_scores, 8),
+        'class_ids': np.tile(nms_groups, 8),
+        'offsets': offsets,
+        'shapes': np.full((8, 2), IMGSZ),
+        'ratio_pads': np.tile([1.0, 1.0, 0.0, 0.0], (8, 1)),
+        'imgsz': np.array(IMGSZ),
+    }
+    labels = [(nms_boxes[i:3000:300], nms_groups[i:3000:300]) for i in range(8)]
+
+    large = cv2.resize(rng.integers(0, 255, (270, 480, 3), dtype=np.uint8), (3840, 2160))
+    large_png = cv2.imencode(".png", large)[1].tobytes()
+    large_jpg = cv2.imencode(".jpg", large)[1].tobytes()
+
+    # Detections spread over the large image for rendering
+    render_boxes = boxes * (3840 / IMGSZ)
+    render_boxes = np.tile(render_boxes, (5, 1))[:200]
+    render_scores = np.tile(scores, 5)[:200]
+    render_classes = np.tile(class_ids, 5)[:200]
+    class_names = [f"Class_{i}" for i in range(NUM_CLASSES)]
+
+    calibration_values = rng.uniform(0, 1, 1 << 20).astype(np.float32)
+
+    cases = {
+        CALIBRATION_CASE: lambda: (np.sort(calibration_values), cv2.GaussianBlur(large[:1080, :1920], (9, 9), 0)),
+        "preprocess_image/synthetic_1080p": lambda: preprocess_image(large[:1080, :1920], IMGSZ),
+        "preprocess_image/synthetic_4k": lambda: preprocess_image(large, IMGSZ),
+        "postprocess_detections/8400x182": lambda: postprocess_detections(
+            outputs, 0.25, 0.45, (1080, 1920), IMGSZ),
+        "postprocess_detections/8400x182_low_conf": lambda: postprocess_detections(
+            outputs, 0.01, 0.45, (1080, 1920), IMGSZ),
+        "nms/batched_3000": lambda: batched_nms(nms_boxes, nms_scores, nms_groups, 0.45),
+        # one class: a single group past CLUSTER_NMS_MAX
+        "nms/single_class_3000": lambda: batched_nms(nms_boxes, nms_scores, np.zeros(3000, np.int64), 0.45),
+        "score_predictions/8x3000": lambda: score_predictions(
+            predictions, labels, class_names, conf_threshold=0.001, nms_threshold=0.7),
+        "decode_image/png_4k": lambda: decode_image(large_png, 2048),
+        "decode_image/jpg_4k": lambda: decode_image(large_jpg, 2048),
+        "draw_detections/4k_200": lambda: draw_detections(
+            large, render_boxes, render_scores, render_classes, class_names),
+    }
+
+    images = real_images()
+    if images:
+        cases["preprocess_image/dataset_416"] = lambda: [preprocess_image(image, IMGSZ) for image in images]
+        cases["draw_detections/dataset_416"] = lambda: [
+            draw_detections(image, boxes * (416 / IMGSZ), scores, class_ids, class_names) for image in images
+        ]
+    return cases
+
+
+def measure(func: Callable[[], object], repeat: int = 30, min_time: float = 0.1) -> Dict[str, float]:
+    """Median / min per-call time in ms; calls are looped so each sample lasts >= min_time"""
+    func()  # warm caches and lazy buffers
+    number, start = 1, time.perf_counter()
+    func()
+    single = time.perf_counter() - start
+    if single < min_time:
+        number = max(1, int(min_time / max(single, 1e-7)))
+
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples[i] = (time.perf_counter() - start) / number * 1000
+    return {"median_ms": float(np.median(samples)), "min_ms": float(samples.min()), "loops": number}
+
+
+def environment() -> Dict[str, str]:
+    """Baseline header fields that must match for timings to be comparable"""
+    return {
+        "machine": f"{platform.machine()} / {platform.processor() or 'unknown'}",
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def environment_mismatch(baseline: Dict) -> List[str]:
+    """'field: baseline != current' for every header field that differs"""
+    return [
+        f"{key}: {baseline.get(key)} != {value}"
+        for key, value in environment().items() if baseline.get(key) != value
+    ]
+
+
+def case_tolerance(name: str, default: float) -> float:
+    for prefix, tolerance in NOISY_CASES.items():
+        if name.startswith(prefix):
+            return max(tolerance, default)
+    return default
+
+
+def compare(results: Dict[str, Dict], baseline: Dict,
+            relative: bool = False) -> List[Tuple[str, float, float, float]]:
+    """Cases whose best time exceeds baseline * (1 + tolerance): (name, time, baseline, limit)
+
+    With relative=True the baseline times are first scaled by how much slower
+    or faster CALIBRATION_CASE ran here than in the baseline.
+    """
+    scale = 1.0
+    if relative:
+        scale = results[CALIBRATION_CASE]["min_ms"] / baseline["cases"][CALIBRATION_CASE]["min_ms"]
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference is None or (relative and name == CALIBRATION_CASE):
+            continue
+        tolerance = reference.get("tolerance", baseline.get("tolerance", DEFAULT_TOLERANCE))
+        limit = reference["min_ms"] * scale * (1 + tolerance)
+        if result["min_ms"] > limit:
+            regressions.append((name, result["min_ms"], reference["min_ms"] * scale, limit))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("-k", default="", help="only run cases whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--relative", action="store_true",
+                        help=f"compare times relative to {CALIBRATION_CASE}, for baselines from other machines")
+    args = parser.parse_args()
+
+    cases = {name: func for name, func in build_cases().items()
+             if args.k in name or (args.relative and name == CALIBRATION_CASE)}
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    if args.relative and CALIBRATION_CASE not in baseline.get("cases", {}):
+        sys.exit(f"ERROR: {BASELINE_PATH.name} has no {CALIBRATION_CASE} timing; record one with --update")
+
+    results = {}
+    for name, func in cases.items():
+        results[name] = measure(func, args.repeat)
+        result = results[name]
+        reference = baseline.get("cases", {}).get(name, {}).get("min_ms")
+        delta = f"{(result['min_ms'] / reference - 1) * 100:+6.1f}%" if reference else "   new"
+        print(f"{name:<45}{result['min_ms']:>10.3f} ms  (median {result['median_ms']:.3f})  {delta}")
+
+    if args.update:
+        cases_out = {**baseline.get("cases", {}), **{
+            name: {
+                "min_ms": round(result["min_ms"], 4),
+                "median_ms": round(result["median_ms"], 4),
+                **({"tolerance": case_tolerance(name, args.tolerance)}
+                   if case_tolerance(name, args.tolerance) != args.tolerance else {}),
+            }
+            for name, result in results.items()
+        }}
+        BASELINE_PATH.write_text(json.dumps({
+            **environment(),
+            "python": platform.python_version(),
+            "tolerance": args.tolerance,
+            "cases": dict(sorted(cases_out.items())),
+        }, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return
+
+    mismatch = environment_mismatch(baseline) if baseline and not args.relative else []
+    if mismatch:
+        sys.exit("ERROR: baseline was recorded in another environment, absolute timings don't compare "
+                 f"({'; '.join(mismatch)}). Use --relative, or record a baseline here with --update.")
+
+    regressions = compare(results, baseline, args.relative)
+    for name, best, reference, limit in regressions:
+        print(f"REGRESSION {name}: {best:.3f} ms > {limit:.3f} ms (baseline {reference:.3f} ms)", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Score an ONNX model on a dataset split without ultralytics
+
+Runs the exact artifact that is deployed (FP32, INT8 or end2end export) with
+onnxruntime and reports mAP50, mAP50-95, per-class AP and the confusion
+matrix. Raw predictions are cached, so re-scoring the same model at other
+thresholds skips inference.
+
+Usage (from streamlit-app/):
+    python evaluate.py models/best.onnx --data ../AWS-Icon-Detector--4/data.yaml --split test
+    python evaluate.py models/best.onnx --conf 0.01 --iou 0.6 --output report.json
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from utils.evaluation import evaluate_model, format_metrics
+
+APP_DIR = Path(__file__).resolve().parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", help="ONNX model to evaluate")
+    parser.add_argument("--data", default=str(APP_DIR.parent / "AWS-Icon-Detector--4" / "data.yaml"))
+    parser.add_argument("--split", default="test")
+    parser.add_argument("--imgsz", type=int, default=640, help="input size for models with dynamic shapes")
+    parser.add_argument("--conf", type=float, default=0.001, help="confidence threshold for AP")
+    parser.add_argument("--iou", type=float, default=0.7, help="NMS IoU threshold")
+    parser.add_argument("--cache-dir", default=str(APP_DIR / "models" / "eval_cache"))
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output", help="write the full report (with confusion matrix) as JSON")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = evaluate_model(args.model, args.data, args.split, args.imgsz,
+                            cache_dir=None if args.no_cache else args.cache_dir,
+                            conf_threshold=args.conf, nms_threshold=args.iou)
+    print(format_metrics(report))
+    print(f"evaluated in {time.perf_counter() - start:.2f}s")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import numpy as np
+import onnx
+import pytest
+from onnx import TensorProto, helper, numpy_helper
+
+CONSTANT_OUTPUTS = np.zeros((7, 4), dtype=np.float32)
+CONSTANT_OUTPUTS[:4] = [[8, 20, 8, 24], [8, 20, 24, 8], [6, 10, 4, 4], [6, 10, 4, 4]]  # cx, cy, w, h rows
+CONSTANT_OUTPUTS[4, 0] = CONSTANT_OUTPUTS[5, 1] = CONSTANT_OUTPUTS[6, 2] = 0.9
+
+
+def write_constant_detector(path, imgsz=32, input_shape=None, exported_imgsz=None, outputs=None):
+    """ONNX graph returning the same raw YOLOv8 output (1, 4 + 3, 4) for any image
+
+    By default the three boxes have classes 0, 1 and 2 at score 0.9
+    (CONSTANT_OUTPUTS); outputs replaces that (7, 4) array. input_shape
+    overrides the (1, 3, imgsz, imgsz) input, e.g. with dynamic height/width,
+    and exported_imgsz is recorded as the ultralytics 'imgsz' metadata.
+    """
+    outputs = CONSTANT_OUTPUTS if outputs is None else np.asarray(outputs, dtype=np.float32)
+    graph = helper.make_graph(
+        [
+            helper.make_node('ReduceMean', ['images'], ['mean'], axes=[1, 2, 3], keepdims=0),
+            helper.make_node('Reshape', ['mean', 'shape'], ['mean3']),
+            helper.make_node('Mul', ['mean3', 'zero'], ['zeros']),
+            helper.make_node('Add', ['zeros', 'detections'], ['output0']),
+        ], 'constant',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, input_shape or [1, 3, imgsz, imgsz])],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, [1, 7, 4])],
+        [
+            numpy_helper.from_array(np.array([-1, 1, 1], dtype=np.int64), 'shape'),
+            numpy_helper.from_array(np.array(0.0, dtype=np.float32), 'zero'),
+            numpy_helper.from_array(outputs, 'detections'),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 7
+    if exported_imgsz is not None:
+        helper.set_model_props(model, {'imgsz': str(exported_imgsz)})
+    onnx.save(model, str(path))
+    return str(path)
+
+
+@pytest.fixture
+def constant_detector():
+    """write_constant_detector, for tests that need a tiny model with known detections"""
+    return write_constant_detector
@@ -1,13 +1,17 @@
 import pytest
 import sys
 from pathlib import Path
+from types import SimpleNamespace
 import numpy as np
 
 from app import (
     preprocess_image,
     postprocess_detections,
     draw_detections,
+    load_app_config,
+    run_inference_cached,
 )
+from utils.cache import LRUCache
 
 # Add the parent directory to the path to import app functions
 sys.path.append(str(Path(__file__).parent.parent))
@@ -19,16 +23,26 @@ class TestImageProcessing:
     def test_preprocess_image_rgb(self):
         """Test preprocessing RGB image"""
         test_image = np.random.randint(0, 255, (100, 100, 3), dtype=np.uint8)
-        processed = preprocess_image(test_image, 320)
+        processed, ratio_pad = preprocess_image(test_image, 320)
 
         assert processed.shape == (1, 3, 320, 320)
         assert processed.dtype == np.float32
         assert np.all(processed >= 0) and np.all(processed <= 1)
+        assert ratio_pad == ((3.2, 3.2), (0, 0))
+
+    def test_preprocess_image_letterbox(self):
+        """Test that wide images keep their aspect ratio and are padded"""
+        test_image = np.full((100, 400, 3), 255, dtype=np.uint8)
+        processed, ratio_pad = preprocess_image(test_image, 320)
+
+        assert ratio_pad == ((0.8, 0.8), (0, 120))
+        assert np.allclose(processed[0, :, 120:200, :], 1.0)
+        assert np.allclose(processed[0, :, :120, :], 114 / 255)
 
     def test_preprocess_image_rgba(self):
         """Test preprocessing RGBA image"""
         test_image = np.random.randint(0, 255, (100, 100, 4), dtype=np.uint8)
-        processed = preprocess_image(test_image, 320)
+        processed, ratio_pad = preprocess_image(test_image, 320)
 
         assert processed.shape == (1, 3, 320, 320)
         assert processed.dtype == np.float32
@@ -36,17 +50,21 @@ class TestImageProcessing:
     def test_preprocess_image_grayscale(self):
         """Test preprocessing grayscale image"""
         test_image = np.random.randint(0, 255, (100, 100), dtype=np.uint8)
-        processed = preprocess_image(test_image, 320)
+        processed, ratio_pad = preprocess_image(test_image, 320)
 
         assert processed.shape == (1, 3, 320, 320)
         assert processed.dtype == np.float32
 
     def test_postprocess_detections(self):
-        """Test postprocessing detections"""
-        mock_output = np.array([[
-            [100, 100, 50, 50, 0.8, 0],
-            [200, 200, 30, 30, 0.6, 1]
-        ]])
+        """Test postprocessing raw YOLOv8 outputs [1, 4 + nc, anchors]"""
+        num_classes, num_anchors = 3, 8
+        mock_output = np.zeros((1, 4 + num_classes, num_anchors), dtype=np.float32)
+        mock_output[0, :4, 0] = [100, 100, 50, 50]
+        mock_output[0, 4 + 0, 0] = 0.8
+        mock_output[0, :4, 1] = [102, 101, 50, 50]  # overlaps anchor 0, same class
+        mock_output[0, 4 + 0, 1] = 0.7
+        mock_output[0, :4, 2] = [200, 200, 30, 30]
+        mock_output[0, 4 + 1, 2] = 0.6
 
         img_shape = (640, 640)
         imgsz = 320
@@ -55,9 +73,10 @@ class TestImageProcessing:
             mock_output, 0.5, 0.45, img_shape, imgsz
         )
 
-        assert len(boxes) >= 0
-        assert len(scores) >= 0
-        assert len(class_ids) >= 0
+        assert boxes.shape == (2, 4)
+        np.testing.assert_allclose(scores, [0.8, 0.6], rtol=1e-6)
+        np.testing.assert_array_equal(class_ids, [0, 1])
+        np.testing.assert_allclose(boxes[0], [150, 150, 250, 250])
 
     def test_draw_detections(self):
         """Test drawing detections on image"""
@@ -75,6 +94,48 @@ class TestImageProcessing:
         assert result.dtype == test_image.dtype
 
 
+class TestInferenceCache:
+    """Test raw output caching across threshold changes"""
+
+    class CountingSession:
+        def __init__(self, model_path):
+            self.model_path = model_path
+            self.calls = 0
+
+        def run(self, output_names, feed):
+            self.calls += 1
+            return [np.zeros((1, 6, 100), dtype=np.float32)]
+
+        def get_inputs(self):
+            return [SimpleNamespace(name="images", type="tensor(float)", shape=[1, 3, 64, 64])]
+
+    def test_lru_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert "a" in cache and "c" in cache
+        assert "b" not in cache
+
+    def test_run_inference_cached(self, tmp_path):
+        model_path = tmp_path / "model.onnx"
+        model_path.write_bytes(b"model")
+        session = self.CountingSession(str(model_path))
+        cache = LRUCache(maxsize=4)
+        image = np.zeros((50, 80, 3), dtype=np.uint8)
+
+        first = run_inference_cached(session, cache, b"image-bytes", image, 64)
+        second = run_inference_cached(session, cache, b"image-bytes", image, 64)
+        run_inference_cached(session, cache, b"other-image", image, 64)
+
+        assert session.calls == 2
+        assert first[2] is False and second[2] is True
+        assert second[0] is first[0]
+        assert second[1] == first[1]
+
+
 class TestModelConversion:
     """Test model conversion functions"""
 
@@ -121,6 +182,11 @@ class TestAppConfiguration:
         """Test that all required modules can be imported"""
         assert True
 
+    def test_upload_formats(self):
+        """Test that the uploader accepts images and PDFs"""
+        formats = load_app_config()["model"]["supported_formats"]
+        assert {"png", "jpg", "jpeg", "pdf"} <= set(formats)
+
     def test_css_styles(self):
         """Test that CSS styles are properly defined"""
         css_content = """
@@ -0,0 +1,65 @@
+import numpy as np
+
+from utils.crop import content_box, content_regions, crop_to_content, expand_boxes, offset_ratio_pad
+from utils.postprocess import scale_boxes
+from utils.preprocess import letterbox
+
+
+def canvas(height=1000, width=1600, background=255):
+    """Blank diagram canvas with two filled icons far apart"""
+    image = np.full((height, width, 3), background, dtype=np.uint8)
+    image[100:200, 150:300] = (255, 153, 0)
+    image[700:760, 1300:1400] = (63, 72, 204)
+    return image
+
+
+class TestContentBox:
+    """Test the content bounding box from row/column projections"""
+
+    def test_white_canvas(self):
+        np.testing.assert_array_equal(content_box(canvas(), margin=0), [150, 100, 1400, 760])
+
+    def test_dark_canvas_and_margin(self):
+        box = content_box(canvas(background=30), margin=10)
+        np.testing.assert_array_equal(box, [140, 90, 1410, 770])
+
+    def test_blank_image(self):
+        image = np.full((300, 300, 3), 255, dtype=np.uint8)
+        assert content_box(image) is None
+        crop, offset = crop_to_content(image)
+        assert crop is image and offset == (0, 0)
+
+    def test_min_size_stays_inside_image(self):
+        boxes = expand_boxes(np.array([[0, 0, 10, 10], [590, 390, 600, 400]]), 320, (400, 600))
+        np.testing.assert_array_equal(boxes, [[0, 0, 320, 320], [280, 80, 600, 400]])
+
+
+class TestContentRegions:
+    """Test splitting a diagram into non-empty regions"""
+
+    def test_separate_clusters(self):
+        regions = content_regions(canvas(), margin=0)
+        np.testing.assert_array_equal(regions, [[150, 100, 300, 200], [1300, 700, 1400, 760]])
+
+    def test_overlapping_regions_merge(self):
+        regions = content_regions(canvas(), margin=0, min_size=1000)
+        assert len(regions) == 1
+
+    def test_too_many_regions_collapse(self):
+        regions = content_regions(canvas(), margin=0, max_regions=1)
+        np.testing.assert_array_equal(regions, [[150, 100, 1400, 760]])
+
+
+class TestCropMapping:
+    """Test that boxes detected on a crop map back to the full image"""
+
+    def test_offset_ratio_pad(self):
+        image = canvas()
+        crop, offset = crop_to_content(image, margin=0)
+        _, ratio_pad = letterbox(crop, 320)
+
+        # Box around the first icon, in letterboxed crop coordinates
+        (ratio_x, ratio_y), (pad_x, pad_y) = ratio_pad
+        box = np.array([[pad_x, pad_y, pad_x + 150 * ratio_x, pad_y + 100 * ratio_y]], dtype=np.float32)
+        mapped = scale_boxes(box, image.shape[:2], (320, 320), offset_ratio_pad(ratio_pad, offset))
+        np.testing.assert_allclose(mapped, [[150, 100, 300, 200]], atol=1e-3)
@@ -0,0 +1,62 @@
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.decode import decode_image, image_size, reduction_factor
+
+
+def encode(image, ext=".png"):
+    return cv2.imencode(ext, image)[1].tobytes()
+
+
+def rotated_jpeg(width, height):
+    """JPEG stored as width x height with EXIF orientation 6 (shown rotated 90 degrees clockwise)"""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 100, 50)).save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class TestDecode:
+    """Test upload decoding with max_image_size"""
+
+    def test_rgb_order_and_layout(self):
+        bgr = np.zeros((40, 60, 3), dtype=np.uint8)
+        bgr[..., 0] = 255  # blue in OpenCV order
+        image, scale = decode_image(encode(bgr))
+        assert image.shape == (40, 60, 3) and image.dtype == np.uint8
+        assert image.flags['C_CONTIGUOUS']
+        assert tuple(image[0, 0]) == (0, 0, 255)
+        assert scale == 1.0
+
+    def test_alpha_dropped(self):
+        image, _ = decode_image(encode(np.zeros((10, 20, 4), dtype=np.uint8)))
+        assert image.shape == (10, 20, 3)
+
+    def test_reduction_factor(self):
+        assert reduction_factor((7680, 4320), 2048) == 2
+        assert reduction_factor((16384, 8192), 2048) == 8
+        assert reduction_factor((1000, 800), 2048) == 1
+        assert reduction_factor((7680, 4320), None) == 1
+
+    def test_oversized_upload_is_downscaled(self):
+        data = encode(np.full((3000, 8000, 3), 200, dtype=np.uint8), ".jpg")
+        assert image_size(data) == (8000, 3000)
+        image, scale = decode_image(data, max_size=2048)
+        assert image.shape == (768, 2048, 3)
+        assert scale == 2048 / 8000
+
+    def test_exif_orientation(self):
+        data = rotated_jpeg(60, 40)
+        assert image_size(data) == (40, 60)
+        image, scale = decode_image(data)
+        assert image.shape == (60, 40, 3)
+        assert scale == 1.0
+
+    def test_exif_orientation_scale(self):
+        image, scale = decode_image(rotated_jpeg(3000, 1000), max_size=500)
+        assert image.shape == (500, 167, 3)
+        assert np.isclose(scale, 167 / 1000)
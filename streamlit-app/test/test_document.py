@@ -0,0 +1,62 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils.document import page_dpi, prefetch, stream_detections
+
+
+class TestPageDpi:
+    """Test DPI selection from page geometry"""
+
+    def test_a4_landscape(self):
+        # 842 x 595 pt = 11.7 in on the long side
+        assert page_dpi(842, 595, max_side=2048) == 175
+
+    def test_clamped(self):
+        assert page_dpi(3370, 2384, max_side=2048) == 72   # A0 poster
+        assert page_dpi(100, 100, max_side=2048) == 300    # small badge
+
+
+class TestPrefetch:
+    """Test bounded background prefetch"""
+
+    def test_order_and_bound(self):
+        produced = []
+
+        def pages():
+            for i in range(20):
+                produced.append(i)
+                yield i, np.zeros((4, 4, 3), dtype=np.uint8)
+
+        results = []
+        for page_number, _, result in stream_detections(pages(), lambda image: image.shape, prefetch_pages=2):
+            time.sleep(0.005)
+            # queue holds 2 pages and the producer may hold one more
+            assert len(produced) - page_number <= 4
+            results.append(page_number)
+        assert results == list(range(20))
+
+    def test_early_close_stops_producer(self):
+        closed = threading.Event()
+
+        def items():
+            try:
+                for i in range(1000):
+                    yield i
+            finally:
+                closed.set()
+
+        stream = prefetch(items(), size=2)
+        assert next(stream) == 0
+        stream.close()
+        assert closed.is_set()
+
+    def test_producer_error_is_raised(self):
+        def items():
+            yield 1
+            raise ValueError("corrupt page")
+
+        with pytest.raises(ValueError, match="corrupt page"):
+            list(prefetch(items()))
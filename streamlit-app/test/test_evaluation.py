@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+import utils.evaluation as evaluation
+from utils.evaluation import (average_precision, cached_predictions, load_labels, match_predictions,
+                              predict_split, score_predictions)
+from utils.export import fold_preprocessing
+
+
+def perfect_predictions(labels, imgsz=100):
+    """Cached-prediction dict that reproduces the labels exactly (no letterbox scaling)"""
+    boxes = np.concatenate([b for b, _ in labels]).astype(np.float32)
+    class_ids = np.concatenate([c for _, c in labels])
+    return {
+        'boxes': boxes,
+        'scores': np.linspace(0.9, 0.5, len(boxes)).astype(np.float32),
+        'class_ids': class_ids,
+        'offsets': np.cumsum([0] + [len(c) for _, c in labels]),
+        'shapes': np.full((len(labels), 2), imgsz),
+        'ratio_pads': np.tile([1.0, 1.0, 0.0, 0.0], (len(labels), 1)),
+        'imgsz': np.array(imgsz),
+    }
+
+
+class TestLabels:
+    """Test YOLO label parsing"""
+
+    def test_boxes_and_polygons(self, tmp_path):
+        path = tmp_path / "img.txt"
+        path.write_text("3 0.5 0.5 0.2 0.4\n7 0.1 0.1 0.3 0.1 0.3 0.2 0.1 0.2\n")
+        boxes, classes = load_labels(path, (100, 200))
+        np.testing.assert_allclose(boxes, [[80, 30, 120, 70], [20, 10, 60, 20]], atol=1e-4)
+        assert classes.tolist() == [3, 7]
+
+    def test_missing_file(self, tmp_path):
+        boxes, classes = load_labels(tmp_path / "none.txt", (100, 100))
+        assert boxes.shape == (0, 4) and len(classes) == 0
+
+
+class TestMetrics:
+    """Test matching, AP and the confusion matrix"""
+
+    def test_each_label_matched_once(self):
+        iou = np.array([[0.9, 0.8, 0.7]])
+        correct = match_predictions(np.array([1, 1, 2]), np.array([1]), iou)
+        assert correct[:, 0].tolist() == [True, False, False]
+        assert correct[0].sum() == 9  # 0.9 passes thresholds 0.50 .. 0.90
+
+    def test_average_precision(self):
+        # class 0: TP, FP, TP over 2 labels -> precision 1 up to recall 0.5, then 2/3
+        tp = np.array([[True], [False], [True]])
+        classes, ap = average_precision(tp, np.array([0.9, 0.8, 0.7]), np.array([0, 0, 0]), np.array([0, 0, 1]))
+        assert classes.tolist() == [0, 1]
+        np.testing.assert_allclose(ap[:, 0], [(51 * 1 + 50 * 2 / 3) / 101, 0.0])
+
+    def test_perfect_predictions(self):
+        labels = [
+            (np.array([[10, 10, 30, 30], [50, 50, 90, 80]], np.float32), np.array([0, 2])),
+            (np.array([[5, 5, 20, 40]], np.float32), np.array([1])),
+        ]
+        report = score_predictions(perfect_predictions(labels), labels, ['a', 'b', 'c'])
+        assert report['mAP50'] == 1.0 and report['mAP50_95'] == 1.0
+        assert set(report['per_class']) == {'a', 'b', 'c'}
+        assert np.array_equal(np.array(report['confusion_matrix']), np.diag([1, 1, 1, 0]))
+
+    def test_confusion_off_diagonal(self):
+        labels = [(np.array([[10, 10, 30, 30]], np.float32), np.array([0]))]
+        predictions = perfect_predictions(labels)
+        predictions['class_ids'] = np.array([1])
+        matrix = np.array(score_predictions(predictions, labels, ['a', 'b'])['confusion_matrix'])
+        assert matrix[1, 0] == 1 and matrix.sum() == 1
+
+
+class TestPredictionCache:
+    """Test that cached raw predictions skip inference"""
+
+    def test_cache_hit(self, tmp_path, monkeypatch):
+        model = tmp_path / "model.onnx"
+        model.write_bytes(b"model")
+        labels = [(np.array([[10, 10, 30, 30]], np.float32), np.array([0]))]
+        calls = []
+
+        def fake_predict(*args):
+            calls.append(args)
+            return perfect_predictions(labels)
+
+        monkeypatch.setattr(evaluation, 'predict_split', fake_predict)
+        first = cached_predictions(model, [tmp_path / "a.npy"], tmp_path / "cache")
+        second = cached_predictions(model, [tmp_path / "a.npy"], tmp_path / "cache")
+
+        assert len(calls) == 1
+        np.testing.assert_array_equal(first['boxes'], second['boxes'])
+
+        model.write_bytes(b"retrained")
+        cached_predictions(model, [tmp_path / "a.npy"], tmp_path / "cache")
+        assert len(calls) == 2
+
+
+class TestPredictSplit:
+    """Test that evaluation feeds and sizes the model like serving does"""
+
+    def test_folded_preprocessing(self, tmp_path, constant_detector):
+        cv2.imwrite(str(tmp_path / "a.png"), np.zeros((40, 60, 3), np.uint8))
+        model = fold_preprocessing(constant_detector(tmp_path / "model.onnx"))
+
+        predictions = predict_split(model, [tmp_path / "a.png"])
+        assert int(predictions['imgsz']) == 32
+        assert sorted(predictions['class_ids'].tolist()) == [0, 1, 2]
+
+    def test_dynamic_shape_uses_export_size(self, tmp_path, constant_detector):
+        cv2.imwrite(str(tmp_path / "a.png"), np.zeros((40, 60, 3), np.uint8))
+        model = constant_detector(tmp_path / "model.onnx", input_shape=[1, 3, 'height', 'width'],
+                                  exported_imgsz=[48, 48])
+
+        predictions = predict_split(model, [tmp_path / "a.png"], imgsz=640)
+        assert int(predictions['imgsz']) == 48
+        np.testing.assert_allclose(predictions['ratio_pads'][0], [0.8, 0.8, 0, 8])
@@ -0,0 +1,103 @@
+import json
+
+import numpy as np
+import onnx
+import pytest
+from onnx import TensorProto, helper
+
+from utils.cache import file_hash
+from utils.export import cached_export, conversion_key, detection_agreement, fold_preprocessing, select_variant
+from utils.preprocess import letterbox, raw_image_input
+from utils.session import create_session, folded_input_size, takes_raw_images
+
+
+def detections(*boxes_and_classes):
+    boxes = np.array([b for b, _ in boxes_and_classes], dtype=np.float32).reshape(-1, 4)
+    classes = np.array([c for _, c in boxes_and_classes], dtype=np.int64)
+    return boxes, np.ones(len(classes), dtype=np.float32), classes
+
+
+class TestVariantSelection:
+    """Test export variant correctness check and selection"""
+
+    def test_agreement(self):
+        reference = [detections(([0, 0, 10, 10], 1), ([20, 20, 40, 40], 2))]
+        assert detection_agreement(reference, reference) == 1.0
+
+        shifted = [detections(([0, 0, 10, 10], 1), ([25, 25, 45, 45], 2))]
+        assert detection_agreement(reference, shifted) == 0.5
+
+        other_class = [detections(([0, 0, 10, 10], 5), ([20, 20, 40, 40], 2))]
+        assert detection_agreement(reference, other_class) == 0.5
+
+        assert detection_agreement([detections()], [detections()]) == 1.0
+
+    def test_select_fastest_correct(self):
+        benchmark = {
+            'plain': {'p50_ms': 30.0, 'agreement': 1.0},
+            'simplified': {'p50_ms': 25.0, 'agreement': 1.0},
+            'end2end': {'p50_ms': 10.0, 'agreement': 0.5},
+        }
+        assert select_variant(benchmark) == 'simplified'
+
+
+class TestConversionCache:
+    """Test the content-addressed export cache"""
+
+    def test_key_depends_on_weights_and_args(self):
+        key = conversion_key("a" * 64, 320, False, ["plain"])
+        assert key == conversion_key("a" * 64, 320, False, ["plain"])
+        assert key != conversion_key("b" * 64, 320, False, ["plain"])
+        assert key != conversion_key("a" * 64, 640, False, ["plain"])
+        assert key != conversion_key("a" * 64, 320, True, ["plain"])
+        assert key != conversion_key("a" * 64, 320, False, ["plain", "end2end"])
+        assert key != conversion_key("a" * 64, 320, False, ["plain"], fold=True)
+
+    def test_cache_hit_skips_export(self, tmp_path):
+        weights = tmp_path / "model.pt"
+        weights.write_bytes(b"weights")
+        key = conversion_key(file_hash(weights), 320, False, ["plain"])
+        entry = {"classes": ["EC2"], "export": {"variant": "plain", "cache_key": key}}
+        (tmp_path / "cache" / key).mkdir(parents=True)
+        (tmp_path / "cache" / key / "entry.json").write_text(json.dumps(entry))
+
+        assert cached_export(weights, tmp_path / "cache", 320, variants=["plain"]) == entry
+
+
+def identity_model(path, imgsz=32, opset=17):
+    """ONNX graph that returns its (1, 3, S, S) input, to inspect what the model is fed"""
+    shape = [1, 3, imgsz, imgsz]
+    graph = helper.make_graph(
+        [helper.make_node('Identity', ['images'], ['output0'])], 'identity',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, shape)],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, shape)],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', opset)])
+    model.ir_version = 7
+    onnx.save(model, str(path))
+    return path
+
+
+class TestFoldedPreprocessing:
+    """Test letterbox preprocessing folded into the ONNX graph"""
+
+    @pytest.mark.parametrize("opset", [11, 17])
+    @pytest.mark.parametrize("shape", [(50, 20, 3), (32, 32, 3), (17, 90, 3), (400, 300, 3)])
+    def test_matches_letterbox(self, tmp_path, opset, shape):
+        session = create_session(fold_preprocessing(identity_model(tmp_path / "m.onnx", opset=opset)))
+        image = np.random.default_rng(0).integers(0, 255, shape, dtype=np.uint8)
+
+        expected, ratio_pad = letterbox(image, 32)
+        raw, raw_ratio_pad = raw_image_input(image, 32)
+        folded = session.run(None, {'images': raw})[0]
+
+        assert raw_ratio_pad == ratio_pad
+        assert folded.shape == expected.shape and folded.dtype == np.float32
+        # Same geometry; resampling may differ by one gray level
+        assert np.abs(folded - expected).max() <= 1.01 / 255
+
+    def test_session_helpers(self, tmp_path):
+        plain = create_session(identity_model(tmp_path / "m.onnx"))
+        folded = create_session(fold_preprocessing(tmp_path / "m.onnx"))
+        assert not takes_raw_images(plain) and folded_input_size(plain) is None
+        assert takes_raw_images(folded) and folded_input_size(folded) == 32
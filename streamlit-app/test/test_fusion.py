@@ -0,0 +1,72 @@
+import numpy as np
+
+from conftest import CONSTANT_OUTPUTS
+from utils.fusion import weighted_boxes_fusion
+from utils.inference import ObjectDetector
+
+
+def model_output(boxes, scores, class_ids):
+    return (np.array(boxes, dtype=np.float32).reshape(-1, 4), np.array(scores, dtype=np.float32),
+            np.array(class_ids, dtype=np.int64))
+
+
+class TestWeightedBoxesFusion:
+    """Test ensemble box fusion"""
+
+    def test_identical_models(self):
+        output = model_output([[0, 0, 10, 10], [50, 50, 80, 80]], [0.9, 0.6], [1, 2])
+        boxes, scores, class_ids = weighted_boxes_fusion(*zip(output, output))
+        np.testing.assert_allclose(boxes, output[0])
+        np.testing.assert_allclose(scores, output[1], rtol=1e-6)
+        np.testing.assert_array_equal(class_ids, output[2])
+
+    def test_fused_box_is_confidence_weighted(self):
+        a = model_output([[0, 0, 10, 10]], [0.75], [0])
+        b = model_output([[2, 0, 12, 10]], [0.25], [0])
+        boxes, scores, _ = weighted_boxes_fusion(*zip(a, b))
+        np.testing.assert_allclose(boxes, [[0.5, 0, 10.5, 10]])
+        np.testing.assert_allclose(scores, [0.5])  # mean score of both models
+
+    def test_single_vote_is_downweighted(self):
+        a = model_output([[0, 0, 10, 10], [50, 50, 60, 60]], [0.8, 0.8], [0, 0])
+        b = model_output([[0, 0, 10, 10]], [0.8], [0])
+        boxes, scores, _ = weighted_boxes_fusion(*zip(a, b))
+        np.testing.assert_allclose(scores, [0.8, 0.4], rtol=1e-6)
+        np.testing.assert_allclose(boxes[1], [50, 50, 60, 60])
+
+    def test_classes_are_not_fused(self):
+        a = model_output([[0, 0, 10, 10]], [0.9], [0])
+        b = model_output([[0, 0, 10, 10]], [0.9], [1])
+        _, _, class_ids = weighted_boxes_fusion(*zip(a, b))
+        assert sorted(class_ids.tolist()) == [0, 1]
+
+    def test_empty(self):
+        empty = model_output([], [], [])
+        boxes, scores, class_ids = weighted_boxes_fusion(*zip(empty, empty))
+        assert boxes.shape == (0, 4) and len(scores) == 0 and len(class_ids) == 0
+
+
+class TestEnsembleDetector:
+    """Test ObjectDetector running two ONNX models with box fusion"""
+
+    def test_fused_detections(self, tmp_path, constant_detector):
+        # second model: class 0 box shifted by 1 px at 0.6, class 2 not detected
+        outputs = CONSTANT_OUTPUTS.copy()
+        outputs[0, 0] += 1
+        outputs[4, 0], outputs[6, 2] = 0.6, 0.0
+        paths = [constant_detector(tmp_path / "a.onnx"), constant_detector(tmp_path / "b.onnx", outputs=outputs)]
+        detector = ObjectDetector(paths)
+
+        result = detector.detect(np.zeros((32, 32, 3), dtype=np.uint8), conf_threshold=0.3)
+        order = np.argsort(result['class_ids'])
+        assert result['class_ids'][order].tolist() == [0, 1, 2]
+        np.testing.assert_allclose(result['boxes'][order], [
+            [5.4, 5, 11.4, 11],  # (0.9 * [5, 11] + 0.6 * [6, 12]) / 1.5
+            [15, 15, 25, 25],    # same box in both models
+            [6, 22, 10, 26],     # one model only
+        ], atol=1e-4)
+        # scores average over both models; a box only one model found is halved
+        np.testing.assert_allclose(result['scores'][order], [0.75, 0.9, 0.45], atol=1e-5)
+
+        batch = detector.detect_batch([np.zeros((32, 32, 3), dtype=np.uint8)] * 2, conf_threshold=0.3)
+        assert [len(detections['boxes']) for detections in batch] == [3, 3]
@@ -0,0 +1,62 @@
+import numpy as np
+
+from utils.hierarchy import build_hierarchy, find_parents, format_tree, node_depths
+
+CLASS_NAMES = ['EC2', 'RDS', 'Region', 'Availability Zone', 'Private Subnet', 'aws']
+
+
+def brute_force_parents(boxes, is_container, min_overlap=0.9):
+    """Pairwise reference: smallest strictly larger container covering min_overlap of the box"""
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = {int(i): rank for rank, i in enumerate(np.argsort(areas, kind='stable'))}
+    parents = []
+    for i, box in enumerate(boxes):
+        best = -1
+        for j in np.flatnonzero(is_container):
+            w = max(0, min(box[2], boxes[j, 2]) - max(box[0], boxes[j, 0]))
+            h = max(0, min(box[3], boxes[j, 3]) - max(box[1], boxes[j, 1]))
+            if order[j] > order[i] and w * h / areas[i] >= min_overlap:
+                if best < 0 or order[j] < order[best]:
+                    best = j
+        parents.append(best)
+    return np.array(parents)
+
+
+class TestHierarchy:
+    """Test container nesting of detections"""
+
+    def test_nesting(self):
+        boxes = np.array([
+            [0, 0, 1000, 800],     # aws
+            [20, 20, 900, 700],    # Region
+            [40, 40, 400, 600],    # Availability Zone
+            [60, 60, 380, 300],    # Private Subnet
+            [100, 100, 150, 150],  # EC2 in the subnet
+            [500, 100, 550, 150],  # RDS in the region, outside the AZ
+            [950, 750, 990, 790],  # EC2 in aws only
+        ], dtype=np.float32)
+        class_ids = np.array([5, 2, 3, 4, 0, 1, 0])
+        result = build_hierarchy(boxes, np.ones(7), class_ids, CLASS_NAMES)
+
+        np.testing.assert_array_equal(result['parents'], [-1, 0, 1, 2, 3, 1, 0])
+        np.testing.assert_array_equal(result['depths'], [0, 1, 2, 3, 4, 2, 1])
+        assert len(result['tree']) == 1
+        assert result['tree'][0]['class'] == 'aws'
+        assert "        EC2 (1.00)" in format_tree(result['tree'])
+
+    def test_icons_are_never_parents(self):
+        boxes = np.array([[0, 0, 100, 100], [10, 10, 20, 20]], dtype=np.float32)
+        result = build_hierarchy(boxes, np.ones(2), np.array([0, 1]), CLASS_NAMES)
+        np.testing.assert_array_equal(result['parents'], [-1, -1])
+
+    def test_matches_pairwise_reference(self):
+        rng = np.random.default_rng(0)
+        xy = rng.uniform(0, 900, (300, 2))
+        wh = rng.uniform(5, 400, (300, 2))
+        boxes = np.concatenate([xy, xy + wh], axis=1).astype(np.float32)
+        is_container = rng.random(300) < 0.2
+
+        parents = find_parents(boxes, is_container)
+
+        np.testing.assert_array_equal(parents, brute_force_parents(boxes, is_container))
+        assert np.all(node_depths(parents) < 300)  # acyclic
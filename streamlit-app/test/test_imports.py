@@ -0,0 +1,23 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["torch", "ultralytics", "tensorflow"]
+
+
+def imported_heavy_modules(module: str) -> list:
+    code = f"import json, sys; import {module}; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestLazyImports:
+    """Test that the ONNX serving path doesn't import heavy frameworks"""
+
+    def test_inference_module(self):
+        assert imported_heavy_modules("utils.inference") == []
+
+    def test_app_module(self):
+        assert imported_heavy_modules("app") == []
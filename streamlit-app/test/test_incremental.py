@@ -0,0 +1,89 @@
+import numpy as np
+
+from utils.incremental import IncrementalDetector
+
+
+class TileCountingDetector:
+    """Fake detector: one box at the center of every tile it is given"""
+
+    def __init__(self):
+        self.tiles = 0
+
+    def detect_batch(self, images, conf_threshold, nms_threshold):
+        self.tiles += len(images)
+        return [{
+            'boxes': np.array([[w / 2 - 4, h / 2 - 4, w / 2 + 4, h / 2 + 4]], dtype=np.float32),
+            'scores': np.array([0.9], dtype=np.float32),
+            'class_ids': np.array([0]),
+        } for h, w in (image.shape[:2] for image in images)]
+
+
+def diagram(seed=0):
+    return np.random.default_rng(seed).integers(0, 255, (200, 300, 3), dtype=np.uint8)
+
+
+class TestIncrementalDetector:
+    """Test that revisions only re-run the tiles that changed"""
+
+    def test_unchanged_diagram_reuses_all_tiles(self):
+        detector = TileCountingDetector()
+        incremental = IncrementalDetector(detector, tile_size=64, overlap=0.25)
+        first = incremental.detect("d", diagram())
+        second = incremental.detect("d", diagram())
+
+        assert first['tiles_inferred'] == first['tiles_total'] == detector.tiles - 1  # + whole image
+        assert second['tiles_inferred'] == 0
+        assert detector.tiles == first['tiles_total'] + 1  # recorded whole-image pass reused
+        np.testing.assert_array_equal(first['boxes'], second['boxes'])
+
+    def test_edit_reruns_covering_tiles(self):
+        detector = TileCountingDetector()
+        incremental = IncrementalDetector(detector, tile_size=64, overlap=0.25)
+        image = diagram()
+        first = incremental.detect("d", image)
+
+        edited = image.copy()
+        edited[100:104, 100:104] = 0  # inside the overlap of 2 x 2 tiles
+        second = incremental.detect("d", edited)
+
+        assert second['tiles_inferred'] == 4
+        assert detector.tiles == first['tiles_total'] + 1 + 4 + 1  # whole image re-run after an edit
+        np.testing.assert_array_equal(first['boxes'], second['boxes'])
+
+    def test_records_are_per_diagram_and_thresholds(self):
+        detector = TileCountingDetector()
+        incremental = IncrementalDetector(detector, tile_size=64, overlap=0.25)
+        total = incremental.detect("a", diagram())['tiles_total']
+
+        assert incremental.detect("b", diagram())['tiles_inferred'] == total
+        assert incremental.detect("a", diagram(), conf_threshold=0.3)['tiles_inferred'] == total
+        assert incremental.detect("a", diagram(1)[:150])['tiles_inferred'] > 0
+
+    def test_tolerance_ignores_noise(self):
+        detector = TileCountingDetector()
+        incremental = IncrementalDetector(detector, tile_size=64, overlap=0.25, tolerance=2)
+        image = diagram()
+        incremental.detect("d", image)
+
+        noisy = np.clip(image.astype(np.int16) + 1, 0, 255).astype(np.uint8)
+        assert incremental.detect("d", noisy)['tiles_inferred'] == 0
+
+    def test_blank_tiles_skipped(self):
+        detector = TileCountingDetector()
+        image = np.full((200, 300, 3), 255, dtype=np.uint8)
+        image[:64, :64] = diagram()[:64, :64]
+        result = IncrementalDetector(detector, tile_size=64, overlap=0.25).detect("d", image)
+
+        assert 0 < result['tiles_inferred'] < result['tiles_total']
+        assert detector.tiles == result['tiles_inferred'] + 1
+
+    def test_full_image_pass_merged(self):
+        detector = TileCountingDetector()
+        result = IncrementalDetector(detector, tile_size=64, overlap=0.25).detect("d", diagram())
+        # the fake's box at the center of the whole 300 x 200 image
+        assert any(np.allclose(box, [146, 96, 154, 104]) for box in result['boxes'])
+
+        detector = TileCountingDetector()
+        result = IncrementalDetector(detector, tile_size=64, overlap=0.25, full_image=False).detect("d", diagram())
+        assert detector.tiles == result['tiles_total']
+        assert not any(np.allclose(box, [146, 96, 154, 104]) for box in result['boxes'])
@@ -0,0 +1,33 @@
+
+from prometheus_client import REGISTRY
+
+from utils.metrics import observe_image, start_metrics_server, timed
+
+
+def sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+
+class TestMetrics:
+    """Test per-stage detection metrics"""
+
+    def test_timed_records_stage(self):
+        before = sample('detection_stage_seconds_count', {'stage': 'postprocess'})
+        durations = {}
+        with timed('postprocess', durations):
+            pass
+        with timed('postprocess', durations):
+            pass
+        assert sample('detection_stage_seconds_count', {'stage': 'postprocess'}) == before + 2
+        assert set(durations) == {'postprocess'} and durations['postprocess'] >= 0
+
+    def test_observe_image(self):
+        images = sample('detection_images_total')
+        objects = sample('detection_objects_total')
+        observe_image((1000, 2000, 3), 7)
+        assert sample('detection_images_total') == images + 1
+        assert sample('detection_objects_total') == objects + 7
+
+    def test_metrics_endpoint(self):
+        assert start_metrics_server(0, '127.0.0.1')  # port 0: any free port
+        assert start_metrics_server(0, '127.0.0.1')  # second call is a no-op
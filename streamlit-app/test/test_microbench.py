@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from microbench import (CALIBRATION_CASE, build_cases, compare, environment, environment_mismatch,  # noqa: E402
+                        synthetic_outputs)
+
+
+class TestMicrobench:
+    """Test the microbenchmark inputs and the baseline comparison"""
+
+    def test_synthetic_outputs_shape(self):
+        outputs = synthetic_outputs(num_objects=10)
+        assert outputs.shape == (1, 186, 8400)
+        assert (outputs[0, 4:].max(axis=0) >= 0.3).sum() == 80
+
+    def test_cases_run(self):
+        for name, func in build_cases().items():
+            func()
+
+    def test_compare_flags_regressions(self):
+        baseline = {"tolerance": 0.25, "cases": {
+            "fast": {"min_ms": 1.0},
+            "loose": {"min_ms": 1.0, "tolerance": 1.0},
+        }}
+        results = {"fast": {"min_ms": 1.3}, "loose": {"min_ms": 1.9}, "new": {"min_ms": 5.0}}
+        regressions = compare(results, baseline)
+        assert [r[0] for r in regressions] == ["fast"]
+        assert np.isclose(regressions[0][3], 1.25)
+
+    def test_compare_relative_to_calibration(self):
+        baseline = {"tolerance": 0.25, "cases": {
+            CALIBRATION_CASE: {"min_ms": 10.0},
+            "scaled": {"min_ms": 1.0},
+            "slower": {"min_ms": 1.0},
+        }}
+        # this machine is twice as slow: 2.4 ms is within 2 x 1.25, 2.6 ms is not
+        results = {CALIBRATION_CASE: {"min_ms": 20.0}, "scaled": {"min_ms": 2.4}, "slower": {"min_ms": 2.6}}
+        assert [r[0] for r in compare(results, baseline)] == [CALIBRATION_CASE, "scaled", "slower"]
+        regressions = compare(results, baseline, relative=True)
+        assert [r[0] for r in regressions] == ["slower"]
+        assert np.isclose(regressions[0][2], 2.0) and np.isclose(regressions[0][3], 2.5)
+
+    def test_environment_mismatch(self):
+        baseline = {**environment(), "cases": {}}
+        assert environment_mismatch(baseline) == []
+
+        baseline["numpy"] = "1.24.3"
+        assert environment_mismatch(baseline) == [f"numpy: 1.24.3 != {np.__version__}"]
@@ -0,0 +1,140 @@
+import numpy as np
+
+from utils.postprocess import CLUSTER_NMS_MAX, batched_nms, box_iou, decode_predictions, nms, scale_boxes
+
+
+def greedy_nms_reference(boxes, scores, iou_threshold):
+    """Plain per-box greedy NMS used as the reference implementation"""
+    order = list(np.argsort(-scores, kind='stable'))
+    keep = []
+    while order:
+        i = order.pop(0)
+        keep.append(i)
+        order = [j for j in order if box_iou(boxes[i:i + 1], boxes[j:j + 1])[0, 0] <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def random_boxes(rng, n, size=200):
+    xy = rng.uniform(0, size, (n, 2))
+    wh = rng.uniform(5, 60, (n, 2))
+    return np.concatenate([xy, xy + wh], axis=1).astype(np.float32)
+
+
+class TestNMS:
+    """Test vectorized NMS"""
+
+    def test_nms_matches_greedy_reference(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            boxes = random_boxes(rng, 80)
+            scores = rng.uniform(0, 1, 80).astype(np.float32)
+            np.testing.assert_array_equal(
+                nms(boxes, scores, 0.45), greedy_nms_reference(boxes, scores, 0.45)
+            )
+
+    def test_large_set_matches_greedy(self):
+        rng = np.random.default_rng(2)
+        boxes = random_boxes(rng, CLUSTER_NMS_MAX + 200, size=400)
+        scores = rng.uniform(0, 1, len(boxes)).astype(np.float32)
+        scores[:50] = 0  # zero scores are still NMS candidates
+        scores[50:100] = scores[100]  # ties keep their input order
+
+        # Greedy over the precomputed IoU matrix (the per-pair reference is too slow here)
+        order = np.argsort(-scores, kind='stable')
+        iou = box_iou(boxes[order], boxes[order])
+        keep = np.ones(len(order), dtype=bool)
+        for i in range(len(order)):
+            if keep[i]:
+                keep[i + 1:] &= iou[i, i + 1:] <= 0.45
+
+        np.testing.assert_array_equal(nms(boxes, scores, 0.45), order[keep])
+
+    def test_nms_empty(self):
+        keep = nms(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), 0.5)
+        assert keep.shape == (0,)
+
+    def test_batched_nms_keeps_other_groups(self):
+        boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10]], dtype=np.float32)
+        scores = np.array([0.9, 0.8], dtype=np.float32)
+
+        assert len(batched_nms(boxes, scores, np.array([0, 0]), 0.5)) == 1
+        assert len(batched_nms(boxes, scores, np.array([0, 1]), 0.5)) == 2
+
+    def test_batched_nms_matches_per_group_nms(self):
+        rng = np.random.default_rng(3)
+        boxes = random_boxes(rng, 400)
+        scores = rng.uniform(0, 1, 400).astype(np.float32)
+        groups = rng.integers(0, 6, 400)
+
+        expected = np.concatenate([
+            np.flatnonzero(groups == g)[nms(boxes[groups == g], scores[groups == g], 0.45)] for g in range(6)
+        ])
+        expected = expected[np.argsort(-scores[expected], kind='stable')]
+        np.testing.assert_array_equal(batched_nms(boxes, scores, groups, 0.45), expected)
+
+
+class TestDecodePredictions:
+    """Test raw YOLOv8 output decoding"""
+
+    def test_decode_batch(self):
+        outputs = np.zeros((2, 4 + 5, 16), dtype=np.float32)
+        outputs[0, :4, 3] = [50, 50, 20, 20]
+        outputs[0, 4 + 2, 3] = 0.9
+        outputs[1, :4, 7] = [30, 40, 10, 10]
+        outputs[1, 4 + 4, 7] = 0.7
+        outputs[1, 4 + 1, 8] = 0.1  # below threshold
+
+        results = decode_predictions(outputs, 0.25, 0.45)
+
+        assert len(results) == 2
+        boxes, scores, class_ids = results[0]
+        np.testing.assert_allclose(boxes, [[40, 40, 60, 60]])
+        np.testing.assert_array_equal(class_ids, [2])
+        boxes, scores, class_ids = results[1]
+        np.testing.assert_allclose(boxes, [[25, 35, 35, 45]])
+        np.testing.assert_allclose(scores, [0.7], rtol=1e-6)
+
+    def test_decode_max_det(self):
+        rng = np.random.default_rng(1)
+        outputs = np.zeros((1, 4 + 2, 500), dtype=np.float32)
+        outputs[0, 0, :] = np.arange(500) * 30  # disjoint boxes
+        outputs[0, 1, :] = 10
+        outputs[0, 2:4, :] = 10
+        outputs[0, 4, :] = rng.uniform(0.5, 1, 500)
+
+        boxes, scores, _ = decode_predictions(outputs, 0.25, 0.45, max_det=100)[0]
+
+        assert len(boxes) == 100
+        assert np.all(np.diff(scores) <= 0)
+
+    def test_max_nms_per_image(self):
+        outputs = np.zeros((2, 4 + 1, 64), dtype=np.float32)
+        outputs[:, 0] = np.arange(64) * 30  # disjoint boxes
+        outputs[:, 1:4] = 10
+        outputs[0, 4] = np.linspace(0.5, 0.9, 64)
+        outputs[1, 4, :4] = 0.3  # a sparse image keeps its candidates next to a dense one
+
+        results = decode_predictions(outputs, 0.25, 0.45, max_nms=16)
+
+        assert len(results[0][0]) == 16
+        np.testing.assert_allclose(results[0][1].min(), np.linspace(0.5, 0.9, 64)[-16], rtol=1e-6)
+        assert len(results[1][0]) == 4
+
+    def test_decode_end2end(self):
+        outputs = np.zeros((2, 300, 6), dtype=np.float32)
+        outputs[0, 0] = [10, 10, 50, 50, 0.9, 3]
+        outputs[0, 1] = [12, 12, 50, 50, 0.8, 3]   # in-graph NMS was looser than requested
+        outputs[0, 2] = [12, 12, 50, 50, 0.8, 4]   # other class
+        outputs[1, 0] = [0, 0, 20, 20, 0.2, 1]     # below threshold
+
+        results = decode_predictions(outputs, 0.25, 0.45)
+
+        boxes, scores, class_ids = results[0]
+        np.testing.assert_allclose(boxes, [[10, 10, 50, 50], [12, 12, 50, 50]])
+        np.testing.assert_array_equal(class_ids, [3, 4])
+        assert len(results[1][0]) == 0
+
+    def test_scale_boxes_with_padding(self):
+        boxes = np.array([[10, 20, 110, 70]], dtype=np.float32)
+        scaled = scale_boxes(boxes, (100, 400), (160, 160), ratio_pad=((0.4, 0.4), (0, 60)))
+        np.testing.assert_allclose(scaled, [[25, 0, 275, 25]])
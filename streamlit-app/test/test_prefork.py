@@ -0,0 +1,77 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from utils.inference import ObjectDetector
+from utils.prefork import PreforkDetector, cpu_slices
+
+
+class ExitOnUse:
+    """Stand-in image that kills the worker process reading it"""
+
+    @property
+    def ndim(self):
+        os._exit(1)
+
+
+class TestCpuSlices:
+    """Test how CPUs are split between workers"""
+
+    def test_disjoint_slices(self):
+        slices = cpu_slices(3, range(8))
+        assert slices == [[0, 1, 2], [3, 4, 5], [6, 7]]
+
+    def test_more_workers_than_cpus(self):
+        assert cpu_slices(3, [4, 5]) == [[4], [5], [4]]
+
+
+class TestPreforkDetector:
+    """Test detection in forked workers against the in-process detector"""
+
+    def test_matches_in_process(self, tmp_path, constant_detector):
+        model_path = constant_detector(tmp_path / "model.onnx")
+        images = [np.full((h, w, 3), 128, dtype=np.uint8) for h, w in [(64, 48), (32, 32), (100, 30)]]
+        expected = ObjectDetector(model_path, imgsz=32).detect_batch(images, 0.5, 0.45)
+
+        with PreforkDetector(model_path, workers=2, imgsz=32) as detector:
+            results = detector.detect_batch(images, 0.5, 0.45)
+
+        for result, reference in zip(results, expected):
+            assert len(result['boxes']) == 3
+            np.testing.assert_allclose(result['boxes'], reference['boxes'])
+            np.testing.assert_array_equal(result['class_ids'], reference['class_ids'])
+
+    def test_worker_errors_reach_caller(self, tmp_path, constant_detector):
+        with PreforkDetector(constant_detector(tmp_path / "model.onnx"), workers=1, imgsz=32) as detector:
+            with pytest.raises(RuntimeError, match="Unsupported image format"):
+                detector.detect(np.zeros((8, 8, 7), dtype=np.uint8))
+            assert len(detector.detect(np.zeros((8, 8, 3), dtype=np.uint8), 0.5)['boxes']) == 3
+
+    def test_dead_worker_replaced(self, tmp_path, constant_detector):
+        image = np.zeros((8, 8, 3), dtype=np.uint8)
+        with PreforkDetector(constant_detector(tmp_path / "model.onnx"), workers=2, imgsz=32) as detector:
+            detector.detect_batch([image] * 2)
+            while 0 in detector.worker_pids:  # the supervisor may still be forking the second worker
+                time.sleep(0.01)
+            pids = set(detector.worker_pids)
+            crashed = detector.submit(ExitOnUse())
+            others = [detector.submit(image) for _ in range(4)]
+
+            with pytest.raises(RuntimeError, match="exited unexpectedly"):
+                crashed.result(timeout=10)
+            assert all(len(future.result(timeout=10)['boxes']) == 3 for future in others)
+            assert len(detector.detect_batch([image] * 4)) == 4
+            assert detector.restarts == 1
+            assert len(pids & set(detector.worker_pids)) == 1
+
+    def test_worker_failing_to_start_not_replaced(self, tmp_path, constant_detector, monkeypatch):
+        import cv2
+        # the worker dies while setting itself up, before taking any task
+        monkeypatch.setattr(cv2, "setNumThreads", lambda threads: os._exit(1))
+        with PreforkDetector(constant_detector(tmp_path / "model.onnx"), workers=1, imgsz=32) as detector:
+            future = detector.submit(np.zeros((8, 8, 3), dtype=np.uint8))
+            with pytest.raises(RuntimeError, match="no workers left"):
+                future.result(timeout=10)
+            assert detector.restarts == 0
@@ -0,0 +1,104 @@
+import json
+
+import cv2
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+from utils.quantization import CalibrationReader, run_quantization_pipeline, sample_images
+
+
+def write_images(image_dir, count, shape=(32, 48, 3)):
+    """PNG calibration images with different gray levels"""
+    image_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = image_dir / f"img{i}.png"
+        cv2.imwrite(str(path), np.full(shape, i * 20 % 256, dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+
+def tiny_detector(path, imgsz=32):
+    """Conv-only ONNX detector whose raw YOLOv8 output (1, 4 + 3, 16) puts class 0 at the image center"""
+    rng = np.random.default_rng(0)
+    weights = rng.normal(0, 1e-3, (7, 3, 8, 8)).astype(np.float32)
+    bias = np.array([16, 16, 16, 16, 0.9, 0.05, 0.05], dtype=np.float32)
+    graph = helper.make_graph(
+        [
+            helper.make_node('Conv', ['images', 'weights', 'bias'], ['features'], kernel_shape=[8, 8],
+                             strides=[8, 8]),
+            helper.make_node('Reshape', ['features', 'shape'], ['output0']),
+        ], 'tiny',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, [1, 3, imgsz, imgsz])],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, [1, 7, (imgsz // 8) ** 2])],
+        [
+            numpy_helper.from_array(weights, 'weights'),
+            numpy_helper.from_array(bias, 'bias'),
+            numpy_helper.from_array(np.array([1, 7, -1], dtype=np.int64), 'shape'),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 7
+    onnx.save(model, str(path))
+    return path
+
+
+class TestCalibration:
+    """Test INT8 calibration data loading"""
+
+    def test_sample_images_deterministic(self, tmp_path):
+        write_images(tmp_path, 10)
+        (tmp_path / "notes.txt").write_text("not an image")
+
+        first = sample_images(str(tmp_path), num_samples=4, seed=0)
+        second = sample_images(str(tmp_path), num_samples=4, seed=0)
+
+        assert first == second
+        assert len(first) == 4
+        assert all(path.suffix == ".png" for path in first)
+
+    def test_calibration_reader(self, tmp_path):
+        paths = write_images(tmp_path, 3)
+
+        reader = CalibrationReader(paths, imgsz=64)
+        batches = [reader.get_next() for _ in range(4)]
+
+        assert batches[-1] is None
+        assert batches[0]["images"].shape == (1, 3, 64, 64)
+        assert not np.shares_memory(batches[0]["images"], batches[1]["images"])
+
+        reader.rewind()
+        assert reader.get_next() is not None
+
+
+class TestQuantizationPipeline:
+    """Test quantization end to end on a tiny model and dataset"""
+
+    def test_pipeline_report(self, tmp_path):
+        image_dir = tmp_path / "data" / "test" / "images"
+        label_dir = tmp_path / "data" / "test" / "labels"
+        label_dir.mkdir(parents=True)
+        for path in write_images(image_dir, 6, shape=(32, 32, 3)):
+            (label_dir / f"{path.stem}.txt").write_text("0 0.5 0.5 0.5 0.5\n")
+        data_yaml = tmp_path / "data" / "data.yaml"
+        data_yaml.write_text("test: test/images\nnames: ['ec2', 's3', 'lambda']\n")
+
+        fp32_path = tiny_detector(tmp_path / "model.onnx")
+        metadata = {"model_name": "tiny", "imgsz": 32, "classes": ["ec2", "s3", "lambda"]}
+        int8_metadata, report = run_quantization_pipeline(
+            str(fp32_path), metadata, str(image_dir), str(data_yaml), num_samples=4)
+
+        int8_path = tmp_path / "model_int8.onnx"
+        assert int8_metadata["model_path"] == str(int8_path) and int8_path.exists()
+        assert any(node.op_type == "QuantizeLinear" for node in onnx.load(str(int8_path)).graph.node)
+        for name in ("fp32", "int8"):
+            assert {"model_path", "size_mb", "mAP50", "mAP50_95", "p50_ms", "p99_ms", "mean_ms"} <= set(report[name])
+        assert report["fp32"]["mAP50"] == 1.0
+        assert abs(report["delta"]["mAP50"]) <= 0.02
+        assert report["delta"]["p50_speedup"] > 0
+
+        quantization = int8_metadata["quantization"]
+        assert quantization["calibration_images"] == 4 and quantization["recommended"]
+        assert json.loads((tmp_path / "model_int8_report.json").read_text()) == report
+        assert json.loads((tmp_path / "model_int8_metadata.json").read_text()) == int8_metadata
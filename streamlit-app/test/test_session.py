@@ -0,0 +1,115 @@
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnx import TensorProto, helper, numpy_helper
+
+from utils.inference import ObjectDetector
+from utils.session import (BoundRunner, SessionPool, create_session, create_session_options, exported_input_size,
+                           load_runtime_config)
+
+
+def doubling_model(path):
+    """ONNX graph computing 2 * x for (N, 3, 8, 8) inputs"""
+    graph = helper.make_graph(
+        [helper.make_node('Mul', ['images', 'two'], ['output0'])], 'double',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, ['N', 3, 8, 8])],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, ['N', 3, 8, 8])],
+        [numpy_helper.from_array(np.array(2.0, dtype=np.float32), 'two')],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 7
+    onnx.save(model, str(path))
+    return str(path)
+
+
+def dynamic_model(path, imgsz=None):
+    """Identity ONNX graph with dynamic height / width, optionally with ultralytics' imgsz metadata"""
+    graph = helper.make_graph(
+        [helper.make_node('Identity', ['images'], ['output0'])], 'dynamic',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, ['N', 3, 'H', 'W'])],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, ['N', 3, 'H', 'W'])],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 7
+    if imgsz:
+        helper.set_model_props(model, {'imgsz': str(imgsz)})
+    onnx.save(model, str(path))
+    return str(path)
+
+
+class TestRuntimeConfig:
+    """Test ONNX Runtime session configuration"""
+
+    def test_config_precedence(self, tmp_path):
+        config_path = tmp_path / "config.yaml"
+        config_path.write_text("runtime:\n  pool_size: 3\n  inter_op_num_threads: 2\n")
+        metadata = {"runtime": {"pool_size": 4}}
+
+        runtime = load_runtime_config(metadata, str(config_path))
+
+        assert runtime["pool_size"] == 4
+        assert runtime["inter_op_num_threads"] == 2
+        assert runtime["graph_optimization_level"] == "all"
+
+    def test_missing_config(self):
+        runtime = load_runtime_config(None, "does_not_exist.yaml")
+        assert runtime["pool_size"] == 1
+
+    def test_session_options(self):
+        options = create_session_options(
+            graph_optimization_level="basic", intra_op_num_threads=3, execution_mode="parallel",
+            enable_mem_arena=False
+        )
+
+        assert options.graph_optimization_level == ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
+        assert options.execution_mode == ort.ExecutionMode.ORT_PARALLEL
+        assert options.intra_op_num_threads == 3
+        assert options.enable_cpu_mem_arena is False
+
+    def test_threads_split_across_pool(self):
+        single = create_session_options(pool_size=1)
+        pooled = create_session_options(pool_size=64)
+
+        assert pooled.intra_op_num_threads == max(1, single.intra_op_num_threads // 64)
+
+
+class TestBoundRunner:
+    """Test IOBinding runs into reused output buffers"""
+
+    def test_outputs_reused(self, tmp_path):
+        runner = BoundRunner(create_session(doubling_model(tmp_path / "m.onnx")))
+        tensor = np.zeros((1, 3, 8, 8), dtype=np.float32)
+
+        first = runner.run(tensor)[0]
+        tensor[:] = 1.5  # rewritten in place, like the cached letterbox buffer
+        second = runner.run(tensor)[0]
+
+        assert np.shares_memory(first, second)
+        np.testing.assert_array_equal(second, np.full((1, 3, 8, 8), 3.0, dtype=np.float32))
+
+    def test_shapes_and_pool(self, tmp_path):
+        pool = SessionPool(doubling_model(tmp_path / "m.onnx"), pool_size=2)
+        runner = BoundRunner(pool)
+        rng = np.random.default_rng(0)
+        for batch in (1, 4, 1, 4, 2):
+            tensor = rng.random((batch, 3, 8, 8), dtype=np.float32)
+            np.testing.assert_array_equal(runner.run(tensor)[0], pool.run(None, {'images': tensor})[0])
+
+
+class TestInputSize:
+    """Test the input size of exports with dynamic height / width"""
+
+    def test_ultralytics_metadata(self, tmp_path):
+        path = dynamic_model(tmp_path / "model.onnx", [320, 320])
+        assert exported_input_size(create_session(path)) == 320
+        assert ObjectDetector(path).imgsz == 320
+
+    def test_model_metadata_json(self, tmp_path):
+        path = dynamic_model(tmp_path / "model.onnx")
+        assert exported_input_size(create_session(path)) is None
+        assert ObjectDetector(path).imgsz == 640
+
+        (tmp_path / "model_metadata.json").write_text('{"model_path": "models/model.onnx", "imgsz": 416}')
+        assert ObjectDetector(path).imgsz == 416
+        (tmp_path / "model_metadata.json").write_text('{"model_path": "models/other.onnx", "imgsz": 416}')
+        assert ObjectDetector(path, imgsz=512).imgsz == 512
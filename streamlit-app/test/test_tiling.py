@@ -0,0 +1,61 @@
+import numpy as np
+
+import utils.inference
+from utils.inference import ObjectDetector
+from utils.tiling import blank_tiles, shift_detections, tile_grid
+
+
+class TestTiling:
+    """Test tile generation and merging helpers"""
+
+    def test_tile_grid_covers_image(self):
+        tiles = tile_grid((1000, 2500), tile_size=640, overlap=0.2)
+
+        assert np.all(tiles[:, 2] - tiles[:, 0] == 640)
+        assert np.all(tiles[:, 3] - tiles[:, 1] == 640)
+        assert tiles[:, 2].max() == 2500 and tiles[:, 3].max() == 1000
+        assert tiles[:, 0].min() == 0 and tiles[:, 1].min() == 0
+
+    def test_tile_grid_small_image(self):
+        tiles = tile_grid((200, 300), tile_size=640)
+        np.testing.assert_array_equal(tiles, [[0, 0, 300, 200]])
+
+    def test_blank_tiles(self):
+        image = np.full((128, 256, 3), 255, dtype=np.uint8)
+        image[10:40, 140:180] = 0
+        tiles = np.array([[0, 0, 128, 128], [128, 0, 256, 128]])
+
+        np.testing.assert_array_equal(blank_tiles(image, tiles), [True, False])
+
+    def test_shift_detections(self):
+        detections = [
+            {'boxes': np.array([[0, 0, 10, 10]], np.float32), 'scores': np.array([0.9]), 'class_ids': np.array([1])},
+            {'boxes': np.zeros((0, 4), np.float32), 'scores': np.zeros(0), 'class_ids': np.zeros(0, int)},
+            {'boxes': np.array([[5, 5, 10, 10]], np.float32), 'scores': np.array([0.5]), 'class_ids': np.array([2])},
+        ]
+        tiles = np.array([[100, 0, 200, 100], [0, 0, 100, 100], [0, 50, 100, 150]])
+
+        merged = shift_detections(detections, tiles)
+
+        np.testing.assert_allclose(merged['boxes'], [[100, 0, 110, 10], [5, 55, 10, 60]])
+        np.testing.assert_array_equal(merged['class_ids'], [1, 2])
+
+
+class TestDetectTiled:
+    """Test tiled detection on a pool of sessions"""
+
+    def test_threads_follow_pool_size(self, tmp_path, monkeypatch, constant_detector):
+        pools = []
+
+        class RecordingPool(utils.inference.ThreadPoolExecutor):
+            def __init__(self, max_workers):
+                pools.append(max_workers)
+                super().__init__(max_workers)
+
+        monkeypatch.setattr(utils.inference, 'ThreadPoolExecutor', RecordingPool)
+        detector = ObjectDetector(constant_detector(tmp_path / "model.onnx"), runtime={'pool_size': 3})
+        image = np.random.default_rng(0).integers(0, 255, (64, 96, 3), dtype=np.uint8)
+        result = detector.detect_tiled(image, tile_size=32, batch_size=1)
+
+        assert pools == [3]
+        assert len(result['boxes']) > 0
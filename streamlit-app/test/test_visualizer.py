@@ -0,0 +1,58 @@
+import numpy as np
+
+from utils.visualizer import DetectionRenderer, class_color_lut, draw_detections, get_class_color, get_renderer
+
+CLASS_NAMES = [f"service{i}" for i in range(182)]
+
+
+class TestRenderer:
+    """Test cached overlay rendering"""
+
+    def test_color_lut(self):
+        lut = class_color_lut(182)
+        assert lut.shape == (182, 3) and lut.dtype == np.uint8
+        assert len({tuple(color) for color in lut}) > 150
+        assert get_class_color(3) == tuple(int(c) for c in lut[3])
+
+    def test_sprites_cached_per_score_bucket(self):
+        renderer = DetectionRenderer(CLASS_NAMES)
+        assert renderer.label_sprite(1, 0.871) is renderer.label_sprite(1, 0.869)
+        assert renderer.label_sprite(1, 0.87) is not renderer.label_sprite(1, 0.5)
+
+    def test_render_does_not_modify_input(self):
+        image = np.full((100, 120, 3), 255, dtype=np.uint8)
+        result = DetectionRenderer(CLASS_NAMES).render(
+            image, np.array([[10, 30, 50, 70]]), np.array([0.9]), np.array([7])
+        )
+        assert result.shape == image.shape
+        assert np.all(image == 255)
+        assert tuple(result[50, 10]) == get_class_color(7)  # left edge of the box
+
+    def test_preview_size(self):
+        image = np.zeros((1000, 2000, 3), dtype=np.uint8)
+        detections = {'boxes': np.array([[1000, 500, 1900, 900]]), 'scores': np.array([0.5]),
+                      'class_ids': np.array([0])}
+        result = draw_detections(image, detections, CLASS_NAMES, preview_size=500)
+        assert result.shape == (250, 500, 3)
+
+    def test_boxes_at_image_border(self):
+        image = np.zeros((50, 50, 3), dtype=np.uint8)
+        result = DetectionRenderer(CLASS_NAMES).render(
+            image, np.array([[0, 0, 50, 50], [45, 45, 60, 60]]), np.array([0.9, 0.4]), np.array([0, 1])
+        )
+        assert result.shape == (50, 50, 3)
+
+    def test_results_outlive_next_render(self):
+        renderer = DetectionRenderer(CLASS_NAMES)
+        image = np.zeros((60, 60, 3), dtype=np.uint8)
+        first = renderer.render(image, np.array([[10, 20, 40, 50]]), np.array([0.9]), np.array([7]))
+        kept = first.copy()
+        second = renderer.render(image, np.array([[5, 5, 20, 20]]), np.array([0.5]), np.array([3]))
+        assert second is not first
+        np.testing.assert_array_equal(first, kept)
+
+    def test_renderer_cached_per_thickness(self):
+        names = tuple(CLASS_NAMES)
+        assert get_renderer(names, 3) is get_renderer(names, 3)
+        assert get_renderer(names, 3) is not get_renderer(names)
+        assert get_renderer(names, 3).thickness == 3
@@ -0,0 +1,139 @@
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+
+def content_mask(image: np.ndarray, threshold: int = 16, step: int = 2) -> np.ndarray:
+    """Boolean mask (subsampled by step) of pixels that differ from the background color
+
+    The background is the per-channel median of the image border, so white,
+    dark and tinted canvases all work. A pixel is content when any channel is
+    more than threshold away from it.
+    """
+    height, width = image.shape[:2]
+    # nearest-neighbour resize subsamples several times faster than a strided numpy copy
+    sampled = cv2.resize(image, (max(1, width // step), max(1, height // step)), interpolation=cv2.INTER_NEAREST)
+    channels = sampled.reshape(sampled.shape[0], sampled.shape[1], -1)
+    border = np.concatenate([channels[0], channels[-1], channels[:, 0], channels[:, -1]])
+    background = np.median(border, axis=0)
+    lower = np.clip(background - threshold, 0, 255).astype(np.uint8)
+    upper = np.clip(background + threshold, 0, 255).astype(np.uint8)
+    return cv2.inRange(sampled, lower, upper) == 0
+
+
+def _segments(occupied: np.ndarray, min_gap: int) -> np.ndarray:
+    """[N, 2] (start, end) runs of occupied indices, split at gaps of at least min_gap"""
+    index = np.flatnonzero(occupied)
+    if len(index) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(index) >= min_gap)
+    starts = index[np.concatenate([[0], breaks + 1])]
+    ends = index[np.concatenate([breaks, [len(index) - 1]])] + 1
+    return np.stack([starts, ends], axis=1)
+
+
+def expand_boxes(boxes: np.ndarray, min_size: int, img_shape: Tuple[int, int]) -> np.ndarray:
+    """Grow boxes around their centers to at least min_size per side, kept inside the image
+
+    A crop smaller than the model input would be upscaled by the letterbox,
+    blowing icons up past the scale the model was trained on.
+    """
+    height, width = img_shape[:2]
+    boxes = boxes.copy()
+    for axis, length in ((0, width), (1, height)):
+        size = np.minimum(max(min_size, 0), length)
+        grow = np.maximum(size - (boxes[:, axis + 2] - boxes[:, axis]), 0)
+        start = np.clip(boxes[:, axis] - grow // 2, 0, None)
+        end = np.maximum(boxes[:, axis + 2] + (grow - grow // 2), start + size)
+        shift = np.maximum(end - length, 0)  # push back inside the far border
+        boxes[:, axis], boxes[:, axis + 2] = start - shift, end - shift
+    return boxes
+
+
+def merge_overlapping(boxes: np.ndarray) -> np.ndarray:
+    """Replace every group of intersecting boxes by their union"""
+    boxes = [box for box in boxes]
+    merged = True
+    while merged and len(boxes) > 1:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = np.concatenate([np.minimum(a[:2], b[:2]), np.maximum(a[2:], b[2:])])
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return np.array(boxes, dtype=np.int64).reshape(-1, 4)
+
+
+def content_regions(image: np.ndarray, min_gap: int = 64, margin: int = 8, min_size: int = 0,
+                    max_regions: int = 8, threshold: int = 16, step: int = 2) -> np.ndarray:
+    """Non-empty regions of a diagram from thresholded row/column projections
+
+    Rows are split into bands at empty horizontal gaps of at least min_gap
+    pixels, each band into blocks at empty vertical gaps, and every block is
+    tightened to its own rows (one XY-cut pass). Blocks get `margin` pixels of
+    context, are grown to min_size and merged where they overlap. More than
+    max_regions blocks collapse to their union, since many small crops cost
+    more than one larger one.
+
+    Returns:
+        [N, 4] int (x1, y1, x2, y2) regions; empty for a blank image
+    """
+    mask = content_mask(image, threshold, step)
+    gap = max(1, min_gap // step)
+    regions = []
+    for y1, y2 in _segments(mask.any(axis=1), gap):
+        band = mask[y1:y2]
+        for x1, x2 in _segments(band.any(axis=0), gap):
+            rows = np.flatnonzero(band[:, x1:x2].any(axis=1))
+            regions.append((x1, y1 + rows[0], x2, y1 + rows[-1] + 1))
+    if not regions:
+        return np.zeros((0, 4), dtype=np.int64)
+
+    boxes = np.array(regions, dtype=np.int64) * step
+    if len(boxes) > max_regions:
+        boxes = np.concatenate([boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)])[None]
+    height, width = image.shape[:2]
+    boxes += [-margin, -margin, margin, margin]
+    np.clip(boxes, 0, [width, height, width, height], out=boxes)
+    return merge_overlapping(expand_boxes(boxes, min_size, (height, width)))
+
+
+def content_box(image: np.ndarray, margin: int = 8, min_size: int = 0,
+                threshold: int = 16, step: int = 2) -> Optional[np.ndarray]:
+    """Bounding box (x1, y1, x2, y2) of everything that isn't background, None for a blank image"""
+    mask = content_mask(image, threshold, step)
+    rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0:
+        return None
+    height, width = image.shape[:2]
+    box = np.array([cols[0], rows[0], cols[-1] + 1, rows[-1] + 1], dtype=np.int64) * step
+    box += [-margin, -margin, margin, margin]
+    np.clip(box, 0, [width, height, width, height], out=box)
+    return expand_boxes(box[None], min_size, (height, width))[0]
+
+
+def crop_to_content(image: np.ndarray, min_size: int = 0, **kwargs) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """View of the image cropped to content_box, and the (x, y) offset of the crop
+
+    Blank images are returned whole.
+    """
+    box = content_box(image, min_size=min_size, **kwargs)
+    if box is None:
+        return image, (0, 0)
+    x1, y1, x2, y2 = (int(v) for v in box)
+    return image[y1:y2, x1:x2], (x1, y1)
+
+
+def offset_ratio_pad(ratio_pad: Tuple, offset: Tuple[int, int]) -> Tuple:
+    """Fold a crop offset into a letterbox ratio_pad
+
+    scale_boxes computes (box - pad) / ratio; shifting the pad by -offset * ratio
+    lands the boxes of the crop directly in full image coordinates.
+    """
+    (ratio_x, ratio_y), (pad_x, pad_y) = ratio_pad
+    return (ratio_x, ratio_y), (pad_x - offset[0] * ratio_x, pad_y - offset[1] * ratio_y)
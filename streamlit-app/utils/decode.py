@@ -0,0 +1,72 @@
+import io
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+from typing import Optional, Tuple
+
+EXIF_ORIENTATION = 0x0112
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}  # EXIF orientations that swap width and height
+
+# cv2 flags decoding at 1/1, 1/2, 1/4 and 1/8 resolution (DCT scaling for JPEG)
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def image_size(data: bytes) -> Tuple[int, int]:
+    """(width, height) as displayed, read from the image header without decoding pixels
+
+    Images with an EXIF orientation of 5-8 are stored rotated by 90 degrees;
+    decode_image applies the orientation, so their stored size is swapped.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+            return height, width
+        return width, height
+
+
+def reduction_factor(size: Tuple[int, int], max_size: Optional[int]) -> int:
+    """Largest decode reduction that keeps the longer side at or above max_size"""
+    if not max_size:
+        return 1
+    longest = max(size)
+    factor = 1
+    for candidate in (2, 4, 8):
+        if longest // candidate >= max_size:
+            factor = candidate
+    return factor
+
+
+def decode_image(data: bytes, max_size: Optional[int] = 2048) -> Tuple[np.ndarray, float]:
+    """Decode upload bytes to a contiguous RGB uint8 image no larger than max_size
+
+    The bytes are decoded once, straight from the upload buffer. Images far
+    larger than max_size are decoded at reduced resolution (1/2, 1/4, 1/8;
+    done in the DCT domain for JPEG) and then resized down to max_size, so an
+    8K upload never exists at full resolution for JPEGs. The EXIF orientation
+    is applied, so boxes found on the image map back to the upload as shown.
+
+    Returns:
+        (image, scale) where scale = decoded size / original size.
+    """
+    width, height = image_size(data)
+    factor = reduction_factor((width, height), max_size)
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), REDUCED_FLAGS[factor])
+    if image is None:
+        # Formats OpenCV can't decode (e.g. some palette / 16-bit variants)
+        with Image.open(io.BytesIO(data)) as pil_image:
+            image = np.asarray(ImageOps.exif_transpose(pil_image).convert('RGB'))
+    else:
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)  # in place, no extra copy
+
+    if max_size and max(image.shape[:2]) > max_size:
+        ratio = max_size / max(image.shape[:2])
+        new_size = (max(1, round(image.shape[1] * ratio)), max(1, round(image.shape[0] * ratio)))
+        image = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
+
+    return np.ascontiguousarray(image), image.shape[1] / width
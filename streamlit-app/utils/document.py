@@ -0,0 +1,100 @@
+import queue
+import threading
+import numpy as np
+from typing import Any, Callable, Iterable, Iterator, Tuple, Union
+
+POINTS_PER_INCH = 72
+
+
+def page_dpi(width_pt: float, height_pt: float, max_side: int = 2048,
+             min_dpi: int = 72, max_dpi: int = 300) -> int:
+    """DPI that renders a page with its longer side at max_side pixels
+
+    Page sizes are in PDF points (1/72 inch); a small page is not upsampled
+    beyond max_dpi and a huge sheet (A0 posters) is not rendered below min_dpi.
+    """
+    longest_inch = max(width_pt, height_pt, 1) / POINTS_PER_INCH
+    return int(np.clip(max_side / longest_inch, min_dpi, max_dpi))
+
+
+def iter_pdf_pages(source: Union[bytes, str], max_side: int = 2048,
+                   min_dpi: int = 72, max_dpi: int = 300) -> Iterator[Tuple[int, np.ndarray]]:
+    """Rasterize PDF pages one at a time as (page_number, RGB uint8 image)
+
+    Only the page being rendered is held in memory, so the cost of a document
+    does not grow with its page count. Requires PyMuPDF (pip install pymupdf).
+    """
+    try:
+        import pymupdf
+    except ImportError:  # PyMuPDF < 1.24.3
+        import fitz as pymupdf
+
+    document = pymupdf.open(stream=source, filetype='pdf') if isinstance(source, bytes) else pymupdf.open(source)
+    try:
+        for page in document:
+            dpi = page_dpi(page.rect.width, page.rect.height, max_side, min_dpi, max_dpi)
+            pixmap = page.get_pixmap(dpi=dpi, alpha=False, colorspace=pymupdf.csRGB)
+            image = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, 3)
+            yield page.number + 1, image.copy()  # samples belong to the pixmap
+    finally:
+        document.close()
+
+
+_END = object()
+
+
+def prefetch(items: Iterable, size: int = 2) -> Iterator:
+    """Produce items on a background thread, at most `size` ahead of the consumer
+
+    The producer stops when the consumer closes the generator, and producer
+    exceptions are re-raised in the consumer.
+    """
+    buffer = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as e:
+            put(e)
+        finally:
+            if hasattr(items, 'close'):
+                items.close()  # releases the document when the consumer stops early
+
+    thread = threading.Thread(target=produce, daemon=True, name='prefetch')
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def stream_detections(pages: Iterable[Tuple[int, np.ndarray]], detect: Callable[[np.ndarray], Any],
+                      prefetch_pages: int = 2) -> Iterator[Tuple[int, np.ndarray, Any]]:
+    """Run detect on every page as soon as it is rasterized
+
+    Rendering of the next pages overlaps with detection on the current one,
+    with at most prefetch_pages rendered pages waiting. Yields
+    (page_number, image, detect(image)) in page order.
+    """
+    for page_number, image in prefetch(pages, prefetch_pages):
+        yield page_number, image, detect(image)
@@ -0,0 +1,304 @@
+import json
+import numpy as np
+import yaml
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .cache import content_hash, file_hash
+from .postprocess import (MAX_DET, MAX_NMS, _end2end_candidates, _raw_candidates, batched_nms, box_iou,
+                          is_end2end, scale_boxes)
+from .inference import ObjectDetector
+from .quantization import IMAGE_EXTENSIONS, load_image
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)  # COCO mAP50-95 thresholds
+RECALL_POINTS = np.linspace(0, 1, 101)       # COCO 101-point interpolation
+CACHE_CONF = 0.001                           # floor for cached raw predictions
+
+
+def split_dirs(data_yaml: str, split: str = 'test') -> Tuple[Path, Path]:
+    """(images dir, labels dir) of a dataset split
+
+    The paths in Roboflow/ultralytics data.yaml files are often absolute paths
+    from the machine that trained; when they don't exist the split is looked
+    up next to the yaml file (<dataset>/<split>/images).
+    """
+    data_yaml = Path(data_yaml)
+    data = yaml.safe_load(data_yaml.read_text())
+    image_dir = Path(data.get(split, ''))
+    if not image_dir.is_absolute():
+        image_dir = (data_yaml.parent / image_dir).resolve()
+    if not image_dir.is_dir():
+        image_dir = data_yaml.parent / split / 'images'
+    if not image_dir.is_dir():
+        raise FileNotFoundError(f"Images for split '{split}' not found (looked for {image_dir})")
+    return image_dir, image_dir.parent / 'labels'
+
+
+def load_labels(label_path: Path, image_shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """YOLO label file -> (xyxy boxes in pixels [M, 4], class ids [M])
+
+    Rows are either 'cls cx cy w h' or polygons 'cls x1 y1 x2 y2 ...'
+    (normalized), which are reduced to their bounding box.
+    """
+    boxes, classes = [], []
+    if Path(label_path).exists():
+        for line in Path(label_path).read_text().splitlines():
+            values = line.split()
+            if not values:
+                continue
+            coords = np.array(values[1:], dtype=np.float32)
+            if len(coords) == 4:
+                cx, cy, w, h = coords
+                boxes.append((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2))
+            else:
+                xs, ys = coords[0::2], coords[1::2]
+                boxes.append((xs.min(), ys.min(), xs.max(), ys.max()))
+            classes.append(int(values[0]))
+
+    height, width = image_shape
+    boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4) * np.array([width, height, width, height], np.float32)
+    return boxes, np.array(classes, dtype=np.int64)
+
+
+def predict_split(model_path: str, image_paths: Sequence[Path], imgsz: int = 640,
+                  runtime: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+    """Raw (pre-NMS) candidates of a model over a list of images
+
+    Candidates above CACHE_CONF are kept in model input coordinates together
+    with each image's letterbox parameters, so any conf / NMS threshold can be
+    applied afterwards without running the model again. The model is fed and
+    sized as in serving (ObjectDetector): letterboxed float32 or, for exports
+    with folded preprocessing, the uint8 image; imgsz is only the fallback
+    for dynamic-shape exports without a recorded export size.
+
+    Returns:
+        dict of flat arrays: boxes [N, 4], scores [N], class_ids [N], and per
+        image offsets [I + 1], shapes [I, 2] and ratio_pads [I, 4].
+    """
+    detector = ObjectDetector(model_path, imgsz, runtime)
+    imgsz = detector.imgsz
+
+    boxes, scores, class_ids, offsets, shapes, ratio_pads = [], [], [], [0], [], []
+    for path in image_paths:
+        image = load_image(path)
+        tensor, ((ratio_x, ratio_y), (pad_x, pad_y)) = detector._preprocess_onnx(image)
+        outputs = detector._run(detector.model, tensor)
+        if is_end2end(outputs):
+            _, image_boxes, image_scores, image_classes = _end2end_candidates(outputs, CACHE_CONF)
+        else:
+            _, image_boxes, image_scores, image_classes = _raw_candidates(outputs, CACHE_CONF, MAX_NMS)
+        boxes.append(image_boxes)
+        scores.append(image_scores.astype(np.float32))
+        class_ids.append(image_classes.astype(np.int64))
+        offsets.append(offsets[-1] + len(image_scores))
+        shapes.append(image.shape[:2])
+        ratio_pads.append((ratio_x, ratio_y, pad_x, pad_y))
+
+    return {
+        'boxes': np.concatenate(boxes).reshape(-1, 4) if boxes else np.empty((0, 4), np.float32),
+        'scores': np.concatenate(scores) if scores else np.empty(0, np.float32),
+        'class_ids': np.concatenate(class_ids) if class_ids else np.empty(0, np.int64),
+        'offsets': np.array(offsets, dtype=np.int64),
+        'shapes': np.array(shapes, dtype=np.int64).reshape(-1, 2),
+        'ratio_pads': np.array(ratio_pads, dtype=np.float64).reshape(-1, 4),
+        'imgsz': np.array(imgsz),
+    }
+
+
+def cached_predictions(model_path: str, image_paths: Sequence[Path], cache_dir: Optional[str] = None,
+                       imgsz: int = 640, runtime: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+    """predict_split, stored in cache_dir as <key>.npz keyed by model content and image list"""
+    if cache_dir is None:
+        return predict_split(model_path, image_paths, imgsz, runtime)
+
+    key = content_hash(json.dumps({
+        'model': file_hash(model_path),
+        'images': [Path(p).name for p in image_paths],
+        'imgsz': imgsz,
+        'conf': CACHE_CONF,
+        'max_nms': MAX_NMS,
+    }, sort_keys=True).encode())
+    cache_path = Path(cache_dir) / f"{key}.npz"
+    if cache_path.exists():
+        with np.load(cache_path) as data:
+            return dict(data)
+
+    predictions = predict_split(model_path, image_paths, imgsz, runtime)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f".{key}.tmp.npz")
+    np.savez(tmp_path, **predictions)
+    tmp_path.replace(cache_path)
+    return predictions
+
+
+def select_detections(predictions: Dict[str, np.ndarray], index: int, conf_threshold: float,
+                      nms_threshold: float, max_det: int = MAX_DET) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Final detections of one image from cached candidates, as in serving (NMS, then rescale)"""
+    start, end = predictions['offsets'][index], predictions['offsets'][index + 1]
+    scores = predictions['scores'][start:end]
+    mask = scores > conf_threshold
+    boxes = predictions['boxes'][start:end][mask]
+    scores, class_ids = scores[mask], predictions['class_ids'][start:end][mask]
+
+    keep = batched_nms(boxes, scores, class_ids, nms_threshold)[:max_det]
+    ratio_x, ratio_y, pad_x, pad_y = predictions['ratio_pads'][index]
+    imgsz = int(predictions['imgsz'])
+    boxes = scale_boxes(boxes[keep].copy(), tuple(predictions['shapes'][index]), (imgsz, imgsz),
+                        ((ratio_x, ratio_y), (pad_x, pad_y)))
+    return boxes, scores[keep], class_ids[keep]
+
+
+def _greedy_match(iou: np.ndarray, candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """One-to-one (label, prediction) pairs among candidate entries of iou [M, N], highest IoU first"""
+    label_idx, pred_idx = np.nonzero(candidates)
+    for axis in (1, 0):  # drop repeated predictions, then repeated labels
+        order = np.argsort(-iou[label_idx, pred_idx], kind='stable')
+        label_idx, pred_idx = label_idx[order], pred_idx[order]
+        _, first = np.unique((label_idx, pred_idx)[axis], return_index=True)
+        label_idx, pred_idx = label_idx[first], pred_idx[first]
+    return label_idx, pred_idx
+
+
+def match_predictions(pred_classes: np.ndarray, true_classes: np.ndarray, iou: np.ndarray,
+                      iou_thresholds: np.ndarray = IOU_THRESHOLDS) -> np.ndarray:
+    """True positive flags [N, T] of N predictions at each IoU threshold
+
+    iou is the [M, N] matrix between ground truth and predictions. At every
+    threshold, same-class pairs are matched greedily by IoU so each label and
+    each prediction is used at most once.
+    """
+    correct = np.zeros((len(pred_classes), len(iou_thresholds)), dtype=bool)
+    iou = iou * (true_classes[:, None] == pred_classes[None, :])
+    for t, threshold in enumerate(iou_thresholds):
+        _, pred_idx = _greedy_match(iou, iou >= threshold)
+        correct[pred_idx, t] = True
+    return correct
+
+
+def average_precision(tp: np.ndarray, conf: np.ndarray, pred_classes: np.ndarray,
+                      true_classes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """COCO-style AP [C, T] of every class that has labels, for all classes at once
+
+    Predictions are sorted by (class, -confidence) so each class is one
+    contiguous segment, and cumulative TP/FP are taken over all segments in
+    one pass. The 101-point interpolated precision p(r) = max precision at
+    recall >= r is then a scatter-max of every point into its recall bucket
+    followed by a reversed running max over buckets, for all classes and
+    IoU thresholds together.
+
+    Returns:
+        (class ids [C], AP [C, T])
+    """
+    classes, num_labels = np.unique(true_classes, return_counts=True)
+    num_thresholds = tp.shape[1]
+    known = np.isin(pred_classes, classes)
+    if not known.any():
+        return classes, np.zeros((len(classes), num_thresholds))
+
+    tp, conf, pred_classes = tp[known], conf[known], pred_classes[known]
+    order = np.lexsort((-conf, pred_classes))
+    tp, segment = tp[order], np.searchsorted(classes, pred_classes[order])
+
+    starts = np.searchsorted(segment, np.arange(len(classes)))
+    rank = np.arange(len(segment)) - starts[segment] + 1          # 1-based position within the class
+    tp_cum = np.cumsum(tp, axis=0)
+    tp_cum -= np.concatenate([np.zeros((1, num_thresholds), tp_cum.dtype), tp_cum])[starts[segment]]
+    recall = tp_cum / num_labels[segment, None]
+    precision = tp_cum / rank[:, None]
+
+    # bucket b holds points whose recall reaches RECALL_POINTS[b - 1] but not RECALL_POINTS[b]
+    buckets = np.searchsorted(RECALL_POINTS, recall, side='right')            # [N, T] in 0..101
+    best = np.zeros((len(classes), len(RECALL_POINTS) + 1, num_thresholds))
+    np.maximum.at(best, (segment[:, None], buckets, np.arange(num_thresholds)[None, :]), precision)
+    interpolated = np.maximum.accumulate(best[:, ::-1], axis=1)[:, ::-1]      # max over recall >= r
+    return classes, interpolated[:, 1:].mean(axis=1)
+
+
+def confusion_matrix(detections: List[Tuple], labels: List[Tuple], num_classes: int,
+                     iou_threshold: float = 0.45) -> np.ndarray:
+    """[nc + 1, nc + 1] counts, rows = predicted class, columns = true class, last = background
+
+    Predictions and labels are matched class-agnostically by IoU, so a box in the
+    right place with the wrong class shows up off the diagonal.
+    """
+    matrix = np.zeros((num_classes + 1, num_classes + 1), dtype=np.int64)
+    for (boxes, _, pred_classes), (true_boxes, true_classes) in zip(detections, labels):
+        label_idx = pred_idx = np.empty(0, dtype=np.int64)
+        if len(boxes) and len(true_boxes):
+            iou = box_iou(true_boxes, boxes)
+            label_idx, pred_idx = _greedy_match(iou, iou > iou_threshold)
+
+        np.add.at(matrix, (pred_classes[pred_idx], true_classes[label_idx]), 1)
+        missed = np.setdiff1d(np.arange(len(true_classes)), label_idx)
+        np.add.at(matrix, (num_classes, true_classes[missed]), 1)
+        spurious = np.setdiff1d(np.arange(len(pred_classes)), pred_idx)
+        np.add.at(matrix, (pred_classes[spurious], num_classes), 1)
+    return matrix
+
+
+def score_predictions(predictions: Dict[str, np.ndarray], labels: List[Tuple[np.ndarray, np.ndarray]],
+                      class_names: Sequence[str], conf_threshold: float = 0.001, nms_threshold: float = 0.7,
+                      confusion_conf: float = 0.25, confusion_iou: float = 0.45) -> Dict:
+    """mAP50, mAP50-95, per-class AP and confusion matrix from cached predictions
+
+    The AP metrics use every detection above conf_threshold (the usual 0.001),
+    the confusion matrix only those above confusion_conf.
+    """
+    tps, confs, pred_classes, true_classes, confusion_inputs = [], [], [], [], []
+    for index, (true_boxes, image_classes) in enumerate(labels):
+        boxes, scores, class_ids = select_detections(predictions, index, conf_threshold, nms_threshold)
+        iou = box_iou(true_boxes, boxes) if len(true_boxes) and len(boxes) else np.zeros((len(true_boxes), len(boxes)))
+        tps.append(match_predictions(class_ids, image_classes, iou))
+        confs.append(scores)
+        pred_classes.append(class_ids)
+        true_classes.append(image_classes)
+        confident = scores > confusion_conf
+        confusion_inputs.append((boxes[confident], scores[confident], class_ids[confident]))
+
+    classes, ap = average_precision(np.concatenate(tps), np.concatenate(confs),
+                                    np.concatenate(pred_classes), np.concatenate(true_classes))
+    return {
+        'images': len(labels),
+        'labels': int(sum(len(c) for c in true_classes)),
+        'mAP50': float(ap[:, 0].mean()) if len(classes) else 0.0,
+        'mAP50_95': float(ap.mean()) if len(classes) else 0.0,
+        'per_class': {
+            (class_names[c] if c < len(class_names) else f'Class_{c}'): {'AP50': float(ap[i, 0]), 'AP50_95': float(ap[i].mean())} for i, c in enumerate(classes)
+        },
+        'confusion_matrix': confusion_matrix(confusion_inputs, labels, len(class_names), confusion_iou).tolist(),
+    }
+
+
+def evaluate_model(model_path: str, data_yaml: str, split: str = 'test', imgsz: int = 640,
+                   cache_dir: Optional[str] = None, conf_threshold: float = 0.001,
+                   nms_threshold: float = 0.7, runtime: Optional[Dict] = None) -> Dict:
+    """Score an ONNX model (FP32, INT8, end2end, ...) on a dataset split
+
+    With cache_dir the model runs once per (model file, split); scoring at
+    other thresholds then only replays NMS and matching.
+    """
+    image_dir, label_dir = split_dirs(data_yaml, split)
+    class_names = yaml.safe_load(Path(data_yaml).read_text())['names']
+    image_paths = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not image_paths:
+        raise FileNotFoundError(f"No images found in {image_dir}")
+
+    predictions = cached_predictions(model_path, image_paths, cache_dir, imgsz, runtime)
+    labels = [load_labels(label_dir / f"{path.stem}.txt", tuple(shape))
+              for path, shape in zip(image_paths, predictions['shapes'])]
+    report = score_predictions(predictions, labels, class_names, conf_threshold, nms_threshold)
+    report.update({'model_path': str(model_path), 'split': split})
+    return report
+
+
+def format_metrics(report: Dict, top: int = 10) -> str:
+    """Plain-text summary: overall mAP and the worst classes by AP50-95"""
+    lines = [
+        f"{report['split']}: {report['images']} images, {report['labels']} labels",
+        f"mAP50 {report['mAP50']:.4f}   mAP50-95 {report['mAP50_95']:.4f}",
+        f"{'class':<32}{'AP50':>8}{'AP50-95':>10}",
+    ]
+    worst = sorted(report['per_class'].items(), key=lambda item: item[1]['AP50_95'])[:top]
+    for name, metrics in worst:
+        lines.append(f"{name:<32}{metrics['AP50']:>8.4f}{metrics['AP50_95']:>10.4f}")
+    return "\n".join(lines)
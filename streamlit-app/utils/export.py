@@ -0,0 +1,320 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+import numpy as np
+import onnx
+from contextlib import contextmanager
+from importlib.metadata import version
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .cache import content_hash, file_hash
+from .postprocess import box_iou, decode_predictions
+from .preprocess import PAD_VALUE, letterbox
+from .quantization import load_image, measure_latency
+from .session import create_session
+
+# Export settings per variant. Every variant is exported from the same .pt with
+# the same imgsz / dynamic flag, so only these settings differ between them.
+EXPORT_VARIANTS = {
+    'plain': {'opset': 11, 'simplify': False, 'nms': False},
+    'simplified': {'opset': 11, 'simplify': True, 'nms': False},
+    'opset17': {'opset': 17, 'simplify': True, 'nms': False},
+    # NMS inside the graph: output [B, 300, 6]. conf is the lowest value of the
+    # app's confidence slider and iou the loosest NMS the app can ask for.
+    'end2end': {'opset': 17, 'simplify': True, 'nms': True, 'conf': 0.1, 'iou': 0.7},
+}
+REFERENCE_VARIANT = 'plain'
+DEFAULT_VARIANT = 'simplified'  # used when there are no images to benchmark on
+
+
+def export_variant(model, pt_path: str, name: str, imgsz: int = 320, dynamic: bool = False) -> Dict:
+    """Export one variant to <pt stem>_<name>.onnx and return the exact settings used"""
+    settings = EXPORT_VARIANTS[name]
+    exported = model.export(format='onnx', imgsz=imgsz, dynamic=dynamic, **settings)
+    onnx_path = Path(pt_path).with_name(f"{Path(pt_path).stem}_{name}.onnx")
+    os.replace(exported, onnx_path)  # ultralytics always writes <pt stem>.onnx
+
+    return {
+        'variant': name,
+        'model_path': str(onnx_path),
+        'source_model': str(pt_path),
+        'format': 'onnx',
+        'imgsz': imgsz,
+        'dynamic': dynamic,
+        'end2end': settings['nms'],
+        **settings,
+        'ultralytics_version': version('ultralytics'),
+    }
+
+
+def fold_preprocessing(model_path: str, output_path: Optional[str] = None) -> str:
+    """Prepend letterbox preprocessing to an exported graph
+
+    The new graph input "images" is a uint8 (H, W, 3) RGB image of any size,
+    as returned by decode.decode_image. Resize (bilinear, half-pixel centers as cv2),
+    padding with PAD_VALUE, HWC -> CHW and /255 run as ORT kernels, with the
+    letterbox geometry computed in float64 exactly as preprocess.letterbox
+    does. The letterbox size is stored in the model metadata as
+    "letterbox_size". Writes <stem>_folded.onnx by default.
+    """
+    from onnx import TensorProto, helper, numpy_helper
+
+    model_path = Path(model_path)
+    output_path = Path(output_path or model_path.with_name(f"{model_path.stem}_folded.onnx"))
+    model = onnx.load(str(model_path))
+    graph = model.graph
+    opset = next(op.version for op in model.opset_import if op.domain in ('', 'ai.onnx'))
+
+    original = graph.input[0]
+    imgsz = original.type.tensor_type.shape.dim[2].dim_value
+    if not imgsz:
+        raise ValueError("Folding preprocessing needs a fixed input size")
+
+    def const(name, value, dtype):
+        graph.initializer.append(numpy_helper.from_array(np.asarray(value, dtype=dtype), f"preprocess/{name}"))
+        return f"preprocess/{name}"
+
+    def unsqueeze(inputs, output, axes):
+        if opset >= 13:
+            return helper.make_node('Unsqueeze', [inputs, const(f'{output}_axes', axes, np.int64)], [output])
+        return helper.make_node('Unsqueeze', [inputs], [output], axes=axes)
+
+    size = const('size', [imgsz], np.float64)
+    image = 'images'
+    nodes = [
+        # new_hw = clip(round(hw * min(S / h, S / w)), 1, S), pad = (S - new_hw) // 2
+        helper.make_node('Shape', [image], ['preprocess/shape']),
+        helper.make_node('Slice', ['preprocess/shape', const('hw_start', [0], np.int64),
+                                   const('hw_end', [2], np.int64)], ['preprocess/hw']),
+        helper.make_node('Cast', ['preprocess/hw'], ['preprocess/hw_f'], to=TensorProto.DOUBLE),
+        helper.make_node('Div', [size, 'preprocess/hw_f'], ['preprocess/ratios']),
+        helper.make_node('ReduceMin', ['preprocess/ratios'], ['preprocess/ratio'], keepdims=1)
+        if opset < 18 else
+        helper.make_node('ReduceMin', ['preprocess/ratios', const('reduce_axes', [0], np.int64)],
+                         ['preprocess/ratio'], keepdims=1),
+        helper.make_node('Mul', ['preprocess/hw_f', 'preprocess/ratio'], ['preprocess/scaled']),
+        helper.make_node('Round', ['preprocess/scaled'], ['preprocess/rounded']),
+        helper.make_node('Max', ['preprocess/rounded', const('one', [1.0], np.float64)], ['preprocess/at_least_1']),
+        helper.make_node('Min', ['preprocess/at_least_1', size], ['preprocess/new_hw_f']),
+        helper.make_node('Cast', ['preprocess/new_hw_f'], ['preprocess/new_hw'], to=TensorProto.INT64),
+        helper.make_node('Sub', [const('size_i', [imgsz], np.int64), 'preprocess/new_hw'], ['preprocess/slack']),
+        helper.make_node('Div', ['preprocess/slack', const('two', [2], np.int64)], ['preprocess/pad_lt']),
+        helper.make_node('Sub', ['preprocess/slack', 'preprocess/pad_lt'], ['preprocess/pad_rb']),
+
+        # NHWC uint8 resize, then pad to S x S
+        unsqueeze(image, 'preprocess/nhwc', [0]),
+        helper.make_node('Concat', [const('n', [1], np.int64), 'preprocess/new_hw', const('c', [3], np.int64)],
+                         ['preprocess/sizes'], axis=0),
+        helper.make_node('Resize', ['preprocess/nhwc', const('roi', [], np.float32),
+                                    const('scales', [], np.float32), 'preprocess/sizes'],
+                         ['preprocess/resized'], mode='linear', coordinate_transformation_mode='half_pixel'),
+        helper.make_node('Concat', [const('zero', [0], np.int64), 'preprocess/pad_lt', const('zero_c', [0], np.int64),
+                                    const('zero_n', [0], np.int64), 'preprocess/pad_rb', const('zero_c2', [0], np.int64)],
+                         ['preprocess/pads'], axis=0),
+        helper.make_node('Pad', ['preprocess/resized', 'preprocess/pads', const('pad_value', PAD_VALUE, np.uint8)],
+                         ['preprocess/padded'], mode='constant'),
+
+        # NHWC uint8 -> NCHW float32 / 255
+        helper.make_node('Transpose', ['preprocess/padded'], ['preprocess/nchw'], perm=[0, 3, 1, 2]),
+        helper.make_node('Cast', ['preprocess/nchw'], ['preprocess/float'], to=TensorProto.FLOAT),
+        helper.make_node('Mul', ['preprocess/float', const('scale', 1.0 / 255.0, np.float32)], [original.name + '/folded']),
+    ]
+
+    # Rewire the original input to the preprocessed tensor and swap the graph input
+    for node in graph.node:
+        node.input[:] = [original.name + '/folded' if name == original.name else name for name in node.input]
+    all_nodes = nodes + list(graph.node)
+    del graph.node[:]
+    graph.node.extend(all_nodes)
+    new_input = helper.make_tensor_value_info('images', TensorProto.UINT8, ['height', 'width', 3])
+    graph.input.remove(original)
+    graph.input.insert(0, new_input)
+
+    helper.set_model_props(model, {
+        **{prop.key: prop.value for prop in model.metadata_props},
+        'letterbox_size': str(imgsz),
+    })
+    onnx.checker.check_model(model)
+    onnx.save(model, str(output_path))
+    return str(output_path)
+
+
+def _detections(model_path: str, tensors: List[np.ndarray], conf_threshold: float, nms_threshold: float):
+    session = create_session(model_path)
+    input_name = session.get_inputs()[0].name
+    return [
+        decode_predictions(session.run(None, {input_name: tensor})[0], conf_threshold, nms_threshold)[0]
+        for tensor in tensors
+    ]
+
+
+def detection_agreement(reference, candidate, iou_threshold: float = 0.9) -> float:
+    """Fraction of detections matched between two runs (same class, IoU >= iou_threshold)
+
+    Computed over the union of both detection sets, so missing and extra
+    detections count alike. 1.0 when neither run found anything.
+    """
+    matched = total = 0
+    for (ref_boxes, _, ref_classes), (boxes, _, classes) in zip(reference, candidate):
+        total += max(len(ref_boxes), len(boxes))
+        if len(ref_boxes) and len(boxes):
+            iou = box_iou(ref_boxes, boxes)
+            iou[ref_classes[:, None] != classes[None, :]] = 0
+            matched += int(min((iou.max(axis=1) >= iou_threshold).sum(),
+                               (iou.max(axis=0) >= iou_threshold).sum()))
+    return matched / total if total else 1.0
+
+
+def benchmark_variants(exports: Dict[str, Dict], image_paths: List[Path], imgsz: int,
+                       conf_threshold: float = 0.25, nms_threshold: float = 0.45,
+                       runs: int = 50) -> Dict[str, Dict]:
+    """Latency and detection agreement with the reference export, on the same images"""
+    tensors = [letterbox(load_image(path), imgsz)[0].copy() for path in image_paths]
+    reference = _detections(exports[REFERENCE_VARIANT]['model_path'], tensors, conf_threshold, nms_threshold)
+
+    results = {}
+    for name, export in exports.items():
+        detections = _detections(export['model_path'], tensors, conf_threshold, nms_threshold)
+        results[name] = {
+            **measure_latency(export['model_path'], image_paths, imgsz, runs=runs),
+            'agreement': detection_agreement(reference, detections),
+            'detections': int(sum(len(boxes) for boxes, _, _ in detections)),
+        }
+    return results
+
+
+def select_variant(benchmark: Dict[str, Dict], min_agreement: float = 0.95) -> str:
+    """Fastest variant (by p50) whose detections agree with the reference export"""
+    correct = {name: result for name, result in benchmark.items() if result['agreement'] >= min_agreement}
+    return min(correct, key=lambda name: correct[name]['p50_ms'])
+
+
+def export_best_variant(pt_path: str, imgsz: int = 320, dynamic: bool = False,
+                        image_paths: Optional[List[Path]] = None,
+                        variants: Optional[List[str]] = None,
+                        min_agreement: float = 0.95, model=None, fold: bool = False) -> Dict:
+    """Export all variants of a .pt, benchmark them and return the settings of the selected one
+
+    The returned dict is meant for the "export" entry of model_metadata.json and
+    includes the benchmark of every variant. Without images no benchmark is run
+    and DEFAULT_VARIANT is selected. With fold=True the selected graph gets
+    the preprocessing folded in (see fold_preprocessing) and takes raw uint8
+    images.
+    """
+    from ultralytics import YOLO
+
+    variants = list(variants or EXPORT_VARIANTS)
+    if REFERENCE_VARIANT not in variants:
+        variants.insert(0, REFERENCE_VARIANT)
+
+    model = model or YOLO(str(pt_path))
+    exports = {name: export_variant(model, pt_path, name, imgsz, dynamic) for name in variants}
+
+    if image_paths:
+        benchmark = benchmark_variants(exports, image_paths, imgsz)
+        selected = select_variant(benchmark, min_agreement)
+    else:
+        benchmark = {}
+        selected = DEFAULT_VARIANT if DEFAULT_VARIANT in exports else REFERENCE_VARIANT
+
+    export = dict(exports[selected])
+    export['fold_preprocessing'] = fold
+    if fold:
+        export['model_path'] = fold_preprocessing(export['model_path'])
+
+    return {
+        **export,
+        'benchmark': benchmark,
+        'benchmark_images': len(image_paths or []),
+        'exported_at': time.strftime("%Y%m%d_%H%M%S"),
+    }
+
+
+def conversion_key(weights_sha256: str, imgsz: int, dynamic: bool, variants: List[str],
+                   fold: bool = False) -> str:
+    """Cache key of a conversion: the weights plus every argument that shapes the exported graph"""
+    args = {
+        'weights_sha256': weights_sha256,
+        'imgsz': imgsz,
+        'dynamic': dynamic,
+        'variants': {name: EXPORT_VARIANTS[name] for name in sorted(variants)},
+        'ultralytics_version': version('ultralytics'),
+    }
+    if fold:  # only when set, so keys of existing unfolded conversions stay valid
+        args['fold_preprocessing'] = True
+    return content_hash(json.dumps(args, sort_keys=True).encode('utf-8'))
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive advisory lock shared by all processes on the host"""
+    with open(path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def cached_export(pt_path: str, cache_dir: str, imgsz: int = 320, dynamic: bool = False,
+                  image_paths: Optional[List[Path]] = None,
+                  variants: Optional[List[str]] = None, fold: bool = False) -> Dict:
+    """export_best_variant behind a content-addressed cache
+
+    Entries live in <cache_dir>/<key>/ with key = conversion_key(...). An entry
+    is built in a temporary directory and renamed into place once complete, so
+    readers never see a partial entry, and a per-key file lock makes
+    concurrent workers wait for the one export instead of repeating it.
+
+    Returns {'classes': [...], 'export': {...}} as stored in <key>/entry.json.
+    """
+    pt_path, cache_dir = Path(pt_path), Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    variants = list(variants or EXPORT_VARIANTS)
+    if REFERENCE_VARIANT not in variants:
+        variants.insert(0, REFERENCE_VARIANT)
+    weights_sha256 = file_hash(pt_path)
+    key = conversion_key(weights_sha256, imgsz, dynamic, variants, fold)
+    entry_path = cache_dir / key / 'entry.json'
+
+    if entry_path.exists():
+        return json.loads(entry_path.read_text())
+
+    with _file_lock(cache_dir / f"{key}.lock"):
+        if entry_path.exists():  # another worker finished the export while we waited
+            return json.loads(entry_path.read_text())
+
+        from ultralytics import YOLO
+
+        tmp_dir = cache_dir / f".{key}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+        try:
+            # Export from a private copy: ultralytics writes its output next to the .pt
+            weights = tmp_dir / pt_path.name
+            shutil.copy2(pt_path, weights)
+            model = YOLO(str(weights))
+            export = export_best_variant(weights, imgsz, dynamic, image_paths, variants, model=model, fold=fold)
+
+            # Keep only the selected graph, referenced at its final location
+            selected = Path(export['model_path'])
+            for path in tmp_dir.iterdir():
+                if path != selected:
+                    shutil.rmtree(path) if path.is_dir() else path.unlink()
+            export.update({
+                'model_path': str(cache_dir / key / selected.name),
+                'source_model': str(pt_path),
+                'weights_sha256': weights_sha256,
+                'cache_key': key,
+            })
+            entry = {'classes': list(model.names.values()), 'export': export}
+            (tmp_dir / 'entry.json').write_text(json.dumps(entry, indent=2))
+            os.replace(tmp_dir, cache_dir / key)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    return entry
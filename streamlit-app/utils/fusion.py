@@ -0,0 +1,63 @@
+import numpy as np
+from typing import Optional, Sequence, Tuple
+
+from .postprocess import batched_nms, box_iou
+
+
+def weighted_boxes_fusion(boxes_list: Sequence[np.ndarray], scores_list: Sequence[np.ndarray],
+                          class_ids_list: Sequence[np.ndarray], weights: Optional[Sequence[float]] = None,
+                          iou_threshold: float = 0.55,
+                          skip_box_threshold: float = 0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fuse the detections of several models on the same image (WBF)
+
+    Clusters are formed in one shot instead of box by box: the cluster seeds
+    are the boxes kept by class-aware greedy NMS at iou_threshold, and every
+    box joins the highest scoring seed of its class it overlaps by more than
+    iou_threshold (every suppressed box has one). Each cluster is replaced by
+    the confidence-weighted average of its boxes; its score is the weighted
+    mean score, scaled down when fewer models than the ensemble voted for it.
+
+    Args:
+        boxes_list: per model [N_i, 4] xyxy boxes
+        scores_list: per model [N_i] scores
+        class_ids_list: per model [N_i] class ids
+        weights: per model weight, 1 for every model by default
+        iou_threshold: IoU above which boxes of the same class are fused
+        skip_box_threshold: boxes scoring below this are ignored
+
+    Returns:
+        (boxes [M, 4], scores [M], class_ids [M]) sorted by score
+    """
+    weights = np.ones(len(boxes_list), dtype=np.float32) if weights is None else np.asarray(weights, np.float32)
+    counts = [len(boxes) for boxes in boxes_list]
+    if sum(counts) == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+    boxes = np.concatenate(boxes_list).astype(np.float32)
+    scores = np.concatenate(scores_list).astype(np.float32)
+    class_ids = np.concatenate(class_ids_list).astype(np.int64)
+    box_weights = np.repeat(weights, counts)
+
+    keep = scores >= skip_box_threshold
+    boxes, scores, class_ids, box_weights = boxes[keep], scores[keep], class_ids[keep], box_weights[keep]
+    weighted = scores * box_weights
+
+    # Seeds sorted by weighted score; every box joins the first matching seed
+    seeds = batched_nms(boxes, weighted, class_ids, iou_threshold)
+    matches = box_iou(boxes, boxes[seeds]) > iou_threshold
+    matches &= class_ids[:, None] == class_ids[seeds][None, :]
+    matches[seeds, np.arange(len(seeds))] = True  # degenerate (zero area) seeds still own themselves
+    cluster = matches.argmax(axis=1)
+
+    # Confidence-weighted average of boxes and scores per cluster
+    num_clusters = len(seeds)
+    total = np.bincount(cluster, weights=weighted, minlength=num_clusters)
+    fused_boxes = np.stack([
+        np.bincount(cluster, weights=weighted * boxes[:, i], minlength=num_clusters) for i in range(4)
+    ], axis=1) / total[:, None]
+    cluster_weight = np.bincount(cluster, weights=box_weights, minlength=num_clusters)
+    fused_scores = total / cluster_weight * np.minimum(cluster_weight, weights.sum()) / weights.sum()
+
+    order = np.argsort(-fused_scores, kind='stable')
+    return (fused_boxes[order].astype(np.float32), fused_scores[order].astype(np.float32),
+            class_ids[seeds][order])
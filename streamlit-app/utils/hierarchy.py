@@ -0,0 +1,96 @@
+import numpy as np
+from typing import Dict, List, Sequence
+
+# Classes drawn as boxes around other services rather than as icons
+CONTAINER_CLASSES = ('aws', 'Region', 'Availability Zone', 'Private Subnet', 'Public Subnet', 'Security Group')
+
+
+def containment(inner: np.ndarray, outer: np.ndarray) -> np.ndarray:
+    """Fraction of each inner box's area that lies inside each outer box, [N, M]"""
+    lt = np.maximum(inner[:, None, :2], outer[None, :, :2])
+    rb = np.minimum(inner[:, None, 2:], outer[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    area = (inner[:, 2] - inner[:, 0]) * (inner[:, 3] - inner[:, 1])
+    return wh[..., 0] * wh[..., 1] / (area[:, None] + 1e-9)
+
+
+def find_parents(boxes: np.ndarray, is_container: np.ndarray, min_overlap: float = 0.9) -> np.ndarray:
+    """Index of the smallest container holding each box, -1 for top-level boxes
+
+    Only the [N, C] matrix between all boxes and the C container boxes is
+    computed, in one vectorized step. A box may only be nested in a strictly
+    larger container (ties broken by index), so the result is always a tree.
+    min_overlap tolerates container boxes that cut a child's edge slightly.
+    """
+    parents = np.full(len(boxes), -1, dtype=np.int64)
+    containers = np.flatnonzero(is_container)
+    if len(containers) == 0 or len(boxes) == 0:
+        return parents
+
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    rank = np.empty(len(boxes), dtype=np.int64)
+    rank[np.argsort(areas, kind='stable')] = np.arange(len(boxes))
+
+    candidates = containment(boxes, boxes[containers]) >= min_overlap
+    candidates &= rank[containers][None, :] > rank[:, None]
+
+    # Smallest enclosing container = candidate with the lowest rank
+    container_rank = np.where(candidates, rank[containers][None, :], np.iinfo(np.int64).max)
+    best = container_rank.argmin(axis=1)
+    has_parent = candidates.any(axis=1)
+    parents[has_parent] = containers[best[has_parent]]
+    return parents
+
+
+def node_depths(parents: np.ndarray) -> np.ndarray:
+    """Depth of every node in a parent-pointer tree (roots have depth 0)"""
+    depths = np.zeros(len(parents), dtype=np.int64)
+    current = parents.copy()
+    while np.any(current >= 0):  # one step per tree level, not per node
+        active = current >= 0
+        depths[active] += 1
+        current[active] = parents[current[active]]
+    return depths
+
+
+def build_hierarchy(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, class_names: Sequence[str],
+                    container_classes: Sequence[str] = CONTAINER_CLASSES,
+                    min_overlap: float = 0.9) -> Dict:
+    """Containment tree of a diagram's detections (Region > AZ > Subnet > EC2 ...)
+
+    Returns:
+        dict with 'parents' (parent index per detection, -1 for roots),
+        'depths' and 'tree', a nested list of nodes
+        {'index', 'class', 'score', 'box', 'children'} starting at the roots.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    class_ids = np.asarray(class_ids, dtype=np.int64)
+    container_classes = set(container_classes)
+    container_ids = [i for i, name in enumerate(class_names) if name in container_classes]
+    parents = find_parents(boxes, np.isin(class_ids, container_ids), min_overlap)
+
+    nodes = [
+        {
+            'index': i,
+            'class': class_names[class_id] if class_id < len(class_names) else f'Class_{class_id}',
+            'score': round(float(score), 4),
+            'box': [round(float(v), 1) for v in box],
+            'children': [],
+        }
+        for i, (box, score, class_id) in enumerate(zip(boxes, scores, class_ids))
+    ]
+    tree = []
+    for node, parent in zip(nodes, parents):
+        (nodes[parent]['children'] if parent >= 0 else tree).append(node)
+
+    return {'parents': parents, 'depths': node_depths(parents), 'tree': tree}
+
+
+def format_tree(tree: List[Dict], indent: str = "  ", _depth: int = 0) -> str:
+    """Plain-text outline of a hierarchy tree"""
+    lines = []
+    for node in tree:
+        lines.append(f"{indent * _depth}{node['class']} ({node['score']:.2f})")
+        if node['children']:
+            lines.append(format_tree(node['children'], indent, _depth + 1))
+    return "\n".join(lines)
@@ -0,0 +1,156 @@
+import hashlib
+from typing import Hashable, List
+
+import cv2
+import numpy as np
+
+from .cache import LRUCache
+from .postprocess import batched_nms
+from .tiling import blank_tiles, empty_detections, shift_detections, tile_grid
+
+
+def tile_hashes(image: np.ndarray, tiles: np.ndarray) -> List[bytes]:
+    """128-bit BLAKE2b digest of the pixels of every tile"""
+    return [
+        hashlib.blake2b(np.ascontiguousarray(image[y1:y2, x1:x2]).data, digest_size=16).digest()
+        for x1, y1, x2, y2 in tiles
+    ]
+
+
+def changed_tiles(image: np.ndarray, hashes: List[bytes], record: dict, tiles: np.ndarray,
+                  tolerance: int = 0) -> np.ndarray:
+    """Boolean mask of tiles that differ from the diagram's previous version
+
+    Tiles with equal hashes are unchanged. With tolerance > 0 a tile whose
+    hash differs still counts as unchanged when no pixel moved by more than
+    tolerance from the previous image (e.g. JPEG re-encoding noise).
+    """
+    changed = np.array([new != old for new, old in zip(hashes, record['hashes'])], dtype=bool)
+    if tolerance > 0:
+        for i in np.flatnonzero(changed):
+            x1, y1, x2, y2 = tiles[i]
+            changed[i] = cv2.absdiff(image[y1:y2, x1:x2], record['image'][y1:y2, x1:x2]).max() > tolerance
+    return changed
+
+
+class IncrementalDetector:
+    """Tiled detection that re-runs the model only on the tiles of a diagram that changed
+
+    A record per diagram id (tile hashes, per-tile detections, and the
+    last image when tolerance > 0) is kept in an LRU cache. When a new
+    version of the diagram arrives, tiles whose pixels are unchanged reuse
+    their cached detections and only the changed tiles are inferred, so the
+    cost of a revision follows the size of the edit rather than the canvas.
+    Tiles overlap, so an edit invalidates every tile that covers it and
+    objects on a seam are re-detected from both sides.
+
+    With full_image=True a downscaled pass over the whole image is merged in,
+    as in ObjectDetector.detect_tiled, so objects larger than a tile are kept
+    and the result is a superset of a plain whole-image inference. It is
+    recorded with the tiles and re-run only when any tile changed.
+
+    Records are only reused for the same image size, tile grid and
+    thresholds; anything else re-detects the whole diagram.
+
+    detect() runs the tiles through detector.detect_batch. Callers with their
+    own batching (the backend micro-batcher) use plan() / crops() / merge().
+    """
+
+    def __init__(self, detector=None, tile_size: int = 640, overlap: float = 0.2, tolerance: int = 0,
+                 max_diagrams: int = 32, full_image: bool = True):
+        self.detector = detector
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.tolerance = tolerance
+        self.full_image = full_image
+        self.records = LRUCache(max_diagrams)
+
+    def plan(self, diagram_id: Hashable, image: np.ndarray, conf_threshold: float = 0.5,
+             nms_threshold: float = 0.45) -> dict:
+        """Split the image into tiles and find the ones that need inference
+
+        Returns a plan dict; plan['pending'] holds the indices of the tiles
+        to infer, every other entry of plan['detections'] is already filled.
+        plan['full_pending'] is set when the whole-image pass must be re-run;
+        otherwise plan['full'] holds its recorded detections (None without one).
+        """
+        tiles = tile_grid(image.shape, self.tile_size, self.overlap)
+        hashes = tile_hashes(image, tiles)
+        settings = (image.shape, self.tile_size, self.overlap, conf_threshold, nms_threshold)
+        detections = [None] * len(tiles)
+
+        record = self.records.get(diagram_id)
+        if record is not None and record['settings'] == settings:
+            changed = changed_tiles(image, hashes, record, tiles, self.tolerance)
+            for i in np.flatnonzero(~changed):
+                detections[i] = record['detections'][i]
+            full = record['full']
+        else:
+            changed = np.ones(len(tiles), dtype=bool)
+            full = None
+        # A single tile already is the whole image
+        full_pending = self.full_image and len(tiles) > 1 and (full is None or bool(changed.any()))
+
+        pending = np.flatnonzero(changed)
+        blank = blank_tiles(image, tiles[pending])
+        for i in pending[blank]:
+            detections[i] = empty_detections()
+
+        return {
+            'diagram_id': diagram_id,
+            'image': image,
+            'tiles': tiles,
+            'hashes': hashes,
+            'settings': settings,
+            'detections': detections,
+            'pending': pending[~blank],
+            'full': None if full_pending else full,
+            'full_pending': full_pending,
+        }
+
+    def crops(self, plan: dict) -> List[np.ndarray]:
+        """Image crops of the pending tiles, in plan['pending'] order, then the whole image if full_pending"""
+        image = plan['image']
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in plan['tiles'][plan['pending']]]
+        if plan['full_pending']:
+            crops.append(image)
+        return crops
+
+    def merge(self, plan: dict, results: List[dict]) -> dict:
+        """Fill in the pending tiles' detections, update the record and merge all tiles
+
+        results holds one entry per crop of crops(plan). Returns the detections
+        in image coordinates, plus tiles_total and tiles_inferred (tiles only,
+        the whole-image pass is not counted).
+        """
+        results = [{key: result[key] for key in ('boxes', 'scores', 'class_ids')} for result in results]
+        detections = list(plan['detections'])
+        for i, result in zip(plan['pending'], results):
+            detections[i] = result
+        full = results[-1] if plan['full_pending'] else plan['full']
+
+        self.records.put(plan['diagram_id'], {
+            'settings': plan['settings'],
+            'hashes': plan['hashes'],
+            'detections': detections,
+            'full': full,
+            'image': plan['image'].copy() if self.tolerance > 0 else None,
+        })
+
+        tiles = plan['tiles']
+        if full is not None:
+            detections = detections + [full]
+            tiles = np.concatenate([tiles, np.zeros((1, 4), dtype=tiles.dtype)])
+        merged = shift_detections(detections, tiles)
+        if len(tiles) > 1:
+            keep = batched_nms(merged['boxes'], merged['scores'], merged['class_ids'], plan['settings'][-1])
+            merged = {key: value[keep] for key, value in merged.items()}
+        return {**merged, 'tiles_total': len(plan['tiles']), 'tiles_inferred': len(plan['pending'])}
+
+    def detect(self, diagram_id: Hashable, image: np.ndarray, conf_threshold: float = 0.5,
+               nms_threshold: float = 0.45) -> dict:
+        """Detect on a new version of a diagram, inferring only its changed tiles"""
+        plan = self.plan(diagram_id, image, conf_threshold, nms_threshold)
+        crops = self.crops(plan)
+        results = self.detector.detect_batch(crops, conf_threshold, nms_threshold) if crops else []
+        return self.merge(plan, results)
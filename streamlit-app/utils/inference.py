@@ -1,21 +1,51 @@
+import json
 import cv2
 import numpy as np
-import torch
-from ultralytics import YOLO
-import onnxruntime as ort
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from tensorflow.keras.models import load_model
+from typing import List, Optional, Sequence, Union
+
+from .crop import content_regions
+from .fusion import weighted_boxes_fusion
+from .postprocess import batched_nms, decode_predictions, scale_boxes
+from .preprocess import get_input_buffer, letterbox, raw_image_input
+from .session import (BoundRunner, SessionPool, _available_cores, exported_input_size, folded_input_size,
+                      takes_raw_images)
+from .tiling import blank_tiles, shift_detections, tile_grid
 
 
 class ObjectDetector:
-    def __init__(self, model_path: str):
-        self.model_path = Path(model_path)
+    def __init__(self, model_path: Union[str, Sequence[str]], imgsz: int = 640, runtime: dict = None,
+                 ensemble_weights: Sequence[float] = None, fusion_iou: float = 0.55):
+        """A list of ONNX model paths runs the models as a weighted box fusion ensemble
+
+        runtime={'io_binding': True} runs the ONNX sessions through
+        session.BoundRunner: inputs and outputs stay bound to reused buffers
+        and postprocessing reads the outputs in place.
+        """
+        self.model_paths = [Path(p) for p in model_path] if isinstance(model_path, (list, tuple)) else [Path(model_path)]
+        self.model_path = self.model_paths[0]
+        self.runtime = runtime or {}
+        self.ensemble_weights = ensemble_weights
+        self.fusion_iou = fusion_iou
         self.model_type = self._detect_model_type()
         self.model = self._load_model()
+        # Graphs exported with folded preprocessing take the uint8 image as is
+        self.raw_input = self.model_type == 'onnx' and takes_raw_images(self.model)
+        self.imgsz = self._input_size(imgsz)
+        self.max_batch = self._max_batch()
+        self._runners = self._bound_runners()
+        self._ensemble_pool = None
+        if self.model_type == 'ensemble':
+            self._ensemble_pool = ThreadPoolExecutor(max_workers=len(self.model), thread_name_prefix='ensemble')
     
 
     def _detect_model_type(self):
         """Detect model type based on file extension"""
+        if len(self.model_paths) > 1:
+            if any(path.suffix != '.onnx' for path in self.model_paths):
+                raise ValueError("Ensembles are supported for ONNX models only")
+            return 'ensemble'
         if self.model_path.suffix == '.pt':
             return 'pytorch'
         elif self.model_path.suffix == '.onnx':
@@ -27,15 +57,100 @@ class ObjectDetector:
     
 
     def _load_model(self):
-        """load model based on model type"""
+        """load model based on model type
+
+        torch / ultralytics and tensorflow are imported here, on first use, so
+        the ONNX path only ever imports onnxruntime, numpy and cv2.
+        """
         if self.model_type == 'pytorch':
+            from ultralytics import YOLO
             return YOLO(str(self.model_path))
         elif self.model_type == 'onnx':
-            return ort.InferenceSession(str(self.model_path))
+            return SessionPool(str(self.model_path), **self.runtime)
+        elif self.model_type == 'ensemble':
+            # The models run concurrently, so each gets its share of the cores
+            runtime = dict(self.runtime)
+            if not runtime.get('intra_op_num_threads'):
+                runtime['intra_op_num_threads'] = max(1, _available_cores() // len(self.model_paths))
+            sessions = [SessionPool(str(path), **runtime) for path in self.model_paths]
+            if any(takes_raw_images(session) for session in sessions):
+                raise ValueError("Ensembles share one letterboxed batch; use exports without folded preprocessing")
+            return sessions
         elif self.model_type == 'keras':
+            from tensorflow.keras.models import load_model
             return load_model(str(self.model_path))
         else:
             raise ValueError(f"Unsupported model type: {self.model_type}")
+
+    def _bound_runners(self) -> dict:
+        """IOBinding runners per ONNX session when runtime io_binding is set
+
+        Folded-preprocessing graphs are fed the caller's image directly, whose
+        buffer changes on every call, so they keep plain session.run.
+        """
+        if not self.runtime.get('io_binding') or self.raw_input:
+            return {}
+        if self.model_type == 'onnx':
+            return {id(self.model): BoundRunner(self.model)}
+        if self.model_type == 'ensemble':
+            return {id(session): BoundRunner(session) for session in self.model}
+        return {}
+
+    def _run(self, session, input_tensor: np.ndarray) -> np.ndarray:
+        """First model output; with IOBinding a view of a reused buffer, valid until the next run"""
+        runner = self._runners.get(id(session))
+        if runner is not None:
+            return runner.run(input_tensor)[0]
+        return session.run(None, {session.get_inputs()[0].name: input_tensor})[0]
+
+    def _input_size(self, default: int = 640) -> int:
+        """Square model input size
+
+        Read from the ONNX input shape when it is static. Exports with dynamic
+        height/width use the size they were exported at: the ultralytics
+        'imgsz' model metadata, else the imgsz of a model_metadata.json next
+        to the model that describes it, else default.
+        """
+        if self.model_type == 'ensemble':
+            sizes = {session.get_inputs()[0].shape[2] for session in self.model}
+            static = {size for size in sizes if isinstance(size, int)}
+            if not static:
+                static = {exported_input_size(session) for session in self.model} - {None}
+            if len(static) > 1:
+                raise ValueError(f"Ensemble models have different input sizes: {sorted(static)}")
+            return static.pop() if static else default
+        if self.raw_input:
+            return folded_input_size(self.model)
+        if self.model_type == 'onnx':
+            height = self.model.get_inputs()[0].shape[2]
+            if isinstance(height, int):
+                return height
+            return exported_input_size(self.model) or self._metadata_input_size() or default
+        return default
+
+    def _metadata_input_size(self) -> Optional[int]:
+        """imgsz of the model_metadata.json in the model's directory, if it describes this model"""
+        metadata_path = self.model_path.parent / 'model_metadata.json'
+        if not metadata_path.exists():
+            return None
+        metadata = json.loads(metadata_path.read_text())
+        if Path(metadata.get('model_path', '')).name != self.model_path.name:
+            return None
+        return metadata.get('imgsz')
+
+    def _max_batch(self):
+        """Fixed ONNX batch size, or None when the batch axis is dynamic"""
+        if self.model_type == 'ensemble':
+            batches = [session.get_inputs()[0].shape[0] for session in self.model]
+            fixed = [batch for batch in batches if isinstance(batch, int)]
+            return min(fixed) if fixed else None
+        if self.raw_input:
+            return 1  # one (H, W, 3) image per run
+        if self.model_type == 'onnx':
+            batch = self.model.get_inputs()[0].shape[0]
+            if isinstance(batch, int):
+                return batch
+        return None
         
     
     def detect(self, image: np.ndarray, conf_threshold: float = 0.5,
@@ -45,9 +160,87 @@ class ObjectDetector:
             return self._detect_pytorch(image, conf_threshold, nms_threshold)
         elif self.model_type == 'onnx':
             return self._detect_onnx(image, conf_threshold, nms_threshold)
+        elif self.model_type == 'ensemble':
+            return self._detect_ensemble_batch([image], conf_threshold, nms_threshold, 1)[0]
         elif self.model_type == 'keras':
             return self._detect_keras(image, conf_threshold, nms_threshold)
 
+    def detect_batch(self, images: List[np.ndarray], conf_threshold: float = 0.5,
+                     nms_threshold: float = 0.45, batch_size: int = 16) -> List[dict]:
+        """Run object detection on a list of images, one result dict per image
+
+        ONNX models are fed stacked (B, 3, S, S) tensors; the batch is capped by
+        the model's fixed batch axis when it was exported without dynamic=True.
+        """
+        if self.raw_input:
+            return [self._detect_onnx(image, conf_threshold, nms_threshold) for image in images]
+        if self.model_type in ('onnx', 'ensemble'):
+            if self.max_batch is not None:
+                batch_size = self.max_batch
+            detect_chunk = self._detect_onnx_batch if self.model_type == 'onnx' else self._detect_ensemble_batch
+            detections = []
+            for start in range(0, len(images), batch_size):
+                detections.extend(detect_chunk(
+                    images[start:start + batch_size], conf_threshold, nms_threshold, batch_size
+                ))
+            return detections
+        return [self.detect(image, conf_threshold, nms_threshold) for image in images]
+
+    def detect_tiled(self, image: np.ndarray, conf_threshold: float = 0.5,
+                     nms_threshold: float = 0.45, tile_size: int = None,
+                     overlap: float = 0.2, batch_size: int = 8, workers: Optional[int] = None,
+                     full_image: bool = True) -> dict:
+        """Sliced inference for large diagrams
+
+        The image is cut into overlapping tiles (model input size by default),
+        blank tiles are skipped, the rest run in batches on a thread pool and
+        duplicates across tile seams are merged with a global class-aware NMS.
+        With full_image=True a downscaled pass over the whole image is merged
+        in as well, so large containers spanning several tiles are kept.
+
+        workers defaults to the ONNX session pool size: each batch holds a
+        session for its whole run, so threads beyond the pool only wait.
+        Raise runtime pool_size to run more tile batches concurrently.
+        """
+        tile_size = tile_size or self.imgsz
+        if workers is None:
+            workers = self.model.size if isinstance(self.model, SessionPool) else 1
+        tiles = tile_grid(image.shape, tile_size, overlap)
+        tiles = tiles[~blank_tiles(image, tiles)]
+
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        batches = [crops[i:i + batch_size] for i in range(0, len(crops), batch_size)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda batch: self.detect_batch(batch, conf_threshold, nms_threshold, batch_size), batches)
+            detections = [det for batch in results for det in batch]
+
+        if full_image and len(tiles) > 1:
+            detections.append(self.detect(image, conf_threshold, nms_threshold))
+            tiles = np.concatenate([tiles, np.zeros((1, 4), dtype=tiles.dtype)])
+
+        merged = shift_detections(detections, tiles)
+        keep = batched_nms(merged['boxes'], merged['scores'], merged['class_ids'], nms_threshold)
+        return {key: value[keep] for key, value in merged.items()}
+
+    def detect_content(self, image: np.ndarray, conf_threshold: float = 0.5,
+                       nms_threshold: float = 0.45, min_gap: int = 64, max_regions: int = 8) -> dict:
+        """Detect only on the non-empty regions of a mostly blank diagram
+
+        Regions come from thresholded row/column projections (crop.content_regions),
+        grown to at least the model input size so no crop is upscaled. Each
+        region is letterboxed on its own, so icons are seen at a higher
+        effective resolution than in a pass over the whole canvas; boxes are
+        shifted back and merged with class-aware NMS. A blank image runs no
+        inference at all.
+        """
+        regions = content_regions(image, min_gap=min_gap, min_size=self.imgsz, max_regions=max_regions)
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+        merged = shift_detections(self.detect_batch(crops, conf_threshold, nms_threshold), regions)
+        if len(regions) < 2:
+            return merged
+        keep = batched_nms(merged['boxes'], merged['scores'], merged['class_ids'], nms_threshold)
+        return {key: value[keep] for key, value in merged.items()}
+
     
     def _detect_pytorch(self, image: np.ndarray, conf_threshold: float,
                         nms_threshold: float) -> dict:
@@ -76,9 +269,51 @@ class ObjectDetector:
     def _detect_onnx(self, image: np.ndarray, conf_threshold: float,
                      nms_threshold: float) -> dict:
         """ONNX model detection"""
-        input_tensor = self._preprocess_onnx(image)
-        outputs = self.model.run(None, {self.model.get_inputs()[0].name: input_tensor})
-        return self._postprocess_onnx(outputs[0], conf_threshold, nms_threshold)
+        input_tensor, ratio_pad = self._preprocess_onnx(image)
+        outputs = self._run(self.model, input_tensor)
+        return self._postprocess_onnx(outputs, conf_threshold, nms_threshold, image.shape[:2], ratio_pad)
+
+    def _detect_onnx_batch(self, images: List[np.ndarray], conf_threshold: float,
+                           nms_threshold: float, batch_size: int) -> List[dict]:
+        """ONNX detection of up to batch_size images in a single session.run"""
+        input_tensor = get_input_buffer(self.imgsz, batch_size)[:len(images)]
+        ratio_pads = [letterbox(image, self.imgsz, out=slot)[1] for image, slot in zip(images, input_tensor)]
+
+        outputs = self._run(self.model, input_tensor)
+        results = decode_predictions(outputs, conf_threshold, nms_threshold)
+
+        detections = []
+        for image, ratio_pad, (boxes, scores, class_ids) in zip(images, ratio_pads, results):
+            detections.append({
+                'boxes': scale_boxes(boxes, image.shape[:2], (self.imgsz, self.imgsz), ratio_pad),
+                'scores': scores,
+                'class_ids': class_ids
+            })
+        return detections
+
+    def _detect_ensemble_batch(self, images: List[np.ndarray], conf_threshold: float,
+                               nms_threshold: float, batch_size: int) -> List[dict]:
+        """Ensemble detection: one shared letterboxed batch, every model runs once, boxes fused with WBF"""
+        input_tensor = get_input_buffer(self.imgsz, batch_size)[:len(images)]
+        ratio_pads = [letterbox(image, self.imgsz, out=slot)[1] for image, slot in zip(images, input_tensor)]
+
+        def run(session):
+            return decode_predictions(self._run(session, input_tensor), conf_threshold, nms_threshold)
+
+        per_model = list(self._ensemble_pool.map(run, self.model))
+
+        detections = []
+        for i, (image, ratio_pad) in enumerate(zip(images, ratio_pads)):
+            boxes, scores, class_ids = weighted_boxes_fusion(
+                *zip(*(results[i] for results in per_model)),
+                weights=self.ensemble_weights, iou_threshold=self.fusion_iou,
+            )
+            detections.append({
+                'boxes': scale_boxes(boxes, image.shape[:2], (self.imgsz, self.imgsz), ratio_pad),
+                'scores': scores,
+                'class_ids': class_ids
+            })
+        return detections
 
     def _detect_keras(self, image: np.ndarray, conf_threshold: float,
                       nms_threshold: float) -> dict:
@@ -100,22 +335,20 @@ class ObjectDetector:
 
         return detections
 
-    def _preprocess_onnx(self, image: np.ndarray) -> np.ndarray:
-        """Preprocess image for ONNX model"""
-        img = cv2.resize(image, (640, 640))
-        img = img.astype(np.float32) / 255.0
-        img = np.transpose(img, (2, 0, 1))  # HWC → CHW
-        img = np.expand_dims(img, axis=0)  # Add batch dim
-        return img
+    def _preprocess_onnx(self, image: np.ndarray) -> tuple:
+        """Letterbox image into the cached ONNX input buffer, returns (tensor, ratio_pad)"""
+        if self.raw_input:
+            return raw_image_input(image, self.imgsz)
+        return letterbox(image, self.imgsz)
 
     def _postprocess_onnx(self, outputs: np.ndarray, conf_threshold: float,
-                          nms_threshold: float) -> dict:
-        """Post-process ONNX outputs"""
-        detections = {
-            'boxes': [],
-            'scores': [],
-            'class_ids': []
-        }
+                          nms_threshold: float, img_shape: tuple, ratio_pad: tuple = None) -> dict:
+        """Post-process raw YOLOv8 ONNX outputs [1, 4 + nc, anchors]"""
+        boxes, scores, class_ids = decode_predictions(outputs, conf_threshold, nms_threshold)[0]
+        boxes = scale_boxes(boxes, img_shape, (self.imgsz, self.imgsz), ratio_pad)
 
-        # → 여기도 모델별로 커스터마이징 필요
-        return detections
\ No newline at end of file
+        return {
+            'boxes': boxes,
+            'scores': scores,
+            'class_ids': class_ids
+        }
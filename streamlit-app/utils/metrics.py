@@ -0,0 +1,77 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import Counter, Histogram, start_http_server
+
+STAGES = ('decode', 'preprocess', 'inference', 'postprocess', 'render', 'serialize')
+
+STAGE_SECONDS = Histogram(
+    'detection_stage_seconds',
+    'Latency of each detection pipeline stage',
+    ['stage'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+IMAGES_TOTAL = Counter('detection_images_total', 'Images run through the detector')
+IMAGE_MEGAPIXELS = Histogram(
+    'detection_image_megapixels',
+    'Size of the images fed to the detector, after decoding',
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33),
+)
+DETECTIONS_PER_IMAGE = Histogram(
+    'detection_objects_per_image',
+    'Number of detections kept per image',
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 300),
+)
+DETECTIONS_TOTAL = Counter('detection_objects_total', 'Detections returned over all images')
+CACHE_HITS_TOTAL = Counter('detection_output_cache_hits_total', 'Inferences skipped thanks to the output cache')
+
+for _stage in STAGES:
+    STAGE_SECONDS.labels(_stage)  # export every stage from the start, even before its first sample
+
+
+@contextmanager
+def timed(stage: str, durations: Optional[Dict[str, float]] = None):
+    """Observe the duration of a block in detection_stage_seconds{stage=...}
+
+    When a dict is given the duration (seconds) is also added to durations[stage],
+    so callers can show the same breakdown that is exported.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        if durations is not None:
+            durations[stage] = durations.get(stage, 0.0) + elapsed
+
+
+def observe_image(shape: Tuple[int, ...], num_detections: int):
+    """Count one processed image with its size and number of detections"""
+    IMAGES_TOTAL.inc()
+    IMAGE_MEGAPIXELS.observe(shape[0] * shape[1] / 1e6)
+    DETECTIONS_PER_IMAGE.observe(num_detections)
+    DETECTIONS_TOTAL.inc(num_detections)
+
+
+_server_lock = threading.Lock()
+_server_port: Optional[int] = None
+
+
+def start_metrics_server(port: int = 9108, addr: str = '0.0.0.0') -> bool:
+    """Serve /metrics on its own port once per process (Streamlit can't add routes)
+
+    Returns False when the port is taken, e.g. by another app process on the host.
+    """
+    global _server_port
+    with _server_lock:
+        if _server_port is not None:
+            return True
+        try:
+            start_http_server(port, addr)
+        except OSError:
+            return False
+        _server_port = port
+        return True
@@ -0,0 +1,214 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+MAX_NMS = 3000  # maximum number of candidate boxes fed into NMS per image
+MAX_DET = 300   # maximum number of detections kept per image
+CLUSTER_NMS_MAX = 512  # larger NMS groups run through cv2.dnn.NMSBoxes instead of the IoU matrix
+
+
+def xywh2xyxy(boxes: np.ndarray) -> np.ndarray:
+    """Convert [cx, cy, w, h] boxes to [x1, y1, x2, y2]"""
+    out = np.empty_like(boxes)
+    half_wh = boxes[..., 2:4] / 2
+    out[..., 0:2] = boxes[..., 0:2] - half_wh
+    out[..., 2:4] = boxes[..., 0:2] + half_wh
+    return out
+
+
+def box_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """Pairwise IoU matrix [N, M] between two sets of xyxy boxes"""
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+
+    return inter / (area1[:, None] + area2[None, :] - inter + 1e-9)
+
+
+def _opencv_nms(boxes: np.ndarray, order: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy NMS in OpenCV's C++ loop (cv2.dnn.NMSBoxes), for sets too large for the IoU matrix
+
+    NMSBoxes is given each box's rank in `order` as its score (it only keeps
+    scores above a threshold >= 0), so boxes are visited in exactly that
+    order and a box is kept when its IoU with every kept box is
+    <= iou_threshold: the same greedy result as the matrix path.
+    """
+    import cv2
+
+    xywh = np.empty((len(boxes), 4), dtype=np.float64)
+    xywh[:, :2] = boxes[:, :2]
+    xywh[:, 2:] = boxes[:, 2:] - boxes[:, :2]
+    rank = np.empty(len(order), dtype=np.float32)
+    rank[order] = np.arange(len(order), 0, -1)
+    keep = cv2.dnn.NMSBoxes(xywh, rank, 0.0, iou_threshold)
+    return np.asarray(keep, dtype=np.int64).reshape(-1)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy NMS over xyxy boxes, returns kept indices sorted by score
+
+    Small sets use the matrix formulation of greedy NMS (Cluster-NMS): the
+    upper triangular IoU matrix is reduced repeatedly against the current keep
+    mask until it stops changing, which yields exactly the greedy result
+    without iterating over boxes in Python. Past CLUSTER_NMS_MAX boxes the
+    N x N matrix and the number of reductions grow too large, and the same
+    greedy NMS runs in OpenCV instead.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    order = np.argsort(-scores, kind='stable')
+    if len(order) > CLUSTER_NMS_MAX:
+        return _opencv_nms(boxes, order, iou_threshold)
+
+    sorted_boxes = boxes[order]
+    iou = np.triu(box_iou(sorted_boxes, sorted_boxes), k=1)
+
+    keep = np.ones(len(order), dtype=bool)
+    for _ in range(len(order)):
+        new_keep = iou[keep].max(axis=0) <= iou_threshold
+        if np.array_equal(new_keep, keep):
+            break
+        keep = new_keep
+
+    return order[keep]
+
+
+def batched_nms(boxes: np.ndarray, scores: np.ndarray, groups: np.ndarray,
+                iou_threshold: float) -> np.ndarray:
+    """Class-aware NMS: boxes only suppress boxes that share the same group id
+
+    Candidates are sorted into contiguous group blocks and each block runs
+    through nms on its own, so the IoU matrix is only as large as the biggest
+    group instead of the whole candidate set. Returns kept indices sorted by
+    score, like nms.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    order = np.lexsort((-scores, groups))  # by group, then by descending score
+    bounds = np.flatnonzero(np.diff(groups[order])) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(order)]))
+
+    single = ends - starts == 1  # a box alone in its group is always kept
+    keep = [order[starts[single]]]
+    for start, end in zip(starts[~single], ends[~single]):
+        block = order[start:end]
+        keep.append(block[nms(boxes[block], scores[block], iou_threshold)])
+
+    keep = np.sort(np.concatenate(keep))
+    return keep[np.argsort(-scores[keep], kind='stable')]
+
+
+def scale_boxes(boxes: np.ndarray, img_shape: Tuple[int, int], input_shape: Tuple[int, int],
+                ratio_pad: Optional[Tuple] = None) -> np.ndarray:
+    """Map xyxy boxes from model input coordinates back to the original image (in place)
+
+    Args:
+        boxes: [N, 4] xyxy boxes in model input coordinates
+        img_shape: original image (height, width)
+        input_shape: model input (height, width)
+        ratio_pad: ((ratio_x, ratio_y), (pad_x, pad_y)) used during preprocessing.
+            Defaults to a plain stretch resize with no padding.
+    """
+    if ratio_pad is None:
+        ratio = (input_shape[1] / img_shape[1], input_shape[0] / img_shape[0])
+        pad = (0.0, 0.0)
+    else:
+        ratio, pad = ratio_pad
+
+    xs, ys = boxes[:, 0::2], boxes[:, 1::2]  # views, updated in place
+    xs -= pad[0]
+    ys -= pad[1]
+    xs /= ratio[0]
+    ys /= ratio[1]
+    np.clip(xs, 0, img_shape[1], out=xs)
+    np.clip(ys, 0, img_shape[0], out=ys)
+    return boxes
+
+
+def is_end2end(outputs: np.ndarray) -> bool:
+    """True for outputs of a graph exported with NMS inside ([B, max_det, 6] rows)"""
+    return outputs.ndim == 3 and outputs.shape[-1] == 6
+
+
+def _raw_candidates(outputs: np.ndarray, conf_threshold: float, max_nms: int):
+    """Confident anchors of raw YOLOv8 output [B, 4 + nc, A] as flat candidate arrays"""
+    batch_size = outputs.shape[0]
+
+    # Per-anchor best class, reduced along the class axis of the raw layout
+    class_scores = outputs[:, 4:, :]
+    best_class = class_scores.argmax(axis=1)                                          # [B, A]
+    best_score = np.take_along_axis(class_scores, best_class[:, None, :], axis=1)[:, 0]  # [B, A]
+
+    batch_idx, anchor_idx = np.nonzero(best_score > conf_threshold)
+    scores = best_score[batch_idx, anchor_idx]
+    class_ids = best_class[batch_idx, anchor_idx]
+
+    # Cap the candidates of every image at max_nms (its top scores) so dense diagrams stay bounded
+    counts = np.bincount(batch_idx, minlength=batch_size)
+    if counts.max(initial=0) > max_nms:
+        order = np.lexsort((-scores, batch_idx))
+        rank = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+        top = order[rank < max_nms]
+        batch_idx, anchor_idx = batch_idx[top], anchor_idx[top]
+        scores, class_ids = scores[top], class_ids[top]
+
+    boxes = xywh2xyxy(outputs[batch_idx, :4, anchor_idx].astype(np.float32))
+    return batch_idx, boxes, scores, class_ids
+
+
+def _end2end_candidates(outputs: np.ndarray, conf_threshold: float):
+    """Confident rows of in-graph NMS output [B, max_det, 6] (x1, y1, x2, y2, score, class)"""
+    batch_idx, row_idx = np.nonzero(outputs[..., 4] > conf_threshold)
+    rows = outputs[batch_idx, row_idx]
+    return batch_idx, rows[:, :4].astype(np.float32), rows[:, 4], rows[:, 5].astype(np.int64)
+
+
+def decode_predictions(outputs: np.ndarray, conf_threshold: float = 0.25,
+                       nms_threshold: float = 0.45, max_det: int = MAX_DET,
+                       max_nms: int = MAX_NMS) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Decode YOLOv8 output into per-image detections
+
+    Accepts the raw head output [B, 4 + nc, A] as well as the output of a graph
+    exported with NMS inside [B, max_det, 6]. For the latter, NMS is applied
+    again so nms_threshold can still tighten (but not loosen) the in-graph NMS.
+
+    Every image keeps at most max_nms candidates. NMS groups are (image, class)
+    pairs, and batched_nms suppresses within each group separately, so boxes
+    never suppress across images or classes.
+
+    Returns:
+        List of (boxes [N, 4] xyxy in model input coordinates, scores [N], class_ids [N])
+    """
+    if outputs.ndim == 2:
+        outputs = outputs[None]
+    batch_size = outputs.shape[0]
+
+    if is_end2end(outputs):
+        batch_idx, boxes, scores, class_ids = _end2end_candidates(outputs, conf_threshold)
+    else:
+        batch_idx, boxes, scores, class_ids = _raw_candidates(outputs, conf_threshold, max_nms)
+
+    num_classes = int(class_ids.max()) + 1 if len(class_ids) else 1
+    keep = batched_nms(boxes, scores, batch_idx * num_classes + class_ids, nms_threshold)
+    batch_idx, boxes, scores, class_ids = batch_idx[keep], boxes[keep], scores[keep], class_ids[keep]
+
+    # Sort by image then score, and keep the top max_det detections of every image
+    order = np.lexsort((-scores, batch_idx))
+    batch_idx, boxes, scores, class_ids = batch_idx[order], boxes[order], scores[order], class_ids[order]
+    starts = np.searchsorted(batch_idx, np.arange(batch_size + 1))
+    rank = np.arange(len(batch_idx)) - starts[batch_idx]
+    within = rank < max_det
+    counts = np.bincount(batch_idx[within], minlength=batch_size)
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    boxes, scores, class_ids = boxes[within], scores[within], class_ids[within]
+
+    return [
+        (boxes[bounds[i]:bounds[i + 1]], scores[bounds[i]:bounds[i + 1]], class_ids[bounds[i]:bounds[i + 1]])
+        for i in range(batch_size)
+    ]
@@ -0,0 +1,263 @@
+import itertools
+import multiprocessing as mp
+import os
+import signal
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .postprocess import decode_predictions, scale_boxes
+from .preprocess import letterbox
+from .session import DEFAULT_RUNTIME_CONFIG, _available_cores, create_session
+
+# Values of a worker's slot in the shared `current` array besides the id of the request it runs
+STARTING, IDLE = -2, -1
+
+
+def cpu_slices(workers: int, cpus: Optional[Sequence[int]] = None) -> List[List[int]]:
+    """Split the CPUs this process may run on into `workers` disjoint contiguous slices
+
+    With more workers than CPUs every worker gets one CPU and CPUs are
+    shared round-robin.
+    """
+    if cpus is None:
+        cpus = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else range(_available_cores())
+    cpus = sorted(cpus)
+    if workers >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    return [list(map(int, part)) for part in np.array_split(cpus, workers)]
+
+
+def prepare_session(model_path: str, imgsz: int, runtime: Optional[Dict] = None):
+    """Load and warm the model once in the parent, ready to be inherited by forked workers
+
+    The session is single-threaded: ORT only starts intra-op threads for
+    intra_op_num_threads > 1, and threads don't survive fork, so a session
+    without them keeps working in the children. Warming it first means the
+    graph is optimized, weights are prepacked and the arena is sized before
+    the fork, and the workers share all of it copy-on-write.
+    """
+    runtime = {**DEFAULT_RUNTIME_CONFIG, **(runtime or {})}
+    session = create_session(model_path, **{**runtime, 'intra_op_num_threads': 1, 'inter_op_num_threads': 1})
+    session.run(None, {session.get_inputs()[0].name: np.zeros((1, 3, imgsz, imgsz), dtype=np.float32)})
+    return session
+
+
+def _worker_main(cpus: List[int], session, imgsz: int, tasks: mp.Queue, results: mp.SimpleQueue,
+                 current, index: int):
+    """Worker process: pin to its CPU slice, then run the inherited session on tasks until None
+
+    Only the affinity and the OpenCV thread count change here; the session is
+    the one built and warmed in the parent, shared copy-on-write. It is
+    single-threaded (threads don't survive fork), so a slice wider than one
+    CPU only gives OpenCV more threads: run one worker per core for
+    throughput. current[index] tells the supervisor which request it holds.
+    """
+    import cv2
+
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    cv2.setNumThreads(len(cpus))
+    input_name = session.get_inputs()[0].name
+    current[index] = IDLE
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        request_id, image, conf_threshold, nms_threshold = task
+        current[index] = request_id  # kept until the next task; its result is already in the pipe by then
+        try:
+            tensor, ratio_pad = letterbox(image, imgsz)
+            outputs = session.run(None, {input_name: tensor})[0]
+            boxes, scores, class_ids = decode_predictions(outputs, conf_threshold, nms_threshold)[0]
+            boxes = scale_boxes(boxes, image.shape[:2], (imgsz, imgsz), ratio_pad)
+            results.put((request_id, {'boxes': boxes, 'scores': scores, 'class_ids': class_ids}, None))
+        except Exception as e:
+            results.put((request_id, None, f"{type(e).__name__}: {e}"))
+
+
+def _supervisor_main(slices: List[List[int]], session, imgsz: int, tasks: mp.Queue, results: mp.SimpleQueue,
+                     current, pids, restarts):
+    """Fork the workers and replace the ones that die
+
+    The supervisor holds the warmed session, never runs it and never starts
+    a thread (results is a SimpleQueue, written without a feeder thread), so
+    the first workers and their replacements are all forked from a
+    single-threaded process. A worker that dies fails only the request it was
+    running. A worker that dies before it is ready is not replaced, since the
+    failure would repeat; (None, None, message) tells the pool once no
+    worker is left. Workers stopped by the None sentinel exit with 0.
+    """
+    children: Dict[int, int] = {}
+
+    def spawn(index: int):
+        current[index] = STARTING
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 1
+            try:
+                _worker_main(slices[index], session, imgsz, tasks, results, current, index)
+                code = 0
+            finally:
+                os._exit(code)
+        pids[index] = pid
+        children[pid] = index
+
+    def terminate(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+    for index in range(len(slices)):
+        spawn(index)
+
+    while children:
+        pid, status = os.wait()
+        index = children.pop(pid, None)
+        code = os.waitstatus_to_exitcode(status)
+        if index is None or code == 0:
+            continue
+        request_id = current[index]
+        message = f"worker process detector-{index} exited unexpectedly (exit code {code})"
+        if request_id != STARTING:
+            spawn(index)
+            restarts.value += 1
+        elif not children:
+            results.put((None, None, f"{message} before it was ready; no workers left"))
+        if request_id >= 0:
+            results.put((request_id, None, message))
+
+
+class PreforkDetector:
+    """ONNX detection served by N forked worker processes on disjoint CPU slices
+
+    The parent loads and warms the model once (prepare_session) and forks a
+    supervisor process, which forks the workers; all of them share the
+    weights copy-on-write and no worker builds a session of its own. Each
+    worker is pinned to its CPU slice with OpenCV threads matched to it.
+    Requests go through one shared task queue (idle workers pull the next
+    image) and come back on a result queue, resolved by a reader thread into
+    Futures. Dead workers are replaced by the supervisor (see
+    _supervisor_main), never from a thread of the parent.
+
+    Start the pool before the host process starts other threads: forking a
+    multi-threaded process can leave locks held in the children.
+    """
+
+    def __init__(self, model_path: str, workers: Optional[int] = None, imgsz: int = 640,
+                 runtime: Optional[Dict] = None):
+        self.model_path = str(model_path)
+        self.workers = workers or _available_cores()
+        self.imgsz = imgsz
+        self.runtime = {**DEFAULT_RUNTIME_CONFIG, **(runtime or {})}
+        self._supervisor: Optional[mp.Process] = None
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._reader: Optional[threading.Thread] = None
+        self._error: Optional[str] = None
+
+    def start(self) -> 'PreforkDetector':
+        context = mp.get_context('fork')
+        self._tasks, self._results = context.Queue(), context.SimpleQueue()
+        slices = cpu_slices(self.workers)
+        self._current = context.Array('q', [STARTING] * len(slices), lock=False)
+        self._pids = context.Array('q', [0] * len(slices), lock=False)
+        self._restarts = context.Value('q', 0, lock=False)
+
+        session = prepare_session(self.model_path, self.imgsz, self.runtime)
+        self._supervisor = context.Process(
+            target=_supervisor_main, daemon=True, name='detector-supervisor',
+            args=(slices, session, self.imgsz, self._tasks, self._results,
+                  self._current, self._pids, self._restarts),
+        )
+        self._supervisor.start()
+        del session  # the supervisor holds the inherited copy; the parent doesn't run inference
+
+        self._reader = threading.Thread(target=self._read_results, name='prefork-results', daemon=True)
+        self._reader.start()
+        return self
+
+    @property
+    def restarts(self) -> int:
+        """Workers replaced after dying"""
+        return self._restarts.value
+
+    @property
+    def worker_pids(self) -> List[int]:
+        return list(self._pids)
+
+    def _read_results(self):
+        while True:
+            request_id, result, error = self._results.get()
+            if request_id is None:  # pool failure, or close()
+                if error is not None:
+                    self._fail(error)
+                return
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue  # already failed (e.g. its worker died after answering)
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def _fail(self, message: str):
+        """Fail every pending request and refuse new ones"""
+        with self._lock:
+            self._error = message
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError(message))
+
+    def submit(self, image: np.ndarray, conf_threshold: float = 0.5, nms_threshold: float = 0.45) -> Future:
+        """Queue one RGB image; the Future resolves to {'boxes', 'scores', 'class_ids'}"""
+        if self._reader is None:
+            raise RuntimeError("PreforkDetector.start() has not been called")
+        future = Future()
+        with self._lock:
+            if self._error is not None:
+                raise RuntimeError(self._error)
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        self._tasks.put((request_id, image, conf_threshold, nms_threshold))
+        return future
+
+    def detect(self, image: np.ndarray, conf_threshold: float = 0.5, nms_threshold: float = 0.45) -> dict:
+        return self.submit(image, conf_threshold, nms_threshold).result()
+
+    def detect_batch(self, images: List[np.ndarray], conf_threshold: float = 0.5,
+                     nms_threshold: float = 0.45) -> List[dict]:
+        """Detect on several images in parallel across the workers"""
+        futures = [self.submit(image, conf_threshold, nms_threshold) for image in images]
+        return [future.result() for future in futures]
+
+    def close(self, timeout: float = 5.0):
+        """Stop the workers after the queued tasks"""
+        if self._supervisor is None:
+            return
+        for _ in self._pids:
+            self._tasks.put(None)
+        self._supervisor.join(timeout)
+        if self._supervisor.is_alive():
+            self._supervisor.terminate()  # its SIGTERM handler stops the workers
+            self._supervisor.join(timeout)
+        self._supervisor = None
+        if self._error is None:
+            self._fail("PreforkDetector is closed")
+        self._results.put((None, None, None))  # stop the reader thread
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,109 @@
+import threading
+import cv2
+import numpy as np
+from typing import Tuple
+
+PAD_VALUE = 114  # YOLOv8 letterbox padding (gray)
+_SCALE = np.float32(1.0 / 255.0)
+
+# Per-thread buffers: Streamlit serves sessions on separate threads, and a
+# buffer must not be rewritten while another thread is still feeding it to ORT.
+_buffers = threading.local()
+
+
+def get_input_buffer(imgsz: int, batch_size: int = 1) -> np.ndarray:
+    """Return the cached (B, 3, S, S) float32 input buffer of the current thread"""
+    cache = getattr(_buffers, 'inputs', None)
+    if cache is None:
+        cache = _buffers.inputs = {}
+    key = (batch_size, imgsz)
+    if key not in cache:
+        cache[key] = np.empty((batch_size, 3, imgsz, imgsz), dtype=np.float32)
+    return cache[key]
+
+
+def _get_canvas(imgsz: int) -> np.ndarray:
+    """Return the cached (S, S, 3) uint8 letterbox canvas of the current thread"""
+    canvas = getattr(_buffers, 'canvas', None)
+    if canvas is None or canvas.shape[0] != imgsz:
+        canvas = _buffers.canvas = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+    return canvas
+
+
+def letterbox_geometry(height: int, width: int, imgsz: int) -> Tuple[int, int, int, int]:
+    """(new_w, new_h, pad_x, pad_y) of the letterbox of a height x width image
+
+    The ONNX graph built by utils.export.fold_preprocessing computes the same
+    values (in float64, with the same round-half-to-even), so both paths place
+    the image identically.
+    """
+    ratio = min(imgsz / height, imgsz / width)
+    new_w = min(imgsz, max(1, int(round(width * ratio))))
+    new_h = min(imgsz, max(1, int(round(height * ratio))))
+    return new_w, new_h, (imgsz - new_w) // 2, (imgsz - new_h) // 2
+
+
+def letterbox(image: np.ndarray, imgsz: int, out: np.ndarray = None) -> Tuple[np.ndarray, Tuple]:
+    """Aspect-preserving resize + pad into a normalized (3, S, S) float32 tensor
+
+    Grayscale/RGBA handling, HWC -> CHW reordering and /255 normalization are
+    done on the resized canvas in a single pass, so no full-resolution copy of
+    the input is ever made.
+
+    Args:
+        image: HxW, HxWx3 (RGB) or HxWx4 (RGBA) uint8 image
+        imgsz: square model input size
+        out: (3, S, S) float32 destination, e.g. one slot of a batch buffer.
+            Defaults to the cached single-image buffer from get_input_buffer.
+
+    Returns:
+        (tensor, ratio_pad) where tensor is `out` (or the cached (1, 3, S, S) buffer)
+        and ratio_pad is ((ratio_x, ratio_y), (pad_x, pad_y)) for scale_boxes.
+        The cached buffer is reused by the next call on the same thread.
+    """
+    if image.ndim == 3 and image.shape[2] not in (3, 4):
+        raise ValueError(f"Unsupported image format with shape: {image.shape}")
+    if image.ndim not in (2, 3):
+        raise ValueError(f"Unsupported image format with shape: {image.shape}")
+
+    height, width = image.shape[:2]
+    new_w, new_h, pad_x, pad_y = letterbox_geometry(height, width, imgsz)
+
+    if (new_w, new_h) != (width, height):
+        resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    else:
+        resized = image
+
+    canvas = _get_canvas(imgsz)
+    canvas.fill(PAD_VALUE)
+    region = canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w]
+    if resized.ndim == 2:
+        region[...] = resized[..., None]
+    else:
+        region[...] = resized[..., :3]  # drops alpha channel
+
+    tensor = get_input_buffer(imgsz) if out is None else out
+    # Fused HWC -> CHW + uint8 -> float32 + /255, written straight into the buffer
+    np.multiply(canvas.transpose(2, 0, 1), _SCALE, out=tensor.reshape(3, imgsz, imgsz))
+
+    ratio_pad = ((new_w / width, new_h / height), (pad_x, pad_y))
+    return tensor, ratio_pad
+
+
+def raw_image_input(image: np.ndarray, imgsz: int) -> Tuple[np.ndarray, Tuple]:
+    """Input of a graph with folded preprocessing: the (H, W, 3) uint8 RGB image itself
+
+    Resize, padding, HWC -> CHW and /255 run inside the graph; only
+    grayscale/RGBA images are converted here. Returns (image, ratio_pad) like
+    letterbox, so the same scale_boxes call maps the boxes back.
+    """
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    elif image.ndim == 3 and image.shape[2] == 4:
+        image = image[..., :3]
+    elif image.ndim != 3 or image.shape[2] != 3:
+        raise ValueError(f"Unsupported image format with shape: {image.shape}")
+
+    height, width = image.shape[:2]
+    new_w, new_h, pad_x, pad_y = letterbox_geometry(height, width, imgsz)
+    return np.ascontiguousarray(image), ((new_w / width, new_h / height), (pad_x, pad_y))
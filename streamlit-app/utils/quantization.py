@@ -0,0 +1,213 @@
+import json
+import time
+import cv2
+import numpy as np
+import onnx
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from onnxruntime.quantization import (
+    CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from .preprocess import letterbox
+from .session import create_session
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.npy')
+CALIBRATION_METHODS = {
+    'minmax': CalibrationMethod.MinMax,
+    'entropy': CalibrationMethod.Entropy,
+    'percentile': CalibrationMethod.Percentile,
+}
+
+
+def load_image(path: Path) -> np.ndarray:
+    """Load a dataset image as RGB uint8 (.npy files are ultralytics BGR disk caches)"""
+    path = Path(path)
+    image = np.load(path) if path.suffix == '.npy' else cv2.imread(str(path))
+    if image is None:
+        raise ValueError(f"Failed to read image: {path}")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def sample_images(image_dir: str, num_samples: int = 100, seed: int = 0) -> List[Path]:
+    """Deterministic random subset of the images in a dataset split"""
+    paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not paths:
+        raise FileNotFoundError(f"No images found in {image_dir}")
+    rng = np.random.default_rng(seed)
+    indices = rng.choice(len(paths), size=min(num_samples, len(paths)), replace=False)
+    return [paths[i] for i in sorted(indices)]
+
+
+class CalibrationReader(CalibrationDataReader):
+    """Feeds letterboxed dataset images to the static quantization calibrator"""
+
+    def __init__(self, image_paths: List[Path], imgsz: int, input_name: str = 'images'):
+        self.image_paths = list(image_paths)
+        self.imgsz = imgsz
+        self.input_name = input_name
+        self._iter = iter(self.image_paths)
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        path = next(self._iter, None)
+        if path is None:
+            return None
+        tensor, _ = letterbox(load_image(path), self.imgsz)
+        return {self.input_name: tensor.copy()}  # the letterbox buffer is reused
+
+    def rewind(self):
+        self._iter = iter(self.image_paths)
+
+
+def head_nodes_to_exclude(model_path: str, head_prefix: str = '/model.22/') -> List[str]:
+    """Non-Conv nodes of the YOLOv8 detect head (DFL, concat, sigmoid, box decode)
+
+    These carry box coordinates in pixel units next to class probabilities in
+    [0, 1]; quantizing them to a shared 8-bit range destroys box precision.
+    """
+    model = onnx.load(str(model_path), load_external_data=False)
+    return [
+        node.name for node in model.graph.node
+        if node.name.startswith(head_prefix) and node.op_type != 'Conv'
+    ]
+
+
+def quantize_model(model_path: str, output_path: str, image_dir: str, imgsz: int,
+                   num_samples: int = 100, calibration_method: str = 'minmax',
+                   per_channel: bool = True, seed: int = 0) -> Dict:
+    """Static INT8 (QDQ) quantization calibrated on a sample of a dataset split
+
+    Returns the settings used, for recording in the model metadata.
+    """
+    model_path, output_path = Path(model_path), Path(output_path)
+    prepared_path = output_path.with_name(f"{output_path.stem}_prep.onnx")
+    quant_pre_process(str(model_path), str(prepared_path))
+
+    image_paths = sample_images(image_dir, num_samples, seed)
+    excluded = head_nodes_to_exclude(prepared_path)
+    quantize_static(
+        str(prepared_path),
+        str(output_path),
+        CalibrationReader(image_paths, imgsz),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=per_channel,
+        calibrate_method=CALIBRATION_METHODS[calibration_method],
+        nodes_to_exclude=excluded,
+    )
+    prepared_path.unlink(missing_ok=True)
+
+    return {
+        'source_model': str(model_path),
+        'format': 'QDQ',
+        'activation_type': 'uint8',
+        'weight_type': 'int8',
+        'per_channel': per_channel,
+        'calibration_method': calibration_method,
+        'calibration_images': len(image_paths),
+        'calibration_dir': str(image_dir),
+        'excluded_nodes': len(excluded),
+    }
+
+
+def measure_latency(model_path: str, image_paths: List[Path], imgsz: int,
+                    warmup: int = 5, runs: int = 50, runtime: Optional[Dict] = None) -> Dict:
+    """p50/p99/mean session.run latency in milliseconds over the given images"""
+    session = create_session(model_path, **(runtime or {}))
+    input_name = session.get_inputs()[0].name
+    tensors = [letterbox(load_image(path), imgsz)[0].copy() for path in image_paths]
+
+    for i in range(warmup):
+        session.run(None, {input_name: tensors[i % len(tensors)]})
+
+    timings = np.empty(runs)
+    for i in range(runs):
+        start = time.perf_counter()
+        session.run(None, {input_name: tensors[i % len(tensors)]})
+        timings[i] = time.perf_counter() - start
+
+    timings *= 1000
+    return {
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p99_ms': float(np.percentile(timings, 99)),
+        'mean_ms': float(timings.mean()),
+    }
+
+
+def evaluate_map(model_path: str, data_yaml: str, imgsz: int, split: str = 'test') -> Dict:
+    """mAP50 / mAP50-95 of an ONNX model, scored on the exact artifact with onnxruntime"""
+    from .evaluation import evaluate_model
+
+    report = evaluate_model(model_path, data_yaml, split, imgsz)
+    return {'mAP50': report['mAP50'], 'mAP50_95': report['mAP50_95']}
+
+
+def quantization_report(fp32_path: str, int8_path: str, image_dir: str, data_yaml: str,
+                        imgsz: int, latency_samples: int = 20, split: str = 'test') -> Dict:
+    """Side-by-side accuracy and latency of the FP32 and INT8 models"""
+    image_paths = sample_images(image_dir, latency_samples, seed=1)
+    report = {}
+    for name, path in (('fp32', fp32_path), ('int8', int8_path)):
+        report[name] = {
+            'model_path': str(path),
+            'size_mb': Path(path).stat().st_size / 2 ** 20,
+            **evaluate_map(path, data_yaml, imgsz, split),
+            **measure_latency(path, image_paths, imgsz),
+        }
+
+    report['delta'] = {
+        'mAP50': report['int8']['mAP50'] - report['fp32']['mAP50'],
+        'mAP50_95': report['int8']['mAP50_95'] - report['fp32']['mAP50_95'],
+        'p50_speedup': report['fp32']['p50_ms'] / report['int8']['p50_ms'],
+        'p99_speedup': report['fp32']['p99_ms'] / report['int8']['p99_ms'],
+    }
+    return report
+
+
+def format_report(report: Dict) -> str:
+    """Plain-text table of a quantization report"""
+    lines = [f"{'metric':<12}{'fp32':>12}{'int8':>12}"]
+    for key in ('mAP50', 'mAP50_95', 'p50_ms', 'p99_ms', 'size_mb'):
+        lines.append(f"{key:<12}{report['fp32'][key]:>12.4f}{report['int8'][key]:>12.4f}")
+    return "\n".join(lines)
+
+
+def run_quantization_pipeline(fp32_path: str, metadata: Dict, calibration_dir: str, data_yaml: str,
+                              num_samples: int = 100, max_map50_drop: float = 0.02,
+                              calibration_method: str = 'minmax', split: str = 'test') -> Tuple[Dict, Dict]:
+    """Quantize an exported model, benchmark it against FP32 and write its metadata
+
+    Writes <stem>_int8.onnx, <stem>_int8_metadata.json and <stem>_int8_report.json
+    next to the FP32 model. `recommended` in the metadata is True when the
+    mAP50 loss stays within max_map50_drop. Returns (int8 metadata, report);
+    format_report renders the report for the console.
+    """
+    fp32_path = Path(fp32_path)
+    int8_path = fp32_path.with_name(f"{fp32_path.stem}_int8.onnx")
+    imgsz = metadata['imgsz']
+
+    settings = quantize_model(fp32_path, int8_path, calibration_dir, imgsz, num_samples, calibration_method)
+    report = quantization_report(fp32_path, int8_path, calibration_dir, data_yaml, imgsz, split=split)
+    report_path = fp32_path.with_name(f"{fp32_path.stem}_int8_report.json")
+    report_path.write_text(json.dumps(report, indent=2))
+
+    int8_metadata = dict(metadata)
+    int8_metadata.update({
+        'model_path': str(int8_path),
+        'model_name': f"{metadata.get('model_name', fp32_path.stem)}_int8",
+        'timestamp': time.strftime("%Y%m%d_%H%M%S"),
+        'quantization': {
+            **settings,
+            'mAP50': report['int8']['mAP50'],
+            'mAP50_95': report['int8']['mAP50_95'],
+            'mAP50_drop': -report['delta']['mAP50'],
+            'p50_speedup': report['delta']['p50_speedup'],
+            'report_path': str(report_path),
+            'recommended': -report['delta']['mAP50'] <= max_map50_drop,
+        },
+    })
+    metadata_path = fp32_path.with_name(f"{fp32_path.stem}_int8_metadata.json")
+    metadata_path.write_text(json.dumps(int8_metadata, indent=2))
+    return int8_metadata, report
@@ -0,0 +1,215 @@
+import ast
+import os
+import queue
+import threading
+import yaml
+import numpy as np
+import onnxruntime as ort
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, List, Optional
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    'sequential': ort.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': ort.ExecutionMode.ORT_PARALLEL,
+}
+
+DEFAULT_RUNTIME_CONFIG = {
+    'graph_optimization_level': 'all',
+    'intra_op_num_threads': 0,   # 0 = available cores split across the pool
+    'inter_op_num_threads': 1,
+    'execution_mode': 'sequential',
+    'enable_mem_arena': True,
+    'optimized_model_path': None,
+    'pool_size': 1,
+    'providers': ['CPUExecutionProvider'],
+    'io_binding': False,         # run through BoundRunner (preallocated, reused outputs)
+}
+
+
+def load_runtime_config(metadata: Optional[Dict] = None, config_path: Optional[str] = None) -> Dict:
+    """Resolve ONNX Runtime settings: defaults < config.yaml `runtime` < metadata `runtime`"""
+    runtime = dict(DEFAULT_RUNTIME_CONFIG)
+
+    if config_path and Path(config_path).exists():
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f) or {}
+        runtime.update(config.get('runtime') or {})
+
+    if metadata:
+        runtime.update(metadata.get('runtime') or {})
+
+    return runtime
+
+
+def takes_raw_images(session) -> bool:
+    """True for graphs with preprocessing folded in (uint8 [H, W, 3] input)"""
+    return session.get_inputs()[0].type == 'tensor(uint8)'
+
+
+def folded_input_size(session) -> Optional[int]:
+    """Letterbox size of a graph with folded preprocessing, None for other graphs"""
+    if not takes_raw_images(session):
+        return None
+    return int(session.get_modelmeta().custom_metadata_map['letterbox_size'])
+
+
+def exported_input_size(session) -> Optional[int]:
+    """Input size the model was exported at ('imgsz' in the ultralytics ONNX metadata), None if absent"""
+    value = session.get_modelmeta().custom_metadata_map.get('imgsz')
+    try:
+        size = ast.literal_eval(value) if value else None
+    except (ValueError, SyntaxError):
+        return None
+    if isinstance(size, (list, tuple)):
+        size = max(size) if size else None  # [h, w]; letterbox inputs are square
+    return int(size) if isinstance(size, (int, float)) else None
+
+
+def _available_cores() -> int:
+    """CPU cores this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def create_session_options(graph_optimization_level: str = 'all', intra_op_num_threads: int = 0,
+                           inter_op_num_threads: int = 1, execution_mode: str = 'sequential',
+                           enable_mem_arena: bool = True, optimized_model_path: Optional[str] = None,
+                           pool_size: int = 1, **_) -> ort.SessionOptions:
+    """Build ort.SessionOptions from runtime config values"""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization_level]
+    options.execution_mode = EXECUTION_MODES[execution_mode]
+    options.enable_cpu_mem_arena = enable_mem_arena
+
+    # Split cores between pooled sessions instead of letting each one grab all of them
+    if not intra_op_num_threads:
+        intra_op_num_threads = max(1, _available_cores() // max(1, pool_size))
+    options.intra_op_num_threads = intra_op_num_threads
+    options.inter_op_num_threads = inter_op_num_threads
+
+    if optimized_model_path:
+        options.optimized_model_filepath = str(optimized_model_path)
+
+    return options
+
+
+def create_session(model_path: str, **runtime) -> ort.InferenceSession:
+    """Create an InferenceSession configured from runtime config values"""
+    config = {**DEFAULT_RUNTIME_CONFIG, **runtime}
+    return ort.InferenceSession(
+        str(model_path),
+        sess_options=create_session_options(**config),
+        providers=config['providers'],
+    )
+
+
+class SessionPool:
+    """Small pool of identical InferenceSessions
+
+    Exposes the InferenceSession methods used by the app (run, get_inputs,
+    get_outputs), so it can be used wherever a single session was before.
+    Each run borrows one session, so concurrent callers don't serialize on
+    a single session and each session keeps its own share of the threads.
+    """
+
+    def __init__(self, model_path: str, **runtime):
+        self.model_path = str(model_path)
+        self.runtime = {**DEFAULT_RUNTIME_CONFIG, **runtime}
+        self.size = max(1, int(self.runtime['pool_size']))
+
+        self._sessions = [create_session(self.model_path, **self.runtime)]
+        # The optimized model only needs to be written once
+        self.runtime['optimized_model_path'] = None
+        self._sessions += [create_session(self.model_path, **self.runtime) for _ in range(self.size - 1)]
+
+        self._idle = queue.Queue()
+        for session in self._sessions:
+            self._idle.put(session)
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a session for the duration of the with-block"""
+        session = self._idle.get()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+    def run(self, output_names, input_feed, run_options=None):
+        with self.acquire() as session:
+            return session.run(output_names, input_feed, run_options)
+
+    def get_inputs(self):
+        return self._sessions[0].get_inputs()
+
+    def get_outputs(self):
+        return self._sessions[0].get_outputs()
+
+    def get_providers(self):
+        return self._sessions[0].get_providers()
+
+    def get_modelmeta(self):
+        return self._sessions[0].get_modelmeta()
+
+
+class BoundRunner:
+    """Runs a session (or SessionPool) through IOBinding with reusable output buffers
+
+    The first run for an input buffer learns the output shapes with a normal
+    run; its outputs become the bound output buffers and the input buffer is
+    bound in place. Every later run with the same input buffer (same address
+    and shape, e.g. the cached letterbox buffer) is a bare run_with_iobinding
+    that writes straight into those buffers, so the steady state allocates no
+    output arrays.
+
+    Bindings and buffers are per thread and per session, so callers may keep
+    working on the returned arrays after the session went back to the pool.
+    They are overwritten by the next run of the same thread with the same
+    input buffer: results that must outlive it have to be copied (decoding
+    already produces new arrays).
+    """
+
+    def __init__(self, session, max_bindings: int = 16):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.output_names = [output.name for output in session.get_outputs()]
+        self.max_bindings = max_bindings
+        self._local = threading.local()
+
+    def _bind(self, session: ort.InferenceSession, tensor: np.ndarray):
+        outputs = session.run(self.output_names, {self.input_name: tensor})
+        binding = session.io_binding()
+        binding.bind_input(self.input_name, 'cpu', 0, tensor.dtype, tensor.shape, tensor.ctypes.data)
+        for name, output in zip(self.output_names, outputs):
+            binding.bind_output(name, 'cpu', 0, output.dtype, output.shape, output.ctypes.data)
+        # tensor is kept alive so its address can't be reused while it is bound
+        return binding, tensor, outputs
+
+    def run(self, tensor: np.ndarray) -> List[np.ndarray]:
+        """Outputs of one run, as the reused per-thread buffers"""
+        if not tensor.flags.c_contiguous:
+            tensor = np.ascontiguousarray(tensor)
+        bindings = getattr(self._local, 'bindings', None)
+        if bindings is None:
+            bindings = self._local.bindings = {}
+
+        pooled = self.session.acquire() if isinstance(self.session, SessionPool) else nullcontext(self.session)
+        with pooled as session:
+            key = (id(session), tensor.ctypes.data, tensor.shape, tensor.dtype.str)
+            entry = bindings.get(key)
+            if entry is None:
+                if len(bindings) >= self.max_bindings:
+                    bindings.clear()
+                entry = bindings[key] = self._bind(session, tensor)
+                return entry[2]
+            session.run_with_iobinding(entry[0])
+        return entry[2]
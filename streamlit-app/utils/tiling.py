@@ -0,0 +1,58 @@
+import numpy as np
+from typing import List
+
+
+def tile_grid(img_shape: tuple, tile_size: int = 640, overlap: float = 0.2) -> np.ndarray:
+    """Overlapping tile windows covering an image
+
+    The last row/column of tiles is shifted back to end on the image border,
+    so every tile is full size whenever the image is larger than the tile.
+
+    Returns:
+        [N, 4] int array of (x1, y1, x2, y2) windows
+    """
+    height, width = img_shape[:2]
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length: int) -> np.ndarray:
+        if length <= tile_size:
+            return np.zeros(1, dtype=np.int64)
+        offsets = np.arange(0, length - tile_size, stride)
+        return np.append(offsets, length - tile_size)
+
+    ys, xs = np.meshgrid(starts(height), starts(width), indexing='ij')
+    x1, y1 = xs.ravel(), ys.ravel()
+    return np.stack([x1, y1, np.minimum(x1 + tile_size, width), np.minimum(y1 + tile_size, height)], axis=1)
+
+
+def blank_tiles(image: np.ndarray, tiles: np.ndarray, threshold: int = 8, step: int = 4) -> np.ndarray:
+    """Boolean mask of tiles whose (subsampled) pixels are all nearly the same color"""
+    sampled = image[::step, ::step]
+    blank = np.empty(len(tiles), dtype=bool)
+    for i, (x1, y1, x2, y2) in enumerate(tiles // step):
+        patch = sampled[y1:max(y2, y1 + 1), x1:max(x2, x1 + 1)]
+        blank[i] = int(patch.max()) - int(patch.min()) <= threshold
+    return blank
+
+
+def empty_detections() -> dict:
+    return {
+        'boxes': np.zeros((0, 4), dtype=np.float32),
+        'scores': np.zeros(0, dtype=np.float32),
+        'class_ids': np.zeros(0, dtype=np.int64),
+    }
+
+
+def shift_detections(detections: List[dict], tiles: np.ndarray) -> dict:
+    """Concatenate per-tile detections, moving boxes into full image coordinates"""
+    counts = [len(det['boxes']) for det in detections]
+    if sum(counts) == 0:
+        return empty_detections()
+
+    boxes = np.concatenate([det['boxes'] for det in detections]).astype(np.float32)
+    boxes += np.repeat(tiles[:, [0, 1, 0, 1]], counts, axis=0)
+    return {
+        'boxes': boxes,
+        'scores': np.concatenate([det['scores'] for det in detections]),
+        'class_ids': np.concatenate([det['class_ids'] for det in detections]),
+    }
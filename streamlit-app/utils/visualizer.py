@@ -1,45 +1,125 @@
 import cv2
 import numpy as np
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Optional, Sequence, Tuple
 
-def draw_detections(image: np.ndarray, detections: Dict, class_names: List[str],
-                    thickness: int = 2) -> np.ndarray:
-    """Draw detection boxes and labels in image"""
+FONT = cv2.FONT_HERSHEY_SIMPLEX
 
-    image_copy = image.copy()
 
-    for box, score, class_id in zip(detections['boxes'], detections['scores'], detections['class_ids']):
-        x1, y1, x2, y2 = map(int, box)
-        
-        class_name = class_names[int(class_id)] if int(class_id) < len(class_names) else f'Class_{int(class_id)}'
-        
-        color = get_class_color(class_name)
+@lru_cache(maxsize=8)
+def class_color_lut(num_classes: int) -> np.ndarray:
+    """[num_classes, 3] uint8 RGB colors, hues spread by the golden ratio so neighbours differ"""
+    hues = (np.arange(num_classes) * 0.618033988749895 % 1.0 * 180).astype(np.uint8)
+    hsv = np.stack([hues, np.full_like(hues, 200), np.full_like(hues, 255)], axis=1)[None]
+    lut = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)[0]
+    lut.setflags(write=False)
+    return lut
 
-        cv2.rectangle(image_copy, (x1, y1), (x2, y2), color, thickness)
 
-        label = f'{class_name}: {score: .2f}'
-        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
+def get_class_color(class_id: int, num_classes: int = 182) -> tuple:
+    """Get color for specific class"""
+    return tuple(int(c) for c in class_color_lut(num_classes)[int(class_id) % num_classes])
 
-        cv2.rectangle(image_copy, (x1, y1 - label_size[1] - 10), (x1 + label_size[0], y1), color, -1)
 
-        cv2.putText(image_copy, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+class DetectionRenderer:
+    """Draws detections with per-class colors and cached label sprites
 
-    return image_copy
+    Labels are rasterized once per (class, score bucket) and blitted, boxes
+    are drawn with one polylines call per class. Every render returns a new
+    image that the caller owns. With preview_size the image is downscaled
+    first so its longer side is at most preview_size pixels.
+    """
 
+    def __init__(self, class_names: Sequence[str], thickness: int = 2, font_scale: float = 0.5,
+                 max_sprites: int = 8192):
+        self.class_names = list(class_names)
+        self.thickness = thickness
+        self.font_scale = font_scale
+        self.max_sprites = max_sprites
+        self.colors = class_color_lut(max(len(self.class_names), 1))
+        self._sprites: Dict[Tuple[int, int], np.ndarray] = {}
 
-def get_class_color(class_id: int) -> tuple:
-    """Get color for specific class"""
-    colors = [
-        (255, 0, 0),    # Red
-        (0, 255, 0),    # Green
-        (0, 0, 255),    # Blue
-        (255, 255, 0),  # Yellow
-        (255, 0, 255),  # Magenta
-        (0, 255, 255),  # Cyan
-        (128, 0, 128),  # Purple
-        (255, 165, 0),  # Orange
-        (128, 128, 128), # Gray
-        (255, 192, 203), # Pink
-    ]
-    
-    return colors[class_id % len(colors)]
+    def class_name(self, class_id: int) -> str:
+        return self.class_names[class_id] if class_id < len(self.class_names) else f'Class_{class_id}'
+
+    def color(self, class_id: int) -> tuple:
+        return tuple(int(c) for c in self.colors[class_id % len(self.colors)])
+
+    def label_sprite(self, class_id: int, score: float) -> np.ndarray:
+        """Label image 'name: 0.87' on the class color, cached per (class, score bucket)"""
+        bucket = int(round(float(score) * 100))
+        key = (class_id, bucket)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            label = f'{self.class_name(class_id)}: {bucket / 100:.2f}'
+            (width, height), baseline = cv2.getTextSize(label, FONT, self.font_scale, 1)
+            color = self.color(class_id)
+            sprite = np.empty((height + baseline + 4, width + 4, 3), dtype=np.uint8)
+            sprite[:] = color
+            # Dark text on light colors, white text on dark ones
+            luminance = 0.299 * color[0] + 0.587 * color[1] + 0.114 * color[2]
+            text_color = (0, 0, 0) if luminance > 150 else (255, 255, 255)
+            cv2.putText(sprite, label, (2, height + 2), FONT, self.font_scale, text_color, 1, cv2.LINE_AA)
+            if len(self._sprites) >= self.max_sprites:
+                self._sprites.clear()
+            self._sprites[key] = sprite
+        return sprite
+
+    def _canvas(self, image: np.ndarray, preview_size: Optional[int]) -> Tuple[np.ndarray, float]:
+        """Copy (or downscale) the image into a new output image"""
+        height, width = image.shape[:2]
+        scale = 1.0
+        if preview_size and max(height, width) > preview_size:
+            scale = preview_size / max(height, width)
+            height, width = max(1, round(height * scale)), max(1, round(width * scale))
+
+        canvas = np.empty((height, width, 3), dtype=np.uint8)
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        elif image.shape[2] == 4:
+            image = image[..., :3]
+        if scale != 1.0:
+            cv2.resize(image, (width, height), dst=canvas, interpolation=cv2.INTER_LINEAR)
+        else:
+            np.copyto(canvas, image)
+        return canvas, scale
+
+    def render(self, image: np.ndarray, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray,
+               preview_size: Optional[int] = None) -> np.ndarray:
+        """Draw boxes and labels over a copy of image (RGB uint8)"""
+        canvas, scale = self._canvas(image, preview_size)
+        if len(boxes) == 0:
+            return canvas
+
+        boxes = np.round(np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * scale).astype(np.int32)
+        class_ids = np.asarray(class_ids).astype(np.int64)
+
+        # One polylines call per class instead of one rectangle call per box
+        corners = boxes[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 4, 2)
+        for class_id in np.unique(class_ids):
+            cv2.polylines(canvas, list(corners[class_ids == class_id]), True,
+                          self.color(int(class_id)), self.thickness)
+
+        height, width = canvas.shape[:2]
+        for (x1, y1, _, _), score, class_id in zip(boxes, scores, class_ids):
+            sprite = self.label_sprite(int(class_id), score)
+            sh, sw = sprite.shape[:2]
+            top = y1 - sh if y1 - sh >= 0 else y1  # inside the box when there's no room above
+            x, y = min(max(x1, 0), width - 1), min(max(top, 0), height - 1)
+            h, w = min(sh, height - y), min(sw, width - x)
+            canvas[y:y + h, x:x + w] = sprite[:h, :w]
+        return canvas
+
+
+@lru_cache(maxsize=4)
+def get_renderer(class_names: Tuple[str, ...], thickness: int = 2) -> DetectionRenderer:
+    """Shared renderer per (class list, thickness), so sprites are reused across calls"""
+    return DetectionRenderer(class_names, thickness=thickness)
+
+
+def draw_detections(image: np.ndarray, detections: Dict, class_names: List[str],
+                    thickness: int = 2, preview_size: Optional[int] = None) -> np.ndarray:
+    """Draw detection boxes and labels in image"""
+    renderer = get_renderer(tuple(class_names), thickness)
+    return renderer.render(image, detections['boxes'], detections['scores'], detections['class_ids'],
+                           preview_size)
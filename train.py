@@ -5,6 +5,7 @@ ROBOFLOW_API_KEY = os.getenv('ROBOFLOW_API_KEY', "GmmcPzjqUM0s4fqtIu1V")
 import json
 import os
 import shutil
+import sys
 import yaml
 import cv2
 import requests
@@ -82,9 +83,9 @@ model_path = f'/home/smallpod/workspace/hit_aws_object_detection/runs/aws_icon_d
 model.save(model_path)
 
 
-# ONNX로 모델 내보내기
+# ONNX로 모델 내보내기 (dynamic=True: 배치 축을 동적으로 내보내 ObjectDetector.detect_batch에서 여러 장을 한 번에 추론)
 onnx_path = f'/home/smallpod/workspace/hit_aws_object_detection/runs/aws_icon_detector_best_{current_time}.onnx'
-model.export(format='onnx', imgsz=320, onnx_path=onnx_path)
+model.export(format='onnx', imgsz=320, onnx_path=onnx_path, dynamic=True)
 exported_onnx = Path(model_path).parent / 'aws_icon_detector_best.onnx'
 if exported_onnx.exists():
     shutil.move(str(exported_onnx), onnx_path)
@@ -98,12 +99,28 @@ metadata = {
     "model_path": onnx_path,  # ONNX 모델 경로
     "timestamp": current_time,
     "num_classes": len(model.names),
+    "dynamic_batch": True,
 }
 metadata_path = f'/home/smallpod/workspace/hit_aws_object_detection/runs/metadata_{current_time}.json'
 with open(metadata_path, 'w') as f:
     json.dump(metadata, f, indent=4)
 
 
+# INT8 정적 양자화 (CPU 배포용)
+# 학습 이미지 일부로 캘리브레이션 → *_int8.onnx, *_int8_metadata.json, FP32 대비 mAP/지연시간 리포트 생성
+sys.path.insert(0, str(Path(__file__).parent / 'streamlit-app'))
+from utils.quantization import format_report, run_quantization_pipeline
+int8_metadata, quantization_report = run_quantization_pipeline(
+    onnx_path,
+    metadata,
+    calibration_dir='/home/smallpod/workspace/hit_aws_object_detection/AWS-Icon-Detector--4/train/images',
+    data_yaml='/home/smallpod/workspace/hit_aws_object_detection/AWS-Icon-Detector--4/data.yaml',
+    num_samples=100,
+    max_map50_drop=0.02,  # mAP50 하락이 이 값 이하이면 recommended=True
+)
+print(format_report(quantization_report))
+
+
 # 모델 평가
 # 학습이 100 에포크를 완료한 후, 테스트 데이터로 모델 성능을 평가
 # 클래스별 성능 분석: mAP@50, mAP@50:95, Precision, Recall, F1-score, AP@50, AP@50:95